@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Tamanho das páginas do autocompletar de entidades
+TAMANHO_PAGINA = 20
+
+def _padrao_busca(termo: str) -> str:
+    """Padrão ILIKE de 'contém', tratando %, _ e \\ digitados como texto literal"""
+    escapado = termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escapado}%"
+
+def buscar_entidades(db: Session, estr_entidade_id: int, termo: str = "", apos: Optional[int] = None, limite: int = TAMANHO_PAGINA) -> Tuple[List[Dict[str, str]], Optional[int]]:
+    """Busca instâncias pelos atributos de exibição, paginando por ID_SEQ.
+    Retorna ([{"id", "text"}], cursor da próxima página ou None)"""
+
+    termo = termo.strip()
+    # Texto igual ao do histórico de submissões: "LABEL: VALOR | ..." de todos os atributos de
+    # exibição, montado só para as linhas da página. A busca por trecho usa o índice de trigramas
+    # de ATRIBUTOS.VALOR
+    query = text("""
+        SELECT e.ID_SEQ, t.texto
+        FROM ENTIDADE e
+        LEFT JOIN LATERAL (
+            SELECT STRING_AGG(CONCAT(ea.LABEL, ': ', a.VALOR), ' | ' ORDER BY ea.ID_SEQ) as texto
+            FROM ESTR_ATRIBUTOS ea
+            LEFT JOIN ATRIBUTOS a ON a.ESTR_ENTIDADE_ID = ea.ESTR_ENTIDADE_ID
+                                  AND a.ESTR_ATRIBUTO_ID_SEQ = ea.ID_SEQ
+                                  AND a.ENTIDADE_ID_SEQ = e.ID_SEQ
+            WHERE ea.ESTR_ENTIDADE_ID = e.ESTR_ENTIDADE_ID AND ea.EXIBICAO = TRUE
+        ) t ON TRUE
+        WHERE e.ESTR_ENTIDADE_ID = :estr_entidade_id
+        AND e.ID_SEQ > :apos
+        AND (CAST(:padrao AS TEXT) IS NULL OR EXISTS (
+            SELECT 1
+            FROM ATRIBUTOS a
+            INNER JOIN ESTR_ATRIBUTOS ea ON ea.ESTR_ENTIDADE_ID = a.ESTR_ENTIDADE_ID
+                                         AND ea.ID_SEQ = a.ESTR_ATRIBUTO_ID_SEQ
+            WHERE a.ESTR_ENTIDADE_ID = e.ESTR_ENTIDADE_ID
+            AND a.ENTIDADE_ID_SEQ = e.ID_SEQ
+            AND ea.EXIBICAO = TRUE
+            AND a.VALOR ILIKE CAST(:padrao AS TEXT)
+        ))
+        ORDER BY e.ID_SEQ
+        LIMIT :limite
+    """)
+    linhas = db.execute(query, {
+        "estr_entidade_id": estr_entidade_id,
+        "apos": apos if apos is not None else -1,
+        "padrao": _padrao_busca(termo) if termo else None,
+        "limite": limite + 1
+    }).fetchall()
+
+    proximo = linhas[limite - 1].id_seq if len(linhas) > limite else None
+    itens = [
+        {"id": f"{estr_entidade_id}_{row.id_seq}", "text": row.texto or f"Entidade {row.id_seq}"}
+        for row in linhas[:limite]
+    ]
+    return itens, proximo
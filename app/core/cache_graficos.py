@@ -0,0 +1,53 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+# Quantidade máxima de gráficos mantidos em memória por processo
+TAMANHO_MAXIMO_CACHE = 256
+
+# (projeto_id, tipo_grafico, pergunta_x, pergunta_y, agregacao_y, periodo, aproximado)
+ChaveGrafico = Tuple[int, str, str, str, str, str, bool]
+
+_lock = Lock()
+
+# Cache LRU: chave -> (versão dos dados do projeto, etag, dados do gráfico). A versão é
+# CONTADOR_PROJETO.VERSAO, incrementada na transação de cada escrita e igual em todos os processos
+_resultados: "OrderedDict[ChaveGrafico, Tuple[int, str, Dict[str, Any]]]" = OrderedDict()
+
+def montar_chave(projeto_id: int, tipo_grafico: str, pergunta_x: str, pergunta_y: Optional[str], agregacao_y: str, periodo: Optional[str] = None, aproximado: bool = False) -> ChaveGrafico:
+    return (projeto_id, tipo_grafico, pergunta_x or "", pergunta_y or "", agregacao_y, periodo or "", aproximado)
+
+def gerar_etag(chave: ChaveGrafico, versao: int) -> str:
+    # A versão vem do banco: o mesmo ETag vale em qualquer processo e após reinícios
+    resumo = hashlib.sha1(repr((chave, versao)).encode()).hexdigest()[:20]
+    return f'"{resumo}"'
+
+def obter(chave: ChaveGrafico, versao: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Retorna (etag, dados) se o gráfico em cache foi calculado na versão informada do projeto"""
+    with _lock:
+        item = _resultados.get(chave)
+        if item is None:
+            return None
+
+        versao_cache, etag, dados = item
+        if versao_cache != versao:
+            if versao_cache < versao:
+                del _resultados[chave]
+            return None
+
+        _resultados.move_to_end(chave)
+        return etag, dados
+
+def armazenar(chave: ChaveGrafico, versao: int, dados: Dict[str, Any]) -> str:
+    """Guarda o gráfico calculado na versão lida antes do cálculo e retorna seu ETag"""
+    etag = gerar_etag(chave, versao)
+    with _lock:
+        item = _resultados.get(chave)
+        # Um cálculo mais lento, iniciado em uma versão anterior, não substitui o mais novo
+        if item is None or item[0] <= versao:
+            _resultados[chave] = (versao, etag, dados)
+        _resultados.move_to_end(chave)
+        while len(_resultados) > TAMANHO_MAXIMO_CACHE:
+            _resultados.popitem(last=False)
+    return etag
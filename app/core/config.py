@@ -3,6 +3,34 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     DATABASE_URL: str
 
+    # Gráficos de dispersão: máximo de pontos enviados e a partir de quantos o cliente usa WebGL
+    GRAFICO_LIMITE_PONTOS: int = 5000
+    GRAFICO_LIMITE_WEBGL: int = 2000
+
+    # Modo aproximado: quantidade de submissões sorteadas por gráfico (abaixo disso o cálculo é exato)
+    GRAFICO_AMOSTRA_SUBMISSOES: int = 20000
+
+    # Cubo de respostas em memória para os gráficos de barras/linha (requer numpy)
+    CUBO_RESPOSTAS_HABILITADO: bool = False
+    CUBO_MEMORIA_MAXIMA_MB: int = 256
+
+    # Limite de tempo de cada comando SQL (ms, 0 desativa): rotas de gráficos/relatórios
+    # usam o analítico, as demais o transacional
+    TIMEOUT_CONSULTA_ANALITICA_MS: int = 30000
+    TIMEOUT_CONSULTA_TRANSACIONAL_MS: int = 10000
+
+    # Relatórios gerados em segundo plano (python -m app.core.tarefas_relatorio)
+    RELATORIOS_DIRETORIO: str = "relatorios_gerados"
+    RELATORIOS_MAXIMO_POR_USUARIO: int = 2
+    # Horas em que o arquivo de um relatório concluído fica disponível para download
+    RELATORIOS_VALIDADE_HORAS: int = 24
+
+    # Escrita agrupada das submissões: as que chegam dentro da janela são gravadas em uma
+    # única transação (um commit para o lote), até o máximo de submissões por lote
+    ESCRITA_AGRUPADA_HABILITADA: bool = False
+    ESCRITA_AGRUPADA_JANELA_MS: int = 5
+    ESCRITA_AGRUPADA_MAXIMO_LOTE: int = 200
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request
+from sqlalchemy.exc import DBAPIError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+
+# Intervalo entre as verificações de conexão do cliente durante uma consulta
+INTERVALO_VERIFICACAO_S = 0.5
+
+# SQLSTATE do PostgreSQL para comando cancelado (statement_timeout ou cancelamento)
+SQLSTATE_CONSULTA_CANCELADA = "57014"
+
+class ClienteDesconectado(Exception):
+    """O cliente fechou a conexão antes do fim da consulta"""
+
+def consulta_cancelada(erro: Exception) -> bool:
+    """Indica se o erro do banco foi causado por statement_timeout"""
+    if not isinstance(erro, DBAPIError):
+        return False
+    original = erro.orig
+    codigo = getattr(original, "pgcode", None) or getattr(original, "sqlstate", None)
+    return codigo == SQLSTATE_CONSULTA_CANCELADA
+
+async def executar_cancelavel(request: Request, operacao: Awaitable[Any], cancelar: Optional[Callable[[], None]] = None) -> Any:
+    """Aguarda a operação, cancelando-a se o cliente desconectar. cancelar interrompe o que
+    o cancelamento da tarefa não alcança (um comando em execução numa thread)"""
+
+    # Cancelar a tarefa interrompe a consulta: o asyncpg envia o pedido de cancelamento ao servidor
+    tarefa = asyncio.ensure_future(operacao)
+    try:
+        while True:
+            concluidas, _ = await asyncio.wait({tarefa}, timeout=INTERVALO_VERIFICACAO_S)
+            if concluidas:
+                return tarefa.result()
+            if await request.is_disconnected():
+                raise ClienteDesconectado()
+    finally:
+        if not tarefa.done():
+            if cancelar is not None:
+                cancelar()
+            tarefa.cancel()
+            # Espera o cancelamento terminar antes de a sessão ser fechada
+            await asyncio.gather(tarefa, return_exceptions=True)
+
+async def executar_analitico(request: Request, funcao: Callable[..., Any], *args) -> Any:
+    """Executa funcao(db, *args) numa thread do pool com uma Session síncrona analítica: as
+    consultas e o processamento em Python (cubo, agregações, reduções) não bloqueiam o event loop.
+    Se o cliente desconectar, o comando em andamento é cancelado no servidor"""
+    db = SessionLocal(info={"timeout_ms": settings.TIMEOUT_CONSULTA_ANALITICA_MS})
+    conexoes = []
+
+    def executar():
+        # Conexão do psycopg2 guardada para o cancelamento, que vem de outra thread
+        conexoes.append(db.connection().connection.dbapi_connection)
+        return funcao(db, *args)
+
+    def cancelar():
+        if conexoes:
+            conexoes[0].cancel()
+
+    try:
+        # A thread não é interrompida pelo cancelamento da tarefa: a espera termina quando o
+        # comando cancelado retorna o erro
+        return await executar_cancelavel(request, run_in_threadpool(executar), cancelar)
+    finally:
+        await run_in_threadpool(db.close)
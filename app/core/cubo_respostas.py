@@ -0,0 +1,226 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db import contadores
+
+# NumPy está no requirements.txt; sem ele o cubo fica desabilitado e os gráficos usam apenas SQL
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if settings.CUBO_RESPOSTAS_HABILITADO and np is None:
+    print("Erro: CUBO_RESPOSTAS_HABILITADO está ativo, mas o NumPy não pôde ser importado. "
+          "O cubo de respostas ficará desabilitado; instale as dependências do requirements.txt")
+
+# (pergunta_id, resposta, resposta_numero, resposta_data)
+RespostaCubo = Tuple[int, str, Optional[float], Any]
+
+CAPACIDADE_INICIAL = 1024
+
+def habilitado() -> bool:
+    return settings.CUBO_RESPOSTAS_HABILITADO and np is not None
+
+class ColunaCubo:
+    """Respostas de uma pergunta, uma posição por submissão, codificadas por dicionário"""
+
+    def __init__(self, capacidade: int):
+        # -1 indica submissão sem resposta para a pergunta
+        self.codigos = np.full(capacidade, -1, dtype=np.int32)
+        self.valores: List[str] = []
+        self.indice: Dict[str, int] = {}
+        # Valores tipados de cada código, usados na soma (float64) e na ordenação
+        self.numeros: List[float] = []
+        self.datas: List[Any] = []
+
+    def codificar(self, valor: str, numero: Optional[float], data) -> int:
+        codigo = self.indice.get(valor)
+        if codigo is None:
+            codigo = self.indice[valor] = len(self.valores)
+            self.valores.append(valor)
+            self.numeros.append(np.nan if numero is None else numero)
+            self.datas.append(data)
+        return codigo
+
+    def crescer(self, capacidade: int):
+        novos = np.full(capacidade, -1, dtype=np.int32)
+        novos[:len(self.codigos)] = self.codigos
+        self.codigos = novos
+
+    def tamanho_bytes(self) -> int:
+        # Estimativa do dicionário: texto mais o overhead dos objetos Python
+        return self.codigos.nbytes + sum(len(v) + 100 for v in self.valores)
+
+class CuboProjeto:
+    """Respostas de um projeto em colunas NumPy indexadas pela ordem das submissões"""
+
+    def __init__(self, versao: int):
+        self.lock = Lock()
+        # Versão dos dados do projeto (CONTADOR_PROJETO.VERSAO) refletida pelo cubo
+        self.versao = versao
+        self.total = 0
+        self.capacidade = CAPACIDADE_INICIAL
+        self.colunas: Dict[int, ColunaCubo] = {}
+        self.submissoes = set()
+
+    def adicionar_submissao(self, submissao_id: int, respostas: Iterable[RespostaCubo]):
+        # Uma submissão pode chegar pela carga inicial e pelo registro após o commit
+        if submissao_id in self.submissoes:
+            return
+
+        if self.total == self.capacidade:
+            self.capacidade *= 2
+            for coluna in self.colunas.values():
+                coluna.crescer(self.capacidade)
+
+        for pergunta_id, valor, numero, data in respostas:
+            coluna = self.colunas.get(pergunta_id)
+            if coluna is None:
+                coluna = self.colunas[pergunta_id] = ColunaCubo(self.capacidade)
+            coluna.codigos[self.total] = coluna.codificar(valor, numero, data)
+
+        self.submissoes.add(submissao_id)
+        self.total += 1
+
+    def agregar_xy(self, pergunta_x: int, pergunta_y: int, somar: bool) -> List[Tuple[str, Optional[float], Any, Any]]:
+        """Agrupa Y por valor de X; retorna (valor, numero, data, y agregado) sem ordenação"""
+        coluna_x = self.colunas.get(pergunta_x)
+        coluna_y = self.colunas.get(pergunta_y)
+        if coluna_x is None or coluna_y is None:
+            return []
+
+        codigos_x = coluna_x.codigos[:self.total]
+        codigos_y = coluna_y.codigos[:self.total]
+        presentes = (codigos_x >= 0) & (codigos_y >= 0)
+        xs = codigos_x[presentes]
+        quantidade_valores = len(coluna_x.valores)
+
+        contagens = np.bincount(xs, minlength=quantidade_valores)
+        if somar:
+            numeros_y = np.asarray(coluna_y.numeros, dtype=np.float64)[codigos_y[presentes]]
+            validos = ~np.isnan(numeros_y)
+            somas = np.bincount(xs[validos], weights=numeros_y[validos], minlength=quantidade_valores)
+            com_numero = np.bincount(xs[validos], minlength=quantidade_valores)
+
+        grupos = []
+        for codigo in np.nonzero(contagens)[0]:
+            if somar:
+                # Igual ao SUM do SQL: grupo sem nenhum número resulta em NULL
+                y = float(somas[codigo]) if com_numero[codigo] else None
+            else:
+                y = int(contagens[codigo])
+
+            numero = coluna_x.numeros[codigo]
+            grupos.append((
+                coluna_x.valores[codigo],
+                None if np.isnan(numero) else numero,
+                coluna_x.datas[codigo],
+                y
+            ))
+        return grupos
+
+    def tamanho_bytes(self) -> int:
+        return sum(coluna.tamanho_bytes() for coluna in self.colunas.values()) + len(self.submissoes) * 60
+
+_lock = Lock()
+
+# Cubos carregados, do menos para o mais recentemente usado
+_cubos: "OrderedDict[int, CuboProjeto]" = OrderedDict()
+
+def _carregar(db: Session, projeto_id: int, versao: int) -> CuboProjeto:
+    query = text("""
+        SELECT r.SUBMISSAO_ID, r.PERGUNTA_ID, r.RESPOSTA, r.RESPOSTA_NUMERO, r.RESPOSTA_DATA
+        FROM RESPOSTA r
+        INNER JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
+        WHERE s.PROJETO_ID = :projeto_id
+        AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+        ORDER BY s.DATA_CADASTRO, s.ID
+    """)
+    dados = db.execute(query, {"projeto_id": projeto_id}, execution_options={"yield_per": 5000})
+
+    cubo = CuboProjeto(versao)
+    submissao_atual = None
+    respostas = []
+    for row in dados:
+        if row.submissao_id != submissao_atual:
+            if respostas:
+                cubo.adicionar_submissao(submissao_atual, respostas)
+            submissao_atual = row.submissao_id
+            respostas = []
+        respostas.append((row.pergunta_id, row.resposta, row.resposta_numero, row.resposta_data))
+    if respostas:
+        cubo.adicionar_submissao(submissao_atual, respostas)
+
+    return cubo
+
+def _liberar_memoria():
+    """Descarta os cubos menos usados até caber no limite de memória"""
+    limite = settings.CUBO_MEMORIA_MAXIMA_MB * 1024 * 1024
+    total = sum(cubo.tamanho_bytes() for cubo in _cubos.values())
+    while _cubos and total > limite:
+        _, cubo = _cubos.popitem(last=False)
+        total -= cubo.tamanho_bytes()
+
+def obter_cubo(db: Session, projeto_id: int) -> CuboProjeto:
+    """Retorna o cubo do projeto, carregando-o do banco quando a versão dos dados mudou"""
+    # Lida antes da carga: o cubo pode conter mais do que a versão indica, nunca menos
+    versao = contadores.versao_projeto(db, projeto_id).dados
+
+    with _lock:
+        cubo = _cubos.get(projeto_id)
+        if cubo is not None and cubo.versao >= versao:
+            _cubos.move_to_end(projeto_id)
+            return cubo
+
+    cubo = _carregar(db, projeto_id, versao)
+
+    with _lock:
+        atual = _cubos.get(projeto_id)
+        if atual is None or atual.versao < versao:
+            _cubos[projeto_id] = cubo
+            _liberar_memoria()
+    return cubo
+
+def agregar_xy(db: Session, projeto_id: int, pergunta_x: int, pergunta_y: int, somar: bool) -> List[Tuple[str, Optional[float], Any, Any]]:
+    cubo = obter_cubo(db, projeto_id)
+    with cubo.lock:
+        return cubo.agregar_xy(pergunta_x, pergunta_y, somar)
+
+def registrar_submissoes(projeto_id: int, versao_anterior: int, versao: int, submissoes: List[Tuple[int, List[RespostaCubo]]]):
+    """Acrescenta submissões já confirmadas no banco ao cubo carregado do projeto. Só vale se o cubo
+    estava exatamente na versão anterior à escrita; senão ele é descartado e recarregado no próximo uso"""
+    if not habilitado():
+        return
+    with _lock:
+        cubo = _cubos.get(projeto_id)
+    if cubo is None:
+        return
+
+    with cubo.lock:
+        atualizado = cubo.versao == versao_anterior
+        if atualizado:
+            capacidade = cubo.capacidade
+            for submissao_id, respostas in submissoes:
+                cubo.adicionar_submissao(submissao_id, respostas)
+            cubo.versao = versao
+
+    if atualizado:
+        # As colunas dobraram de tamanho: o cubo pode ter passado do limite de memória
+        if cubo.capacidade != capacidade:
+            with _lock:
+                _liberar_memoria()
+        return
+
+    # Escritas de outros processos (ou fora de ordem) no meio: o cubo não sabe o que perdeu
+    if cubo.versao < versao:
+        with _lock:
+            if _cubos.get(projeto_id) is cubo:
+                del _cubos[projeto_id]
+
+def registrar_submissao(projeto_id: int, versao: int, submissao_id: int, respostas: List[RespostaCubo]):
+    registrar_submissoes(projeto_id, versao - 1, versao, [(submissao_id, respostas)])
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import contadores
+
+# Quantidade máxima de formulários mantidos em memória por processo
+TAMANHO_MAXIMO_CACHE = 256
+
+class DefinicaoFormulario(NamedTuple):
+    perguntas: List[Any]
+    # pergunta_id -> valores das perguntas pré-definidas. As instâncias das perguntas
+    # do tipo entidade não fazem parte do formulário: são buscadas sob demanda (busca_entidades)
+    valores_padrao: Dict[int, List[str]]
+
+_lock = Lock()
+
+# Cache LRU: projeto_id -> (versão do esquema em CONTADOR_PROJETO, definição do formulário)
+_definicoes: "OrderedDict[int, Tuple[int, DefinicaoFormulario]]" = OrderedDict()
+
+def carregar_definicao(db: Session, projeto_id: int) -> DefinicaoFormulario:
+    """Monta o formulário do projeto: perguntas e valores padrão"""
+
+    query_perguntas = text("""
+        SELECT p.ID, p.PERGUNTA, p.TIPO, p.MODELO, p.ESTR_ENTIDADE_ID
+        FROM PERGUNTA p
+        WHERE p.PROJETO_ID = :projeto_id
+        ORDER BY p.ID
+    """)
+    perguntas = db.execute(query_perguntas, {"projeto_id": projeto_id}).fetchall()
+
+    # Uma única consulta para os valores padrão de todas as perguntas pré-definidas
+    ids_pre_definidas = [p.id for p in perguntas if p.modelo == 'pre-definido']
+    valores_padrao = {pergunta_id: [] for pergunta_id in ids_pre_definidas}
+    if ids_pre_definidas:
+        query_valores = text("""
+            SELECT PERGUNTA_ID, VALOR FROM VALORES_PADRAO 
+            WHERE PERGUNTA_ID = ANY(CAST(:pergunta_ids AS INT[]))
+            ORDER BY PERGUNTA_ID, VALOR
+        """)
+        for row in db.execute(query_valores, {"pergunta_ids": ids_pre_definidas}):
+            valores_padrao[row.pergunta_id].append(row.valor)
+
+    return DefinicaoFormulario(perguntas, valores_padrao)
+
+def obter_definicao(db: Session, projeto_id: int, versao_esquema: Optional[int] = None) -> DefinicaoFormulario:
+    """Retorna o formulário em cache, montando-o apenas após alterações no projeto (em qualquer processo)"""
+    if versao_esquema is None:
+        versao_esquema = contadores.versao_projeto(db, projeto_id).esquema
+
+    with _lock:
+        item = _definicoes.get(projeto_id)
+        if item is not None and item[0] == versao_esquema:
+            _definicoes.move_to_end(projeto_id)
+            return item[1]
+
+    definicao = carregar_definicao(db, projeto_id)
+
+    with _lock:
+        item = _definicoes.get(projeto_id)
+        if item is None or item[0] <= versao_esquema:
+            _definicoes[projeto_id] = (versao_esquema, definicao)
+            while len(_definicoes) > TAMANHO_MAXIMO_CACHE:
+                _definicoes.popitem(last=False)
+    return definicao
@@ -0,0 +1,102 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core import cubo_respostas
+from app.core.config import settings
+from app.db import gravacao_respostas
+from app.db.database import AsyncSessionLocal
+from app.db.gravacao_respostas import RespostaGravacao
+
+# (projeto_id, usuario_id, respostas, futuro resolvido com o ID após o commit do lote)
+PedidoEscrita = Tuple[int, int, List[RespostaGravacao], asyncio.Future]
+
+def habilitada() -> bool:
+    return settings.ESCRITA_AGRUPADA_HABILITADA
+
+class EscritorAgrupado:
+    """Agrupa as submissões que chegam dentro da janela em uma única transação.
+    Cada requisição só recebe o ID depois do commit do seu lote"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.fila: "asyncio.Queue[PedidoEscrita]" = asyncio.Queue()
+        self.tarefa = self.loop.create_task(self._executar())
+
+    async def enviar(self, projeto_id: int, usuario_id: int, respostas: List[RespostaGravacao]) -> int:
+        futuro = self.loop.create_future()
+        await self.fila.put((projeto_id, usuario_id, respostas, futuro))
+        # shield: se o cliente desconectar, a submissão ainda é gravada com o lote
+        return await asyncio.shield(futuro)
+
+    async def _coletar_lote(self) -> List[PedidoEscrita]:
+        lote = [await self.fila.get()]
+        limite = self.loop.time() + settings.ESCRITA_AGRUPADA_JANELA_MS / 1000
+        while len(lote) < settings.ESCRITA_AGRUPADA_MAXIMO_LOTE:
+            restante = limite - self.loop.time()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self.fila.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _gravar(self, lote: List[PedidoEscrita]):
+        try:
+            async with AsyncSessionLocal(info={"timeout_ms": settings.TIMEOUT_CONSULTA_TRANSACIONAL_MS}) as db:
+                submissao_ids, versoes = await db.run_sync(
+                    gravacao_respostas.gravar_submissoes,
+                    [(projeto_id, usuario_id, respostas) for projeto_id, usuario_id, respostas, _ in lote]
+                )
+                await db.commit()
+        except Exception as e:
+            # Erro nos dados de uma submissão não pode derrubar as demais: regrava uma a uma.
+            # Timeout ou conexão perdida falham o lote inteiro, sem multiplicar a carga no banco
+            if len(lote) > 1 and isinstance(e, (IntegrityError, DataError)):
+                print(f"Erro ao gravar lote de {len(lote)} submissões, gravando individualmente: {e}")
+                for pedido in lote:
+                    await self._gravar([pedido])
+                return
+            if len(lote) > 1:
+                print(f"Erro ao gravar lote de {len(lote)} submissões: {e}")
+            for _, _, _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+
+        # O cubo de cada projeto recebe as submissões do lote de uma vez, na versão gravada pelo lote
+        por_projeto = {}
+        for (projeto_id, _, respostas, _), submissao_id in zip(lote, submissao_ids):
+            por_projeto.setdefault(projeto_id, []).append(
+                (submissao_id, [(pid, valor, numero, data) for pid, valor, numero, data, _, _ in respostas])
+            )
+        for projeto_id, submissoes in por_projeto.items():
+            versao_anterior, versao = versoes[projeto_id]
+            cubo_respostas.registrar_submissoes(projeto_id, versao_anterior, versao, submissoes)
+
+        for (_, _, _, futuro), submissao_id in zip(lote, submissao_ids):
+            if not futuro.done():
+                futuro.set_result(submissao_id)
+
+    async def _executar(self):
+        while True:
+            lote = await self._coletar_lote()
+            try:
+                await self._gravar(lote)
+            except Exception as e:
+                print(f"Erro no escritor agrupado: {e}")
+                for _, _, _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+
+_escritor: Optional[EscritorAgrupado] = None
+
+async def enviar_submissao(projeto_id: int, usuario_id: int, respostas: List[RespostaGravacao]) -> int:
+    """Entrega a submissão validada ao escritor do processo e aguarda o commit do seu lote"""
+    global _escritor
+    # Um escritor por event loop (o worker do uvicorn tem um único loop)
+    if _escritor is None or _escritor.loop is not asyncio.get_running_loop():
+        _escritor = EscritorAgrupado()
+    return await _escritor.enviar(projeto_id, usuario_id, respostas)
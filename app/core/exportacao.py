@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+from typing import Any, Iterable, Iterator, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.rotulos_entidade import resolver_rotulos_entidades
+from app.db.database import SessionLocal
+
+# Formatos aceitos: extensão do arquivo e media type da resposta
+FORMATOS_EXPORTACAO = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8"
+}
+
+# Linhas lidas do cursor do servidor a cada ida ao banco
+LINHAS_POR_LOTE = 5000
+
+# Submissões agrupadas antes de resolver os rótulos de entidade e enviar ao cliente
+SUBMISSOES_POR_LOTE = 500
+
+def abrir_sessao_exportacao() -> Session:
+    """Sessão própria da exportação: vive enquanto a resposta é enviada, além da requisição"""
+    return SessionLocal(info={"timeout_ms": settings.TIMEOUT_CONSULTA_ANALITICA_MS})
+
+def buscar_perguntas(db: Session, projeto_id: int) -> List[Any]:
+    query = text("""
+        SELECT ID, PERGUNTA, TIPO
+        FROM PERGUNTA
+        WHERE PROJETO_ID = :projeto_id
+        ORDER BY ID
+    """)
+    return db.execute(query, {"projeto_id": projeto_id}).fetchall()
+
+def buscar_atributos(db: Session, entidade_id: int) -> List[Any]:
+    query = text("""
+        SELECT ID_SEQ, NOME_ATRIBUTO, LABEL
+        FROM ESTR_ATRIBUTOS
+        WHERE ESTR_ENTIDADE_ID = :entidade_id
+        ORDER BY ID_SEQ
+    """)
+    return db.execute(query, {"entidade_id": entidade_id}).fetchall()
+
+def cabecalho_submissoes(perguntas: List[Any]) -> List[str]:
+    return ["submissao_id", "data_cadastro", "usuario"] + [p.pergunta for p in perguntas]
+
+def cabecalho_instancias(atributos: List[Any]) -> List[str]:
+    return ["id_seq", "data_cadastro"] + [a.label or a.nome_atributo for a in atributos]
+
+def _resolver_entidades(db: Session, lote: List[List[Any]], colunas_entidade: List[int]):
+    """Troca as chaves 'estr_id_seq' das colunas de entidade pelo texto de exibição, com uma consulta por lote"""
+    if not colunas_entidade:
+        return
+    chaves = {linha[i] for linha in lote for i in colunas_entidade if linha[i]}
+    rotulos = resolver_rotulos_entidades(db, chaves)
+    for linha in lote:
+        for i in colunas_entidade:
+            if linha[i]:
+                linha[i] = rotulos.get(linha[i], linha[i])
+
+def linhas_submissoes(db: Session, projeto_id: int, perguntas: List[Any]) -> Iterator[List[Any]]:
+    """Uma linha por submissão, com uma coluna por pergunta, lida em lotes por cursor do servidor"""
+
+    deslocamento = 3
+    colunas = {p.id: deslocamento + i for i, p in enumerate(perguntas)}
+    colunas_entidade = [colunas[p.id] for p in perguntas if p.tipo == 'entidade']
+
+    query = text("""
+        SELECT s.ID as submissao_id, s.DATA_CADASTRO, u.NOME as usuario,
+               r.PERGUNTA_ID, r.RESPOSTA
+        FROM SUBMISSAO s
+        INNER JOIN USUARIO u ON s.USUARIO_ID = u.ID
+        LEFT JOIN RESPOSTA r ON r.SUBMISSAO_ID = s.ID
+        WHERE s.PROJETO_ID = :projeto_id
+        ORDER BY s.ID
+    """)
+    dados = db.execute(query, {"projeto_id": projeto_id}, execution_options={"yield_per": LINHAS_POR_LOTE})
+
+    lote = []
+    linha = None
+    for row in dados:
+        if linha is None or row.submissao_id != linha[0]:
+            if len(lote) >= SUBMISSOES_POR_LOTE:
+                _resolver_entidades(db, lote, colunas_entidade)
+                yield from lote
+                lote = []
+            linha = [row.submissao_id, row.data_cadastro.isoformat(), row.usuario] + [""] * len(perguntas)
+            lote.append(linha)
+        coluna = colunas.get(row.pergunta_id)
+        if coluna is not None and row.resposta:
+            linha[coluna] = row.resposta
+
+    _resolver_entidades(db, lote, colunas_entidade)
+    yield from lote
+
+def linhas_instancias(db: Session, entidade_id: int, atributos: List[Any]) -> Iterator[List[Any]]:
+    """Uma linha por instância da entidade, com uma coluna por atributo"""
+
+    deslocamento = 2
+    colunas = {a.id_seq: deslocamento + i for i, a in enumerate(atributos)}
+
+    query = text("""
+        SELECT e.ID_SEQ, e.DATA_CADASTRO, a.ESTR_ATRIBUTO_ID_SEQ, a.VALOR
+        FROM ENTIDADE e
+        LEFT JOIN ATRIBUTOS a ON a.ESTR_ENTIDADE_ID = e.ESTR_ENTIDADE_ID AND a.ENTIDADE_ID_SEQ = e.ID_SEQ
+        WHERE e.ESTR_ENTIDADE_ID = :entidade_id
+        ORDER BY e.ID_SEQ
+    """)
+    dados = db.execute(query, {"entidade_id": entidade_id}, execution_options={"yield_per": LINHAS_POR_LOTE})
+
+    linha = None
+    for row in dados:
+        if linha is None or row.id_seq != linha[0]:
+            if linha is not None:
+                yield linha
+            linha = [row.id_seq, row.data_cadastro.isoformat()] + [""] * len(atributos)
+        coluna = colunas.get(row.estr_atributo_id_seq)
+        if coluna is not None and row.valor is not None:
+            linha[coluna] = row.valor
+    if linha is not None:
+        yield linha
+
+def formatar(cabecalho: List[str], linhas: Iterable[List[Any]], formato: str) -> Iterator[str]:
+    """Serializa as linhas em CSV ou JSON lines, em blocos de texto enviados à medida que são gerados"""
+
+    if formato == "jsonl":
+        bloco = []
+        for linha in linhas:
+            bloco.append(json.dumps(dict(zip(cabecalho, linha)), ensure_ascii=False, default=str))
+            if len(bloco) >= SUBMISSOES_POR_LOTE:
+                yield "\n".join(bloco) + "\n"
+                bloco = []
+        if bloco:
+            yield "\n".join(bloco) + "\n"
+        return
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    # BOM: o Excel só reconhece o CSV como UTF-8 (acentos) com ele
+    buffer.write("\ufeff")
+    escritor.writerow(cabecalho)
+    for i, linha in enumerate(linhas, start=1):
+        escritor.writerow(linha)
+        if i % SUBMISSOES_POR_LOTE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+def exportar_submissoes(projeto_id: int, formato: str) -> Iterator[str]:
+    """Gera o arquivo de submissões do projeto; a sessão é fechada ao fim do envio ou se o cliente desistir"""
+    db = abrir_sessao_exportacao()
+    try:
+        perguntas = buscar_perguntas(db, projeto_id)
+        yield from formatar(cabecalho_submissoes(perguntas), linhas_submissoes(db, projeto_id, perguntas), formato)
+    finally:
+        db.close()
+
+def exportar_instancias(entidade_id: int, formato: str) -> Iterator[str]:
+    """Gera o arquivo de instâncias da entidade"""
+    db = abrir_sessao_exportacao()
+    try:
+        atributos = buscar_atributos(db, entidade_id)
+        yield from formatar(cabecalho_instancias(atributos), linhas_instancias(db, entidade_id, atributos), formato)
+    finally:
+        db.close()
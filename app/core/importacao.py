@@ -0,0 +1,173 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core import validacao_respostas
+from app.db import contadores, resumo_respostas
+from app.db.gravacao_respostas import RespostaGravacao
+
+FORMATOS_IMPORTACAO = ("csv", "jsonl")
+
+# Submissões validadas e gravadas (COPY) por vez
+SUBMISSOES_POR_LOTE = 5000
+
+# Acima deste número de linhas com erro a importação para de validar o arquivo
+MAXIMO_LINHAS_COM_ERRO = 100
+
+# Coluna opcional com a data da submissão (ISO 8601); sem ela, vale o horário da importação
+COLUNA_DATA = "data_cadastro"
+
+class ResultadoImportacao(NamedTuple):
+    importadas: int
+    # (número da linha no arquivo, mensagens de erro)
+    erros: List[Tuple[int, List[str]]]
+
+class RegistroImportacao(NamedTuple):
+    linha: int
+    respostas: Dict[str, str]
+    data_cadastro: Optional[str]
+
+def _nome_campo(coluna: str) -> Optional[str]:
+    """Aceita a coluna como '12' ou 'pergunta_12' e retorna o nome do campo do formulário"""
+    coluna = coluna.strip()
+    numero = coluna[len("pergunta_"):] if coluna.startswith("pergunta_") else coluna
+    return f"pergunta_{numero}" if numero.isdigit() else None
+
+def _texto(valor: Any) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    return str(valor)
+
+def _montar_registro(linha: int, dados: Dict[str, Any]) -> RegistroImportacao:
+    respostas = {}
+    data_cadastro = None
+    for coluna, valor in dados.items():
+        if coluna is None:
+            continue
+        if coluna.strip() == COLUNA_DATA:
+            data_cadastro = _texto(valor).strip() or None
+            continue
+        campo = _nome_campo(coluna)
+        if campo is None:
+            raise ValueError(f"Linha {linha}: coluna desconhecida '{coluna}' (use o id da pergunta ou pergunta_<id>)")
+        respostas[campo] = _texto(valor)
+    return RegistroImportacao(linha, respostas, data_cadastro)
+
+def ler_registros(arquivo: BinaryIO, formato: str) -> Iterator[RegistroImportacao]:
+    """Lê o arquivo de submissões: CSV com cabeçalho ou um objeto JSON por linha, chaves pelo id da pergunta"""
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+
+    if formato == "csv":
+        leitor = csv.DictReader(texto)
+        for dados in leitor:
+            # line_num é a linha física atual, contando o cabeçalho
+            yield _montar_registro(leitor.line_num, dados)
+        return
+
+    for numero, conteudo in enumerate(texto, start=1):
+        if not conteudo.strip():
+            continue
+        try:
+            dados = json.loads(conteudo)
+        except ValueError:
+            raise ValueError(f"Linha {numero}: JSON inválido")
+        if not isinstance(dados, dict):
+            raise ValueError(f"Linha {numero}: cada linha deve ser um objeto JSON")
+        yield _montar_registro(numero, dados)
+
+def _copiar(db: Session, tabela: str, colunas: List[str], linhas: List[Tuple]):
+    """Grava as linhas com COPY FROM STDIN (CSV; campo vazio sem aspas é NULL)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for linha in linhas:
+        escritor.writerow(["" if v is None else (v.isoformat() if hasattr(v, "isoformat") else v) for v in linha])
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+def _gravar_lote(db: Session, projeto_id: int, usuario_id: int, lote: List[Tuple[datetime, List[RespostaGravacao]]]) -> List[int]:
+    # IDs reservados da sequência da identidade; COPY grava o valor informado na coluna de identidade
+    submissao_ids = db.execute(text("""
+        SELECT nextval(pg_get_serial_sequence('submissao', 'id'))
+        FROM generate_series(1, :quantidade)
+    """), {"quantidade": len(lote)}).scalars().all()
+
+    _copiar(db, "SUBMISSAO", ["ID", "PROJETO_ID", "USUARIO_ID", "DATA_CADASTRO"], [
+        (submissao_id, projeto_id, usuario_id, data_cadastro)
+        for submissao_id, (data_cadastro, _) in zip(submissao_ids, lote)
+    ])
+    _copiar(db, "RESPOSTA", [
+        "SUBMISSAO_ID", "PERGUNTA_ID", "RESPOSTA", "RESPOSTA_NUMERO", "RESPOSTA_DATA",
+        "ENTIDADE_ESTR_ENTIDADE_ID", "ENTIDADE_ID_SEQ"
+    ], [
+        (submissao_id, *resposta)
+        for submissao_id, (_, respostas) in zip(submissao_ids, lote)
+        for resposta in respostas
+    ])
+    return submissao_ids
+
+def importar_submissoes(db: Session, projeto_id: int, usuario_id: int, arquivo: BinaryIO, formato: str) -> ResultadoImportacao:
+    """Valida e grava as submissões do arquivo em uma única transação: com qualquer erro, nada é gravado"""
+
+    validador = validacao_respostas.obter_validador(db, projeto_id)
+    campos_validos = {f"pergunta_{campo.pergunta_id}" for campo in validador.campos}
+    agora = db.execute(text("SELECT NOW()")).scalar()
+
+    erros = []
+    submissao_ids = []
+
+    def processar(registros: List[RegistroImportacao]):
+        resultados = validador.validar_lote(db, [r.respostas for r in registros])
+        lote = []
+        for registro, (linhas, erros_linha) in zip(registros, resultados):
+            desconhecidas = sorted(set(registro.respostas) - campos_validos)
+            if desconhecidas:
+                erros_linha.append(f"Perguntas que não pertencem ao projeto: {', '.join(desconhecidas)}")
+
+            data_cadastro = agora
+            if registro.data_cadastro:
+                try:
+                    data_cadastro = datetime.fromisoformat(registro.data_cadastro)
+                except ValueError:
+                    erros_linha.append(f"{COLUNA_DATA} inválida: use o formato AAAA-MM-DD ou AAAA-MM-DDTHH:MM:SS")
+
+            if erros_linha:
+                erros.append((registro.linha, erros_linha))
+            else:
+                lote.append((data_cadastro, linhas))
+
+        # Após o primeiro erro o arquivo só é validado, para listar os demais
+        if lote and not erros:
+            submissao_ids.extend(_gravar_lote(db, projeto_id, usuario_id, lote))
+
+    registros = []
+    for registro in ler_registros(arquivo, formato):
+        registros.append(registro)
+        if len(registros) >= SUBMISSOES_POR_LOTE:
+            processar(registros)
+            registros = []
+            if len(erros) >= MAXIMO_LINHAS_COM_ERRO:
+                break
+    else:
+        if registros:
+            processar(registros)
+
+    if erros:
+        db.rollback()
+        return ResultadoImportacao(0, erros[:MAXIMO_LINHAS_COM_ERRO])
+
+    resumo_respostas.registrar_submissoes(db, submissao_ids)
+    contadores.registrar_submissoes(db, projeto_id, usuario_id, submissao_ids)
+    db.commit()
+    return ResultadoImportacao(len(submissao_ids), [])
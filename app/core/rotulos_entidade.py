@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Quantidade máxima de rótulos mantidos em memória por processo
+TAMANHO_MAXIMO_CACHE = 20000
+
+# Cache LRU: (estr_entidade_id, id_seq) -> (versão do esquema do projeto, texto de exibição).
+# A versão é CONTADOR_PROJETO.VERSAO_ESQUEMA, incrementada nas alterações de entidades,
+# atributos e instâncias em qualquer processo
+_cache_rotulos: "OrderedDict[Tuple[int, int], Tuple[int, str]]" = OrderedDict()
+_lock = Lock()
+
+def _rotulo_padrao(chave: str) -> str:
+    return f"Entidade {chave}"
+
+def _converter_chave(chave: str) -> Optional[Tuple[int, int]]:
+    """Converte 'estr_entidade_id_seq' em (estr_entidade_id, id_seq)"""
+    partes = chave.split('_')
+    if len(partes) != 2:
+        return None
+    try:
+        return int(partes[0]), int(partes[1])
+    except ValueError:
+        return None
+
+def _versoes_esquema(db: Session, estr_entidade_ids: Iterable[int]) -> Dict[int, int]:
+    """Versão do esquema do projeto de cada estrutura de entidade"""
+    query = text("""
+        SELECT ee.ID, COALESCE(cp.VERSAO_ESQUEMA, 0) as versao
+        FROM ESTR_ENTIDADE ee
+        LEFT JOIN CONTADOR_PROJETO cp ON cp.PROJETO_ID = ee.PROJETO_ID
+        WHERE ee.ID = ANY(CAST(:estr_entidade_ids AS INT[]))
+    """)
+    return {row.id: row.versao for row in db.execute(query, {"estr_entidade_ids": list(estr_entidade_ids)})}
+
+def resolver_rotulos_entidades(db: Session, chaves: Iterable[str]) -> Dict[str, str]:
+    """Resolve o texto de exibição de várias entidades com uma única consulta (mais a das versões).
+    Erros do banco são propagados: a transação do chamador não pode seguir como se nada tivesse ocorrido"""
+
+    rotulos = {}
+    pares = {}
+    for chave in chaves:
+        if chave in rotulos or chave in pares:
+            continue
+        par = _converter_chave(chave)
+        if par is None:
+            rotulos[chave] = _rotulo_padrao(chave)
+        else:
+            pares[chave] = par
+
+    if not pares:
+        return rotulos
+
+    # Lidas antes dos rótulos: uma alteração concorrente deixa o rótulo guardado em uma versão já superada
+    versoes = _versoes_esquema(db, {par[0] for par in pares.values()})
+
+    pendentes = {}
+    with _lock:
+        for chave, par in pares.items():
+            item = _cache_rotulos.get(par)
+            if item is not None and item[0] == versoes.get(par[0]):
+                _cache_rotulos.move_to_end(par)
+                rotulos[chave] = item[1]
+            else:
+                pendentes[chave] = par
+
+    if not pendentes:
+        return rotulos
+
+    # Mesma regra da consulta individual: primeiro atributo de exibição da estrutura
+    query = text("""
+        SELECT DISTINCT ON (k.ESTR_ENTIDADE_ID, k.ID_SEQ)
+               k.ESTR_ENTIDADE_ID, k.ID_SEQ, a.VALOR
+        FROM UNNEST(CAST(:estr_entidade_ids AS INT[]), CAST(:id_seqs AS INT[])) AS k(ESTR_ENTIDADE_ID, ID_SEQ)
+        INNER JOIN ESTR_ATRIBUTOS ea ON ea.ESTR_ENTIDADE_ID = k.ESTR_ENTIDADE_ID
+                                     AND ea.EXIBICAO = TRUE
+        LEFT JOIN ATRIBUTOS a ON ea.ESTR_ENTIDADE_ID = a.ESTR_ENTIDADE_ID
+                              AND ea.ID_SEQ = a.ESTR_ATRIBUTO_ID_SEQ
+                              AND a.ENTIDADE_ID_SEQ = k.ID_SEQ
+        ORDER BY k.ESTR_ENTIDADE_ID, k.ID_SEQ, ea.ID_SEQ
+    """)
+    resultado = db.execute(query, {
+        "estr_entidade_ids": [p[0] for p in pendentes.values()],
+        "id_seqs": [p[1] for p in pendentes.values()]
+    }).fetchall()
+    encontrados = {(row.estr_entidade_id, row.id_seq): row.valor for row in resultado}
+
+    with _lock:
+        for chave, par in pendentes.items():
+            rotulo = encontrados.get(par) or _rotulo_padrao(chave)
+            rotulos[chave] = rotulo
+
+            versao = versoes.get(par[0])
+            item = _cache_rotulos.get(par)
+            # Estrutura excluída não é guardada; um rótulo já guardado em versão mais nova é mantido
+            if versao is not None and (item is None or item[0] <= versao):
+                _cache_rotulos[par] = (versao, rotulo)
+                _cache_rotulos.move_to_end(par)
+
+        while len(_cache_rotulos) > TAMANHO_MAXIMO_CACHE:
+            _cache_rotulos.popitem(last=False)
+
+    return rotulos
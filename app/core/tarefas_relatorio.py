@@ -0,0 +1,306 @@
+import argparse
+import glob
+import os
+import time
+from multiprocessing import Process
+from typing import Any, Iterable, Iterator, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core import exportacao
+from app.core.config import settings
+from app.db.database import SessionLocal, engine
+
+# Situações de uma tarefa: pendente -> executando -> concluido | erro | cancelado;
+# concluido -> expirado quando o arquivo é removido após RELATORIOS_VALIDADE_HORAS
+SITUACOES_ATIVAS = ("pendente", "executando")
+
+# Intervalo mínimo entre as gravações de progresso (que também verificam o cancelamento)
+INTERVALO_PROGRESSO_S = 2.0
+
+# Espera entre as buscas por tarefas quando a fila está vazia
+INTERVALO_FILA_S = 3.0
+
+# Tarefa em execução sem progresso há este tempo é considerada abandonada e volta à fila
+MINUTOS_ABANDONO = 10
+
+# Limite de cada comando da leitura (inclusive cada FETCH do cursor): metade do tempo de
+# abandono, para que uma consulta lenta falhe antes de a tarefa ser reservada por outro trabalhador
+TIMEOUT_LEITURA_MS = MINUTOS_ABANDONO * 60 * 1000 // 2
+
+# Intervalo entre as limpezas de arquivos expirados ou sem tarefa, feitas pelos trabalhadores
+INTERVALO_LIMPEZA_S = 600.0
+
+# Primeira chave do pg_advisory_xact_lock usado ao enfileirar (a segunda é o usuário)
+CLASSE_BLOQUEIO_FILA = 1016
+
+class LimiteTarefasExcedido(Exception):
+    """O usuário já tem o máximo de relatórios na fila ou em execução"""
+
+def caminho_arquivo(tarefa_id: int, formato: str) -> str:
+    return os.path.join(settings.RELATORIOS_DIRETORIO, f"relatorio_{tarefa_id}.{formato}")
+
+def _remover(caminho: str):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+def caminho_parcial(tarefa_id: int, formato: str, tentativa: int) -> str:
+    # Um arquivo parcial por tentativa: uma reserva anterior ainda viva nunca escreve no mesmo arquivo
+    return f"{caminho_arquivo(tarefa_id, formato)}.{tentativa}.parcial"
+
+def remover_arquivos(tarefa_id: int, formato: str):
+    """Remove o arquivo da tarefa e os parciais de todas as tentativas, se existirem"""
+    caminho = caminho_arquivo(tarefa_id, formato)
+    _remover(caminho)
+    for parcial in glob.glob(glob.escape(caminho) + ".*.parcial"):
+        _remover(parcial)
+
+def enfileirar(db: Session, usuario_id: int, projeto_id: int, formato: str) -> int:
+    """Cria uma tarefa pendente, respeitando o limite de tarefas ativas por usuário"""
+
+    # Serializa os pedidos do mesmo usuário entre a contagem e a inserção
+    db.execute(text("SELECT pg_advisory_xact_lock(:classe, :usuario_id)"), {
+        "classe": CLASSE_BLOQUEIO_FILA, "usuario_id": usuario_id
+    })
+    ativas = db.execute(text("""
+        SELECT COUNT(*) FROM TAREFA_RELATORIO
+        WHERE USUARIO_ID = :usuario_id AND STATUS IN ('pendente', 'executando')
+    """), {"usuario_id": usuario_id}).scalar()
+    if ativas >= settings.RELATORIOS_MAXIMO_POR_USUARIO:
+        raise LimiteTarefasExcedido()
+
+    tarefa_id = db.execute(text("""
+        INSERT INTO TAREFA_RELATORIO (USUARIO_ID, PROJETO_ID, FORMATO, STATUS)
+        VALUES (:usuario_id, :projeto_id, :formato, 'pendente')
+        RETURNING ID
+    """), {"usuario_id": usuario_id, "projeto_id": projeto_id, "formato": formato}).scalar()
+    db.commit()
+    return tarefa_id
+
+def cancelar(db: Session, tarefa_id: int, usuario_id: int) -> bool:
+    """Marca a tarefa como cancelada e remove o que já foi escrito; o trabalhador interrompe
+    a geração na próxima gravação de progresso"""
+    formato = db.execute(text("""
+        UPDATE TAREFA_RELATORIO
+        SET STATUS = 'cancelado', DATA_FIM = NOW()
+        WHERE ID = :tarefa_id AND USUARIO_ID = :usuario_id AND STATUS IN ('pendente', 'executando')
+        RETURNING FORMATO
+    """), {"tarefa_id": tarefa_id, "usuario_id": usuario_id}).scalar()
+    db.commit()
+    if formato is None:
+        return False
+    remover_arquivos(tarefa_id, formato)
+    return True
+
+def listar(db: Session, usuario_id: int, limite: int = 20) -> List[Any]:
+    query = text("""
+        SELECT t.ID, t.PROJETO_ID, p.NOME as projeto_nome, t.FORMATO, t.STATUS,
+               t.PROGRESSO, t.TOTAL, t.ERRO, t.DATA_CADASTRO, t.DATA_FIM
+        FROM TAREFA_RELATORIO t
+        INNER JOIN PROJETO p ON t.PROJETO_ID = p.ID
+        WHERE t.USUARIO_ID = :usuario_id
+        ORDER BY t.ID DESC
+        LIMIT :limite
+    """)
+    return db.execute(query, {"usuario_id": usuario_id, "limite": limite}).fetchall()
+
+def buscar_concluida(db: Session, tarefa_id: int, usuario_id: int) -> Optional[Any]:
+    query = text("""
+        SELECT ID, PROJETO_ID, FORMATO, ARQUIVO
+        FROM TAREFA_RELATORIO
+        WHERE ID = :tarefa_id AND USUARIO_ID = :usuario_id AND STATUS = 'concluido'
+    """)
+    return db.execute(query, {"tarefa_id": tarefa_id, "usuario_id": usuario_id}).first()
+
+def _reservar_proxima(db: Session) -> Optional[Any]:
+    """Reserva a tarefa pendente mais antiga (ou uma abandonada); SKIP LOCKED evita disputa entre trabalhadores.
+    Cada reserva incrementa TENTATIVA, exigida nas gravações seguintes do trabalhador"""
+    tarefa = db.execute(text(f"""
+        UPDATE TAREFA_RELATORIO
+        SET STATUS = 'executando', PROGRESSO = 0, TENTATIVA = TENTATIVA + 1,
+            DATA_INICIO = NOW(), DATA_ATUALIZACAO = NOW()
+        WHERE ID = (
+            SELECT ID FROM TAREFA_RELATORIO
+            WHERE STATUS = 'pendente'
+               OR (STATUS = 'executando' AND DATA_ATUALIZACAO < NOW() - INTERVAL '{MINUTOS_ABANDONO} minutes')
+            ORDER BY ID
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING ID, PROJETO_ID, FORMATO, TENTATIVA
+    """)).first()
+    db.commit()
+    return tarefa
+
+def _registrar_progresso(db: Session, tarefa_id: int, tentativa: int, progresso: int) -> bool:
+    """Grava o progresso e retorna False se a tarefa foi cancelada (ou reservada de novo) nesse meio tempo"""
+    situacao = db.execute(text("""
+        UPDATE TAREFA_RELATORIO
+        SET PROGRESSO = :progresso, DATA_ATUALIZACAO = NOW()
+        WHERE ID = :tarefa_id AND TENTATIVA = :tentativa AND STATUS = 'executando'
+        RETURNING STATUS
+    """), {"tarefa_id": tarefa_id, "tentativa": tentativa, "progresso": progresso}).scalar()
+    db.commit()
+    return situacao is not None
+
+def _bloquear_tentativa(db: Session, tarefa_id: int, tentativa: int) -> bool:
+    """Bloqueia a linha da tarefa até o próximo commit se ela ainda pertence a esta tentativa;
+    cancelamento e novas reservas aguardam a finalização"""
+    return db.execute(text("""
+        SELECT ID FROM TAREFA_RELATORIO
+        WHERE ID = :tarefa_id AND TENTATIVA = :tentativa AND STATUS = 'executando'
+        FOR UPDATE
+    """), {"tarefa_id": tarefa_id, "tentativa": tentativa}).scalar() is not None
+
+def _finalizar(db: Session, tarefa_id: int, tentativa: int, status: str, arquivo: Optional[str] = None, erro: Optional[str] = None, progresso: Optional[int] = None) -> bool:
+    """Encerra a tentativa em execução; retorna False se a tarefa foi cancelada ou reservada de novo antes"""
+    result = db.execute(text("""
+        UPDATE TAREFA_RELATORIO
+        SET STATUS = :status, ARQUIVO = :arquivo, ERRO = :erro,
+            PROGRESSO = COALESCE(:progresso, PROGRESSO), DATA_FIM = NOW(), DATA_ATUALIZACAO = NOW()
+        WHERE ID = :tarefa_id AND TENTATIVA = :tentativa AND STATUS = 'executando'
+    """), {
+        "tarefa_id": tarefa_id, "tentativa": tentativa, "status": status,
+        "arquivo": arquivo, "erro": erro, "progresso": progresso
+    })
+    db.commit()
+    return result.rowcount > 0
+
+def limpar_arquivos(db: Session) -> int:
+    """Expira os relatórios concluídos há mais de RELATORIOS_VALIDADE_HORAS e remove do diretório
+    os arquivos sem tarefa em execução ou concluída (canceladas, com erro ou excluídas em cascata).
+    Retorna a quantidade de arquivos removidos"""
+    expiradas = db.execute(text("""
+        UPDATE TAREFA_RELATORIO
+        SET STATUS = 'expirado', ARQUIVO = NULL, DATA_ATUALIZACAO = NOW()
+        WHERE STATUS = 'concluido' AND DATA_FIM < NOW() - make_interval(hours => :horas)
+        RETURNING ID, FORMATO
+    """), {"horas": settings.RELATORIOS_VALIDADE_HORAS}).fetchall()
+    db.commit()
+    for tarefa in expiradas:
+        remover_arquivos(tarefa.id, tarefa.formato)
+
+    # relatorio_{id}.{formato}[.{tentativa}.parcial] -> id
+    arquivos = {}
+    if os.path.isdir(settings.RELATORIOS_DIRETORIO):
+        for nome in os.listdir(settings.RELATORIOS_DIRETORIO):
+            partes = nome.split(".")[0].split("_")
+            if len(partes) == 2 and partes[0] == "relatorio" and partes[1].isdigit():
+                arquivos.setdefault(int(partes[1]), []).append(nome)
+    if not arquivos:
+        return len(expiradas)
+
+    mantidas = set(db.execute(text("""
+        SELECT ID FROM TAREFA_RELATORIO
+        WHERE ID = ANY(CAST(:ids AS INT[])) AND STATUS IN ('executando', 'concluido')
+    """), {"ids": list(arquivos)}).scalars().all())
+    db.commit()
+
+    removidos = len(expiradas)
+    for tarefa_id, nomes in arquivos.items():
+        if tarefa_id not in mantidas:
+            for nome in nomes:
+                _remover(os.path.join(settings.RELATORIOS_DIRETORIO, nome))
+                removidos += 1
+    return removidos
+
+def _contar(linhas: Iterable[List[Any]], estado: dict) -> Iterator[List[Any]]:
+    for linha in linhas:
+        estado["linhas"] += 1
+        yield linha
+
+def gerar(tarefa_id: int, projeto_id: int, formato: str, tentativa: int):
+    """Gera o arquivo da tarefa. A leitura usa uma sessão própria (cursor do servidor aberto
+    durante toda a geração); o progresso é gravado por outra, que confirma a cada atualização"""
+
+    controle = SessionLocal()
+    leitura = SessionLocal(info={"timeout_ms": TIMEOUT_LEITURA_MS})
+    caminho = caminho_arquivo(tarefa_id, formato)
+    temporario = caminho_parcial(tarefa_id, formato, tentativa)
+    estado = {"linhas": 0}
+    try:
+        total = controle.execute(text("""
+            SELECT COALESCE(MAX(TOTAL_SUBMISSOES), 0) FROM CONTADOR_PROJETO WHERE PROJETO_ID = :projeto_id
+        """), {"projeto_id": projeto_id}).scalar()
+        controle.execute(text("UPDATE TAREFA_RELATORIO SET TOTAL = :total WHERE ID = :tarefa_id AND TENTATIVA = :tentativa"), {
+            "total": total, "tarefa_id": tarefa_id, "tentativa": tentativa
+        })
+        controle.commit()
+
+        os.makedirs(settings.RELATORIOS_DIRETORIO, exist_ok=True)
+        perguntas = exportacao.buscar_perguntas(leitura, projeto_id)
+        linhas = _contar(exportacao.linhas_submissoes(leitura, projeto_id, perguntas), estado)
+        ultima_gravacao = time.monotonic()
+
+        with open(temporario, "w", encoding="utf-8", newline="") as arquivo:
+            for bloco in exportacao.formatar(exportacao.cabecalho_submissoes(perguntas), linhas, formato):
+                arquivo.write(bloco)
+                if time.monotonic() - ultima_gravacao >= INTERVALO_PROGRESSO_S:
+                    ultima_gravacao = time.monotonic()
+                    if not _registrar_progresso(controle, tarefa_id, tentativa, estado["linhas"]):
+                        # Cancelada pelo usuário ou reservada por outro trabalhador: descarta o parcial
+                        arquivo.close()
+                        _remover(temporario)
+                        return
+
+        # Com a linha bloqueada, nenhuma outra tentativa nem o cancelamento alcançam o arquivo final
+        if not _bloquear_tentativa(controle, tarefa_id, tentativa):
+            # Cancelada ou reservada de novo entre a última gravação de progresso e o fim da geração
+            controle.rollback()
+            _remover(temporario)
+            return
+        os.replace(temporario, caminho)
+        _finalizar(controle, tarefa_id, tentativa, "concluido", arquivo=caminho, progresso=estado["linhas"])
+
+    except Exception as e:
+        controle.rollback()
+        _remover(temporario)
+        print(f"Erro ao gerar relatório {tarefa_id}: {e}")
+        _finalizar(controle, tarefa_id, tentativa, "erro", erro=str(e)[:500])
+    finally:
+        leitura.close()
+        controle.close()
+
+def trabalhar():
+    """Laço de um trabalhador: reserva e gera tarefas até o processo ser encerrado"""
+
+    # Conexões herdadas do processo pai não podem ser compartilhadas após o fork
+    engine.dispose(close=False)
+
+    db = SessionLocal()
+    proxima_limpeza = time.monotonic()
+    try:
+        while True:
+            if time.monotonic() >= proxima_limpeza:
+                proxima_limpeza = time.monotonic() + INTERVALO_LIMPEZA_S
+                try:
+                    limpar_arquivos(db)
+                except Exception as e:
+                    db.rollback()
+                    print(f"Erro ao limpar relatórios expirados: {e}")
+
+            tarefa = _reservar_proxima(db)
+            if tarefa is None:
+                time.sleep(INTERVALO_FILA_S)
+                continue
+            gerar(tarefa.id, tarefa.projeto_id, tarefa.formato, tarefa.tentativa)
+    finally:
+        db.close()
+
+# Uso: python -m app.core.tarefas_relatorio [--processos N]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trabalhadores que geram os relatórios enfileirados")
+    parser.add_argument("--processos", type=int, default=2, help="Quantidade de trabalhadores")
+    args = parser.parse_args()
+
+    processos = [Process(target=trabalhar, daemon=True) for _ in range(args.processos)]
+    for processo in processos:
+        processo.start()
+    try:
+        for processo in processos:
+            processo.join()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,185 @@
+import re
+from collections import OrderedDict
+from datetime import date, datetime
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import contadores
+from app.db.gravacao_respostas import RespostaGravacao
+
+# Quantidade máxima de validadores mantidos em memória por processo
+TAMANHO_MAXIMO_CACHE = 256
+
+REGEX_EMAIL = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+
+class ValorConvertido(NamedTuple):
+    numero: Optional[float] = None
+    data: Optional[date] = None
+    entidade: Optional[Tuple[int, int]] = None
+
+def _converter_numero(valor: str) -> ValorConvertido:
+    try:
+        return ValorConvertido(numero=float(valor))
+    except ValueError:
+        raise ValueError("digite apenas números")
+
+def _converter_email(valor: str) -> ValorConvertido:
+    if not REGEX_EMAIL.match(valor):
+        raise ValueError("digite um email válido")
+    return ValorConvertido()
+
+def _converter_data(valor: str) -> ValorConvertido:
+    try:
+        return ValorConvertido(data=datetime.strptime(valor, '%Y-%m-%d').date())
+    except ValueError:
+        raise ValueError("selecione uma data válida (AAAA-MM-DD)")
+
+def _converter_booleano(valor: str) -> ValorConvertido:
+    if valor not in ('true', 'false'):
+        raise ValueError("selecione apenas Sim ou Não")
+    return ValorConvertido()
+
+def _converter_entidade(valor: str) -> ValorConvertido:
+    # Formato 'estr_entidade_id_seq'
+    partes = valor.split('_')
+    try:
+        if len(partes) != 2:
+            raise ValueError()
+        return ValorConvertido(entidade=(int(partes[0]), int(partes[1])))
+    except ValueError:
+        raise ValueError("selecione uma entidade válida")
+
+def _converter_texto(valor: str) -> ValorConvertido:
+    return ValorConvertido()
+
+# Regras por tipo de pergunta, usadas nas submissões e no cadastro de valores padrão
+CONVERSORES: Dict[str, Callable[[str], ValorConvertido]] = {
+    'numero': _converter_numero,
+    'email': _converter_email,
+    'data': _converter_data,
+    'booleano': _converter_booleano,
+    'entidade': _converter_entidade,
+}
+
+def converter_valor(tipo: str, valor: str) -> ValorConvertido:
+    """Converte o valor conforme o tipo da pergunta; ValueError traz a mensagem para o usuário"""
+    return CONVERSORES.get(tipo, _converter_texto)(valor)
+
+class CampoValidacao(NamedTuple):
+    pergunta_id: int
+    pergunta: str
+    tipo: str
+    estr_entidade_id: Optional[int]
+    converter: Callable[[str], ValorConvertido]
+
+class ValidadorProjeto:
+    """Regras de validação das perguntas de um projeto, montadas uma vez por versão do esquema"""
+
+    def __init__(self, perguntas: List[Any]):
+        self.campos = [
+            CampoValidacao(p.id, p.pergunta, p.tipo, p.estr_entidade_id, CONVERSORES.get(p.tipo, _converter_texto))
+            for p in perguntas
+        ]
+
+    def converter(self, form_data: Mapping[str, Any]) -> Tuple[List[RespostaGravacao], List[str], Dict[CampoValidacao, Tuple[int, int]]]:
+        """Aplica as regras de tipo a todos os campos; a existência das entidades fica para depois"""
+        linhas = []
+        erros = []
+        entidades = {}
+
+        for campo in self.campos:
+            valor = (form_data.get(f"pergunta_{campo.pergunta_id}") or "").strip()
+            if not valor:
+                continue
+
+            try:
+                convertido = campo.converter(valor)
+            except ValueError as e:
+                erros.append(f"Resposta inválida para '{campo.pergunta}': {e}")
+                continue
+
+            entidade_id = seq = None
+            if convertido.entidade:
+                entidade_id, seq = convertido.entidade
+                if campo.estr_entidade_id is not None and entidade_id != campo.estr_entidade_id:
+                    erros.append(f"Resposta inválida para '{campo.pergunta}': selecione uma entidade válida")
+                    continue
+                entidades[campo] = convertido.entidade
+
+            linhas.append((campo.pergunta_id, valor, convertido.numero, convertido.data, entidade_id, seq))
+
+        return linhas, erros, entidades
+
+    def validar(self, db: Session, form_data: Mapping[str, Any]) -> Tuple[List[RespostaGravacao], List[str]]:
+        """Valida todos os campos e retorna (respostas a gravar, mensagens de erro)"""
+        return self.validar_lote(db, [form_data])[0]
+
+    def validar_lote(self, db: Session, formularios: List[Mapping[str, Any]]) -> List[Tuple[List[RespostaGravacao], List[str]]]:
+        """Valida vários formulários; as entidades de todos são verificadas com uma única consulta"""
+        convertidos = [self.converter(form_data) for form_data in formularios]
+
+        pares = {par for _, erros, entidades in convertidos if not erros for par in entidades.values()}
+        existentes = entidades_existentes(db, pares) if pares else set()
+
+        resultados = []
+        for linhas, erros, entidades in convertidos:
+            if not erros:
+                for campo, par in entidades.items():
+                    if par not in existentes:
+                        erros.append(f"Resposta inválida para '{campo.pergunta}': a entidade selecionada não existe mais")
+            resultados.append((linhas, erros))
+        return resultados
+
+def entidades_existentes(db: Session, pares: Iterable[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+    """Retorna, entre os pares (estr_entidade_id, id_seq), os que existem em ENTIDADE"""
+    pares = list(pares)
+    query = text("""
+        SELECT e.ESTR_ENTIDADE_ID, e.ID_SEQ
+        FROM UNNEST(CAST(:estr_entidade_ids AS INT[]), CAST(:id_seqs AS INT[])) AS k(ESTR_ENTIDADE_ID, ID_SEQ)
+        INNER JOIN ENTIDADE e ON e.ESTR_ENTIDADE_ID = k.ESTR_ENTIDADE_ID AND e.ID_SEQ = k.ID_SEQ
+    """)
+    return {
+        (row.estr_entidade_id, row.id_seq) for row in db.execute(query, {
+            "estr_entidade_ids": [p[0] for p in pares],
+            "id_seqs": [p[1] for p in pares]
+        })
+    }
+
+_lock = Lock()
+
+# Cache LRU: projeto_id -> (versão do esquema em CONTADOR_PROJETO, validador)
+_validadores: "OrderedDict[int, Tuple[int, ValidadorProjeto]]" = OrderedDict()
+
+def obter_validador(db: Session, projeto_id: int, versao_esquema: Optional[int] = None) -> ValidadorProjeto:
+    """Retorna o validador em cache se ainda corresponde à versão do esquema gravada no banco"""
+    if versao_esquema is None:
+        versao_esquema = contadores.versao_projeto(db, projeto_id).esquema
+
+    with _lock:
+        item = _validadores.get(projeto_id)
+        if item is not None and item[0] == versao_esquema:
+            _validadores.move_to_end(projeto_id)
+            return item[1]
+
+    # Montado com a versão lida antes das perguntas: uma alteração concorrente só causa outra montagem
+    perguntas = db.execute(text("""
+        SELECT ID, PERGUNTA, TIPO, ESTR_ENTIDADE_ID
+        FROM PERGUNTA
+        WHERE PROJETO_ID = :projeto_id
+        ORDER BY ID
+    """), {"projeto_id": projeto_id}).fetchall()
+    validador = ValidadorProjeto(perguntas)
+
+    with _lock:
+        item = _validadores.get(projeto_id)
+        if item is None or item[0] <= versao_esquema:
+            _validadores[projeto_id] = (versao_esquema, validador)
+            while len(_validadores) > TAMANHO_MAXIMO_CACHE:
+                _validadores.popitem(last=False)
+    return validador
+
+def validar_submissao(db: Session, projeto_id: int, form_data: Mapping[str, Any], versao_esquema: Optional[int] = None) -> Tuple[List[RespostaGravacao], List[str]]:
+    return obter_validador(db, projeto_id, versao_esquema).validar(db, form_data)
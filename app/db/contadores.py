@@ -0,0 +1,243 @@
+import argparse
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Contadores desnormalizados das telas iniciais, mantidos na mesma transação das escritas:
+#   CONTADOR_PROJETO: perguntas e submissões por projeto
+#   CONTADOR_USUARIO_PROJETO: submissões de cada usuário em cada projeto
+#   CONTADOR_PERGUNTA: respostas preenchidas por pergunta
+# CONTADOR_PROJETO também guarda as versões do projeto, lidas pelos caches em memória
+# de todos os processos: VERSAO muda com qualquer alteração dos dados e VERSAO_ESQUEMA
+# só com alterações da estrutura (perguntas, valores padrão, entidades, atributos e instâncias)
+
+class VersaoProjeto(NamedTuple):
+    dados: int
+    esquema: int
+
+def versao_projeto(db: Session, projeto_id: int) -> VersaoProjeto:
+    row = db.execute(text("""
+        SELECT VERSAO, VERSAO_ESQUEMA FROM CONTADOR_PROJETO WHERE PROJETO_ID = :projeto_id
+    """), {"projeto_id": projeto_id}).first()
+    return VersaoProjeto(row.versao, row.versao_esquema) if row else VersaoProjeto(0, 0)
+
+def registrar_alteracao(db: Session, projeto_id: int, esquema: bool = False) -> int:
+    """Incrementa a versão dos dados (e, com esquema, a da estrutura) na transação da alteração"""
+    return db.execute(text("""
+        INSERT INTO CONTADOR_PROJETO (PROJETO_ID, TOTAL_PERGUNTAS, TOTAL_SUBMISSOES, VERSAO, VERSAO_ESQUEMA)
+        VALUES (:projeto_id, 0, 0, 1, :esquema)
+        ON CONFLICT (PROJETO_ID) DO UPDATE
+        SET VERSAO = CONTADOR_PROJETO.VERSAO + 1,
+            VERSAO_ESQUEMA = CONTADOR_PROJETO.VERSAO_ESQUEMA + EXCLUDED.VERSAO_ESQUEMA
+        RETURNING VERSAO
+    """), {"projeto_id": projeto_id, "esquema": 1 if esquema else 0}).scalar()
+
+def registrar_submissoes(db: Session, projeto_id: int, usuario_id: int, submissao_ids: List[int]) -> Optional[int]:
+    """Soma aos contadores submissões já gravadas de um usuário, agregando as respostas no banco;
+    retorna a nova versão dos dados do projeto"""
+    if not submissao_ids:
+        return None
+
+    versao = db.execute(text("""
+        INSERT INTO CONTADOR_PROJETO (PROJETO_ID, TOTAL_PERGUNTAS, TOTAL_SUBMISSOES, VERSAO)
+        VALUES (:projeto_id, 0, :quantidade, 1)
+        ON CONFLICT (PROJETO_ID) DO UPDATE
+        SET TOTAL_SUBMISSOES = CONTADOR_PROJETO.TOTAL_SUBMISSOES + EXCLUDED.TOTAL_SUBMISSOES,
+            VERSAO = CONTADOR_PROJETO.VERSAO + 1
+        RETURNING VERSAO
+    """), {"projeto_id": projeto_id, "quantidade": len(submissao_ids)}).scalar()
+
+    db.execute(text("""
+        INSERT INTO CONTADOR_USUARIO_PROJETO (USUARIO_ID, PROJETO_ID, TOTAL_SUBMISSOES)
+        VALUES (:usuario_id, :projeto_id, :quantidade)
+        ON CONFLICT (USUARIO_ID, PROJETO_ID) DO UPDATE
+        SET TOTAL_SUBMISSOES = CONTADOR_USUARIO_PROJETO.TOTAL_SUBMISSOES + EXCLUDED.TOTAL_SUBMISSOES
+    """), {"usuario_id": usuario_id, "projeto_id": projeto_id, "quantidade": len(submissao_ids)})
+
+    db.execute(text("""
+        INSERT INTO CONTADOR_PERGUNTA (PERGUNTA_ID, TOTAL_RESPOSTAS)
+        SELECT r.PERGUNTA_ID, COUNT(*)
+        FROM RESPOSTA r
+        WHERE r.SUBMISSAO_ID = ANY(CAST(:submissao_ids AS INT[]))
+        AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+        GROUP BY r.PERGUNTA_ID
+        ORDER BY r.PERGUNTA_ID
+        ON CONFLICT (PERGUNTA_ID) DO UPDATE
+        SET TOTAL_RESPOSTAS = CONTADOR_PERGUNTA.TOTAL_RESPOSTAS + EXCLUDED.TOTAL_RESPOSTAS
+    """), {"submissao_ids": submissao_ids})
+
+    return versao
+
+def registrar_pergunta(db: Session, projeto_id: int, quantidade: int = 1):
+    """Soma (ou, com quantidade negativa, subtrai) perguntas do contador do projeto"""
+    db.execute(text("""
+        INSERT INTO CONTADOR_PROJETO (PROJETO_ID, TOTAL_PERGUNTAS, TOTAL_SUBMISSOES)
+        VALUES (:projeto_id, GREATEST(:quantidade, 0), 0)
+        ON CONFLICT (PROJETO_ID) DO UPDATE
+        SET TOTAL_PERGUNTAS = GREATEST(CONTADOR_PROJETO.TOTAL_PERGUNTAS + :quantidade, 0)
+    """), {"projeto_id": projeto_id, "quantidade": quantidade})
+
+def descontar_usuario(db: Session, usuario_id: int):
+    """Retira dos contadores as submissões de um usuário antes que o DELETE em cascata as remova"""
+
+    db.execute(text("""
+        UPDATE CONTADOR_PROJETO cp
+        SET TOTAL_SUBMISSOES = cp.TOTAL_SUBMISSOES - d.quantidade,
+            VERSAO = cp.VERSAO + 1
+        FROM (
+            SELECT PROJETO_ID, COUNT(*) as quantidade
+            FROM SUBMISSAO
+            WHERE USUARIO_ID = :usuario_id
+            GROUP BY PROJETO_ID
+        ) d
+        WHERE cp.PROJETO_ID = d.PROJETO_ID
+    """), {"usuario_id": usuario_id})
+
+    db.execute(text("""
+        UPDATE CONTADOR_PERGUNTA cp
+        SET TOTAL_RESPOSTAS = cp.TOTAL_RESPOSTAS - d.quantidade
+        FROM (
+            SELECT r.PERGUNTA_ID, COUNT(*) as quantidade
+            FROM RESPOSTA r
+            INNER JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
+            WHERE s.USUARIO_ID = :usuario_id
+            AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+            GROUP BY r.PERGUNTA_ID
+        ) d
+        WHERE cp.PERGUNTA_ID = d.PERGUNTA_ID
+    """), {"usuario_id": usuario_id})
+
+    # As linhas de CONTADOR_USUARIO_PROJETO saem junto com o usuário (ON DELETE CASCADE)
+
+def reconstruir(db: Session, projeto_id: Optional[int] = None):
+    """Recalcula os contadores a partir das tabelas de origem (de um projeto ou de todos)"""
+
+    db.execute(text("LOCK TABLE CONTADOR_PROJETO, CONTADOR_USUARIO_PROJETO, CONTADOR_PERGUNTA IN EXCLUSIVE MODE"))
+
+    filtro = "WHERE p.ID = :projeto_id" if projeto_id is not None else ""
+    parametros = {"projeto_id": projeto_id} if projeto_id is not None else {}
+
+    # Atualiza em vez de recriar: as versões nunca voltam, senão caches e ETags antigos voltariam a valer
+    db.execute(text(f"""
+        INSERT INTO CONTADOR_PROJETO (PROJETO_ID, TOTAL_PERGUNTAS, TOTAL_SUBMISSOES, VERSAO, VERSAO_ESQUEMA)
+        SELECT p.ID,
+               (SELECT COUNT(*) FROM PERGUNTA pg WHERE pg.PROJETO_ID = p.ID),
+               (SELECT COUNT(*) FROM SUBMISSAO s WHERE s.PROJETO_ID = p.ID),
+               1, 1
+        FROM PROJETO p
+        {filtro}
+        ON CONFLICT (PROJETO_ID) DO UPDATE
+        SET TOTAL_PERGUNTAS = EXCLUDED.TOTAL_PERGUNTAS,
+            TOTAL_SUBMISSOES = EXCLUDED.TOTAL_SUBMISSOES,
+            VERSAO = CONTADOR_PROJETO.VERSAO + 1,
+            VERSAO_ESQUEMA = CONTADOR_PROJETO.VERSAO_ESQUEMA + 1
+    """), parametros)
+
+    db.execute(text(f"DELETE FROM CONTADOR_USUARIO_PROJETO WHERE PROJETO_ID IN (SELECT p.ID FROM PROJETO p {filtro})"), parametros)
+    db.execute(text(f"""
+        INSERT INTO CONTADOR_USUARIO_PROJETO (USUARIO_ID, PROJETO_ID, TOTAL_SUBMISSOES)
+        SELECT s.USUARIO_ID, s.PROJETO_ID, COUNT(*)
+        FROM SUBMISSAO s
+        INNER JOIN PROJETO p ON s.PROJETO_ID = p.ID
+        {filtro}
+        GROUP BY s.USUARIO_ID, s.PROJETO_ID
+    """), parametros)
+
+    db.execute(text(f"""
+        DELETE FROM CONTADOR_PERGUNTA
+        WHERE PERGUNTA_ID IN (SELECT pg.ID FROM PERGUNTA pg INNER JOIN PROJETO p ON pg.PROJETO_ID = p.ID {filtro})
+    """), parametros)
+    db.execute(text(f"""
+        INSERT INTO CONTADOR_PERGUNTA (PERGUNTA_ID, TOTAL_RESPOSTAS)
+        SELECT pg.ID, COUNT(r.ID)
+        FROM PERGUNTA pg
+        INNER JOIN PROJETO p ON pg.PROJETO_ID = p.ID
+        LEFT JOIN RESPOSTA r ON r.PERGUNTA_ID = pg.ID AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+        {filtro}
+        GROUP BY pg.ID
+    """), parametros)
+
+    db.commit()
+
+def verificar(db: Session, projeto_id: Optional[int] = None) -> List[dict]:
+    """Compara os contadores com as tabelas de origem e retorna as divergências encontradas"""
+
+    filtro = "WHERE p.ID = :projeto_id" if projeto_id is not None else ""
+    parametros = {"projeto_id": projeto_id} if projeto_id is not None else {}
+
+    query = text(f"""
+        SELECT 'submissões do projeto' as contador, p.ID as chave,
+               (SELECT COUNT(*) FROM SUBMISSAO s WHERE s.PROJETO_ID = p.ID) as esperado,
+               COALESCE(cp.TOTAL_SUBMISSOES, 0) as registrado
+        FROM PROJETO p
+        LEFT JOIN CONTADOR_PROJETO cp ON cp.PROJETO_ID = p.ID
+        {filtro}
+        UNION ALL
+        SELECT 'perguntas do projeto', p.ID,
+               (SELECT COUNT(*) FROM PERGUNTA pg WHERE pg.PROJETO_ID = p.ID),
+               COALESCE(cp.TOTAL_PERGUNTAS, 0)
+        FROM PROJETO p
+        LEFT JOIN CONTADOR_PROJETO cp ON cp.PROJETO_ID = p.ID
+        {filtro}
+        UNION ALL
+        SELECT 'pergunta', pg.ID,
+               (SELECT COUNT(*) FROM RESPOSTA r
+                WHERE r.PERGUNTA_ID = pg.ID AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''),
+               COALESCE(cpg.TOTAL_RESPOSTAS, 0)
+        FROM PERGUNTA pg
+        INNER JOIN PROJETO p ON pg.PROJETO_ID = p.ID
+        LEFT JOIN CONTADOR_PERGUNTA cpg ON cpg.PERGUNTA_ID = pg.ID
+        {filtro}
+    """)
+    divergencias = [
+        dict(row._mapping) for row in db.execute(query, parametros).fetchall()
+        if row.esperado != row.registrado
+    ]
+
+    query_usuarios = text(f"""
+        SELECT COALESCE(e.USUARIO_ID, g.USUARIO_ID) || '/' || COALESCE(e.PROJETO_ID, g.PROJETO_ID) as chave,
+               COALESCE(e.quantidade, 0) as esperado,
+               COALESCE(g.TOTAL_SUBMISSOES, 0) as registrado
+        FROM (
+            SELECT s.USUARIO_ID, s.PROJETO_ID, COUNT(*) as quantidade
+            FROM SUBMISSAO s
+            INNER JOIN PROJETO p ON s.PROJETO_ID = p.ID
+            {filtro}
+            GROUP BY s.USUARIO_ID, s.PROJETO_ID
+        ) e
+        FULL OUTER JOIN (
+            SELECT cup.* FROM CONTADOR_USUARIO_PROJETO cup
+            INNER JOIN PROJETO p ON cup.PROJETO_ID = p.ID
+            {filtro}
+        ) g ON e.USUARIO_ID = g.USUARIO_ID AND e.PROJETO_ID = g.PROJETO_ID
+        WHERE COALESCE(e.quantidade, 0) != COALESCE(g.TOTAL_SUBMISSOES, 0)
+    """)
+    for row in db.execute(query_usuarios, parametros).fetchall():
+        divergencias.append({"contador": "usuário/projeto", **dict(row._mapping)})
+
+    return divergencias
+
+# Uso: python -m app.db.contadores {reconstruir|verificar} [--projeto ID]
+if __name__ == "__main__":
+    from app.db.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manutenção dos contadores de projetos, usuários e perguntas")
+    parser.add_argument("comando", choices=["reconstruir", "verificar"])
+    parser.add_argument("--projeto", type=int, default=None, help="Restringe a um projeto")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.comando == "reconstruir":
+            reconstruir(db, args.projeto)
+            print("Contadores reconstruídos")
+        else:
+            divergencias = verificar(db, args.projeto)
+            for d in divergencias:
+                print(f"Contador {d['contador']} {d['chave']}: esperado {d['esperado']}, registrado {d['registrado']}")
+            print(f"{len(divergencias)} divergência(s) encontrada(s)")
+            if divergencias:
+                raise SystemExit(1)
+    finally:
+        db.close()
@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.core.config import settings
 
 # Cria o "motor" de conexão com o banco de dados usando a URL do .env
@@ -9,13 +11,48 @@ engine = create_engine(settings.DATABASE_URL)
 # Cria uma fábrica de sessões (SessionLocal)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor assíncrono (asyncpg) no mesmo banco, para as rotas async def: as consultas
+# aguardam o banco sem bloquear o event loop do worker
+async_engine = create_async_engine(make_url(settings.DATABASE_URL).set(drivername="postgresql+asyncpg"))
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Base para os modelos declarativos do SQLAlchemy
 Base = declarative_base()
 
+# Aplica o statement_timeout da sessão a cada transação. SET LOCAL (is_local = true)
+# termina junto com a transação, então a conexão volta ao pool sem o limite
+@event.listens_for(Session, "after_begin")
+def aplicar_timeout(session, transaction, connection):
+    timeout_ms = session.info.get("timeout_ms")
+    if timeout_ms:
+        connection.execute(
+            text("SELECT set_config('statement_timeout', :valor, true)"),
+            {"valor": f"{int(timeout_ms)}ms"}
+        )
+
 # Funçãoo para obter uma sessão do banco de dados
 def get_db():
-    db = SessionLocal()
+    db = SessionLocal(info={"timeout_ms": settings.TIMEOUT_CONSULTA_TRANSACIONAL_MS})
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Sessão para consultas analíticas (gráficos e relatórios), com limite de tempo maior
+def get_db_analitico():
+    db = SessionLocal(info={"timeout_ms": settings.TIMEOUT_CONSULTA_ANALITICA_MS})
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Sessão assíncrona, para rotas async def. Funções que recebem uma Session síncrona
+# podem ser chamadas com: await db.run_sync(funcao, *args)
+async def get_async_db():
+    async with AsyncSessionLocal(info={"timeout_ms": settings.TIMEOUT_CONSULTA_TRANSACIONAL_MS}) as db:
+        yield db
+
+async def get_async_db_analitico():
+    async with AsyncSessionLocal(info={"timeout_ms": settings.TIMEOUT_CONSULTA_ANALITICA_MS}) as db:
+        yield db
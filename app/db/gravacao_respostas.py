@@ -0,0 +1,91 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import contadores, resumo_respostas
+
+# (pergunta_id, resposta, resposta_numero, resposta_data, entidade_estr_entidade_id, entidade_id_seq)
+RespostaGravacao = Tuple[int, str, Optional[float], Any, Optional[int], Optional[int]]
+
+# (projeto_id, usuario_id, respostas)
+SubmissaoGravacao = Tuple[int, int, List[RespostaGravacao]]
+
+def _inserir_respostas(db: Session, submissao_ids: List[int], respostas: List[RespostaGravacao]):
+    """Insere as respostas (de uma ou várias submissões) com um único INSERT"""
+    query = text("""
+        INSERT INTO RESPOSTA (SUBMISSAO_ID, PERGUNTA_ID, RESPOSTA, RESPOSTA_NUMERO, RESPOSTA_DATA,
+                              ENTIDADE_ESTR_ENTIDADE_ID, ENTIDADE_ID_SEQ)
+        SELECT r.SUBMISSAO_ID, r.PERGUNTA_ID, r.RESPOSTA, r.RESPOSTA_NUMERO, r.RESPOSTA_DATA,
+               r.ENTIDADE_ESTR_ENTIDADE_ID, r.ENTIDADE_ID_SEQ
+        FROM UNNEST(
+            CAST(:submissao_ids AS INT[]),
+            CAST(:pergunta_ids AS INT[]),
+            CAST(:respostas AS TEXT[]),
+            CAST(:numeros AS DOUBLE PRECISION[]),
+            CAST(:datas AS DATE[]),
+            CAST(:entidade_ids AS INT[]),
+            CAST(:seqs AS INT[])
+        ) AS r(SUBMISSAO_ID, PERGUNTA_ID, RESPOSTA, RESPOSTA_NUMERO, RESPOSTA_DATA, ENTIDADE_ESTR_ENTIDADE_ID, ENTIDADE_ID_SEQ)
+    """)
+    db.execute(query, {
+        "submissao_ids": submissao_ids,
+        "pergunta_ids": [r[0] for r in respostas],
+        "respostas": [r[1] for r in respostas],
+        "numeros": [r[2] for r in respostas],
+        "datas": [r[3] for r in respostas],
+        "entidade_ids": [r[4] for r in respostas],
+        "seqs": [r[5] for r in respostas]
+    })
+
+def gravar_respostas(db: Session, submissao_id: int, respostas: List[RespostaGravacao]):
+    """Insere todas as respostas de uma submissão com um único INSERT (um ida e volta ao banco)"""
+    if not respostas:
+        return
+    _inserir_respostas(db, [submissao_id] * len(respostas), respostas)
+
+# projeto_id -> (versão dos dados antes do lote, versão após o lote)
+VersoesLote = Dict[int, Tuple[int, int]]
+
+def gravar_submissoes(db: Session, submissoes: List[SubmissaoGravacao]) -> Tuple[List[int], VersoesLote]:
+    """Grava várias submissões, suas respostas, resumos e contadores na transação atual
+    com uma quantidade fixa de comandos; retorna os IDs na ordem recebida e as versões dos projetos"""
+
+    # IDs reservados da sequência da identidade, para relacionar cada resposta à sua submissão
+    submissao_ids = db.execute(text("""
+        SELECT nextval(pg_get_serial_sequence('submissao', 'id'))
+        FROM generate_series(1, :quantidade)
+    """), {"quantidade": len(submissoes)}).scalars().all()
+
+    db.execute(text("""
+        INSERT INTO SUBMISSAO (ID, PROJETO_ID, USUARIO_ID)
+        OVERRIDING SYSTEM VALUE
+        SELECT * FROM UNNEST(CAST(:ids AS INT[]), CAST(:projeto_ids AS INT[]), CAST(:usuario_ids AS INT[]))
+    """), {
+        "ids": submissao_ids,
+        "projeto_ids": [s[0] for s in submissoes],
+        "usuario_ids": [s[1] for s in submissoes]
+    })
+
+    ids_respostas = []
+    respostas = []
+    for submissao_id, (_, _, linhas) in zip(submissao_ids, submissoes):
+        ids_respostas.extend([submissao_id] * len(linhas))
+        respostas.extend(linhas)
+    if respostas:
+        _inserir_respostas(db, ids_respostas, respostas)
+
+    resumo_respostas.registrar_submissoes(db, submissao_ids)
+
+    # Contadores por (projeto, usuário), em ordem fixa para evitar deadlock
+    grupos = {}
+    for submissao_id, (projeto_id, usuario_id, _) in zip(submissao_ids, submissoes):
+        grupos.setdefault((projeto_id, usuario_id), []).append(submissao_id)
+    versoes = {}
+    for (projeto_id, usuario_id), ids in sorted(grupos.items()):
+        versao = contadores.registrar_submissoes(db, projeto_id, usuario_id, ids)
+        # Cada grupo incrementa a versão em 1 e a linha do projeto fica bloqueada até o commit
+        anterior = versoes[projeto_id][0] if projeto_id in versoes else versao - 1
+        versoes[projeto_id] = (anterior, versao)
+
+    return submissao_ids, versoes
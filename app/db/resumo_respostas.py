@@ -0,0 +1,293 @@
+import argparse
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Valor numérico tipado da resposta, considerado apenas para perguntas do tipo número
+EXPRESSAO_NUMERICA = "CASE WHEN p.TIPO = 'numero' THEN r.RESPOSTA_NUMERO END"
+
+def registrar_submissoes(db: Session, submissao_ids: List[int]):
+    """Soma aos resumos (geral e diários) submissões já gravadas, agregando-as no banco na transação atual"""
+    if not submissao_ids:
+        return
+
+    parametros = {"submissao_ids": submissao_ids}
+
+    db.execute(text(f"""
+        INSERT INTO RESUMO_RESPOSTA (PERGUNTA_ID, VALOR, QUANTIDADE, SOMA_NUMERICA)
+        SELECT r.PERGUNTA_ID, r.RESPOSTA, COUNT(*), SUM({EXPRESSAO_NUMERICA})
+        FROM RESPOSTA r
+        INNER JOIN PERGUNTA p ON r.PERGUNTA_ID = p.ID
+        WHERE r.SUBMISSAO_ID = ANY(CAST(:submissao_ids AS INT[]))
+        AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+        GROUP BY r.PERGUNTA_ID, r.RESPOSTA
+        ORDER BY r.PERGUNTA_ID, r.RESPOSTA
+        ON CONFLICT (PERGUNTA_ID, MD5(VALOR)) DO UPDATE
+        SET QUANTIDADE = RESUMO_RESPOSTA.QUANTIDADE + EXCLUDED.QUANTIDADE,
+            SOMA_NUMERICA = RESUMO_RESPOSTA.SOMA_NUMERICA + EXCLUDED.SOMA_NUMERICA
+    """), parametros)
+
+    db.execute(text("""
+        INSERT INTO RESUMO_SUBMISSAO_DIA (PROJETO_ID, DIA, QUANTIDADE)
+        SELECT s.PROJETO_ID, CAST(s.DATA_CADASTRO AS DATE), COUNT(*)
+        FROM SUBMISSAO s
+        WHERE s.ID = ANY(CAST(:submissao_ids AS INT[]))
+        GROUP BY s.PROJETO_ID, CAST(s.DATA_CADASTRO AS DATE)
+        ORDER BY s.PROJETO_ID, CAST(s.DATA_CADASTRO AS DATE)
+        ON CONFLICT (PROJETO_ID, DIA) DO UPDATE
+        SET QUANTIDADE = RESUMO_SUBMISSAO_DIA.QUANTIDADE + EXCLUDED.QUANTIDADE
+    """), parametros)
+
+    db.execute(text(f"""
+        INSERT INTO RESUMO_RESPOSTA_DIA (PERGUNTA_ID, DIA, VALOR, QUANTIDADE, SOMA_NUMERICA)
+        SELECT r.PERGUNTA_ID, CAST(s.DATA_CADASTRO AS DATE), r.RESPOSTA, COUNT(*), SUM({EXPRESSAO_NUMERICA})
+        FROM RESPOSTA r
+        INNER JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
+        INNER JOIN PERGUNTA p ON r.PERGUNTA_ID = p.ID
+        WHERE r.SUBMISSAO_ID = ANY(CAST(:submissao_ids AS INT[]))
+        AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+        GROUP BY r.PERGUNTA_ID, CAST(s.DATA_CADASTRO AS DATE), r.RESPOSTA
+        ORDER BY r.PERGUNTA_ID, CAST(s.DATA_CADASTRO AS DATE), r.RESPOSTA
+        ON CONFLICT (PERGUNTA_ID, DIA, MD5(VALOR)) DO UPDATE
+        SET QUANTIDADE = RESUMO_RESPOSTA_DIA.QUANTIDADE + EXCLUDED.QUANTIDADE,
+            SOMA_NUMERICA = RESUMO_RESPOSTA_DIA.SOMA_NUMERICA + EXCLUDED.SOMA_NUMERICA
+    """), parametros)
+
+def descontar_respostas_usuario(db: Session, usuario_id: int):
+    """Retira do resumo as respostas de um usuário antes que o DELETE em cascata as remova.
+    Só as chaves zeradas pelo desconto são removidas, pelos índices únicos dos resumos"""
+    query_descontar = text(f"""
+        WITH descontados AS (
+            UPDATE RESUMO_RESPOSTA rr
+            SET QUANTIDADE = rr.QUANTIDADE - d.quantidade,
+                SOMA_NUMERICA = rr.SOMA_NUMERICA - d.soma
+            FROM (
+                SELECT r.PERGUNTA_ID, r.RESPOSTA, COUNT(*) as quantidade,
+                       SUM({EXPRESSAO_NUMERICA}) as soma
+                FROM RESPOSTA r
+                INNER JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
+                INNER JOIN PERGUNTA p ON r.PERGUNTA_ID = p.ID
+                WHERE s.USUARIO_ID = :usuario_id
+                AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+                GROUP BY r.PERGUNTA_ID, r.RESPOSTA
+            ) d
+            WHERE rr.PERGUNTA_ID = d.PERGUNTA_ID AND MD5(rr.VALOR) = MD5(d.RESPOSTA)
+            RETURNING rr.PERGUNTA_ID, MD5(rr.VALOR) as md5, rr.QUANTIDADE
+        )
+        SELECT PERGUNTA_ID, md5 FROM descontados WHERE QUANTIDADE <= 0
+    """)
+    zerados = db.execute(query_descontar, {"usuario_id": usuario_id}).fetchall()
+    if zerados:
+        db.execute(text("""
+            DELETE FROM RESUMO_RESPOSTA rr
+            USING unnest(CAST(:perguntas AS INT[]), CAST(:md5s AS TEXT[])) AS z(pergunta_id, md5)
+            WHERE rr.PERGUNTA_ID = z.pergunta_id AND MD5(rr.VALOR) = z.md5 AND rr.QUANTIDADE <= 0
+        """), {"perguntas": [z.pergunta_id for z in zerados], "md5s": [z.md5 for z in zerados]})
+
+    # Resumos diários
+    zerados = db.execute(text("""
+        WITH descontados AS (
+            UPDATE RESUMO_SUBMISSAO_DIA rsd
+            SET QUANTIDADE = rsd.QUANTIDADE - d.quantidade
+            FROM (
+                SELECT s.PROJETO_ID, CAST(s.DATA_CADASTRO AS DATE) as dia, COUNT(*) as quantidade
+                FROM SUBMISSAO s
+                WHERE s.USUARIO_ID = :usuario_id
+                GROUP BY s.PROJETO_ID, CAST(s.DATA_CADASTRO AS DATE)
+            ) d
+            WHERE rsd.PROJETO_ID = d.PROJETO_ID AND rsd.DIA = d.dia
+            RETURNING rsd.PROJETO_ID, rsd.DIA, rsd.QUANTIDADE
+        )
+        SELECT PROJETO_ID, DIA FROM descontados WHERE QUANTIDADE <= 0
+    """), {"usuario_id": usuario_id}).fetchall()
+    if zerados:
+        db.execute(text("""
+            DELETE FROM RESUMO_SUBMISSAO_DIA rsd
+            USING unnest(CAST(:projetos AS INT[]), CAST(:dias AS DATE[])) AS z(projeto_id, dia)
+            WHERE rsd.PROJETO_ID = z.projeto_id AND rsd.DIA = z.dia AND rsd.QUANTIDADE <= 0
+        """), {"projetos": [z.projeto_id for z in zerados], "dias": [z.dia for z in zerados]})
+
+    zerados = db.execute(text(f"""
+        WITH descontados AS (
+            UPDATE RESUMO_RESPOSTA_DIA rrd
+            SET QUANTIDADE = rrd.QUANTIDADE - d.quantidade,
+                SOMA_NUMERICA = rrd.SOMA_NUMERICA - d.soma
+            FROM (
+                SELECT r.PERGUNTA_ID, CAST(s.DATA_CADASTRO AS DATE) as dia, r.RESPOSTA,
+                       COUNT(*) as quantidade, SUM({EXPRESSAO_NUMERICA}) as soma
+                FROM RESPOSTA r
+                INNER JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
+                INNER JOIN PERGUNTA p ON r.PERGUNTA_ID = p.ID
+                WHERE s.USUARIO_ID = :usuario_id
+                AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+                GROUP BY r.PERGUNTA_ID, CAST(s.DATA_CADASTRO AS DATE), r.RESPOSTA
+            ) d
+            WHERE rrd.PERGUNTA_ID = d.PERGUNTA_ID AND rrd.DIA = d.dia AND MD5(rrd.VALOR) = MD5(d.RESPOSTA)
+            RETURNING rrd.PERGUNTA_ID, rrd.DIA, MD5(rrd.VALOR) as md5, rrd.QUANTIDADE
+        )
+        SELECT PERGUNTA_ID, DIA, md5 FROM descontados WHERE QUANTIDADE <= 0
+    """), {"usuario_id": usuario_id}).fetchall()
+    if zerados:
+        db.execute(text("""
+            DELETE FROM RESUMO_RESPOSTA_DIA rrd
+            USING unnest(CAST(:perguntas AS INT[]), CAST(:dias AS DATE[]), CAST(:md5s AS TEXT[])) AS z(pergunta_id, dia, md5)
+            WHERE rrd.PERGUNTA_ID = z.pergunta_id AND rrd.DIA = z.dia AND MD5(rrd.VALOR) = z.md5
+            AND rrd.QUANTIDADE <= 0
+        """), {
+            "perguntas": [z.pergunta_id for z in zerados], "dias": [z.dia for z in zerados],
+            "md5s": [z.md5 for z in zerados]
+        })
+
+def reconstruir(db: Session, projeto_id: Optional[int] = None) -> int:
+    """Recalcula o resumo a partir de RESPOSTA (de um projeto ou de todos) e retorna o total de linhas"""
+
+    # Bloqueia novas submissões nos resumos até o fim da reconstrução
+    db.execute(text("LOCK TABLE RESUMO_RESPOSTA, RESUMO_SUBMISSAO_DIA, RESUMO_RESPOSTA_DIA IN EXCLUSIVE MODE"))
+
+    filtro = "WHERE p.PROJETO_ID = :projeto_id" if projeto_id is not None else ""
+    parametros = {"projeto_id": projeto_id} if projeto_id is not None else {}
+
+    db.execute(text(f"""
+        DELETE FROM RESUMO_RESPOSTA
+        WHERE PERGUNTA_ID IN (SELECT p.ID FROM PERGUNTA p {filtro})
+    """), parametros)
+
+    result = db.execute(text(f"""
+        INSERT INTO RESUMO_RESPOSTA (PERGUNTA_ID, VALOR, QUANTIDADE, SOMA_NUMERICA)
+        SELECT r.PERGUNTA_ID, r.RESPOSTA, COUNT(*), SUM({EXPRESSAO_NUMERICA})
+        FROM RESPOSTA r
+        INNER JOIN PERGUNTA p ON r.PERGUNTA_ID = p.ID
+        {filtro}
+        {"AND" if filtro else "WHERE"} r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+        GROUP BY r.PERGUNTA_ID, r.RESPOSTA
+    """), parametros)
+
+    filtro_submissao = "WHERE s.PROJETO_ID = :projeto_id" if projeto_id is not None else ""
+    db.execute(text(f"DELETE FROM RESUMO_SUBMISSAO_DIA s {filtro_submissao}"), parametros)
+    db.execute(text(f"""
+        INSERT INTO RESUMO_SUBMISSAO_DIA (PROJETO_ID, DIA, QUANTIDADE)
+        SELECT s.PROJETO_ID, CAST(s.DATA_CADASTRO AS DATE), COUNT(*)
+        FROM SUBMISSAO s
+        {filtro_submissao}
+        GROUP BY s.PROJETO_ID, CAST(s.DATA_CADASTRO AS DATE)
+    """), parametros)
+
+    db.execute(text(f"""
+        DELETE FROM RESUMO_RESPOSTA_DIA
+        WHERE PERGUNTA_ID IN (SELECT p.ID FROM PERGUNTA p {filtro})
+    """), parametros)
+    db.execute(text(f"""
+        INSERT INTO RESUMO_RESPOSTA_DIA (PERGUNTA_ID, DIA, VALOR, QUANTIDADE, SOMA_NUMERICA)
+        SELECT r.PERGUNTA_ID, CAST(s.DATA_CADASTRO AS DATE), r.RESPOSTA, COUNT(*), SUM({EXPRESSAO_NUMERICA})
+        FROM RESPOSTA r
+        INNER JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
+        INNER JOIN PERGUNTA p ON r.PERGUNTA_ID = p.ID
+        {filtro}
+        {"AND" if filtro else "WHERE"} r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+        GROUP BY r.PERGUNTA_ID, CAST(s.DATA_CADASTRO AS DATE), r.RESPOSTA
+    """), parametros)
+
+    # Gráficos calculados sobre o resumo anterior deixam de valer em todos os processos
+    db.execute(text(f"UPDATE CONTADOR_PROJETO p SET VERSAO = p.VERSAO + 1 {filtro}"), parametros)
+
+    db.commit()
+    return result.rowcount
+
+def verificar(db: Session, projeto_id: Optional[int] = None) -> List[dict]:
+    """Compara o resumo com RESPOSTA e retorna as divergências encontradas"""
+
+    filtro = "AND p.PROJETO_ID = :projeto_id" if projeto_id is not None else ""
+    parametros = {"projeto_id": projeto_id} if projeto_id is not None else {}
+
+    query = text(f"""
+        WITH esperado AS (
+            SELECT r.PERGUNTA_ID, r.RESPOSTA as valor, COUNT(*) as quantidade,
+                   SUM({EXPRESSAO_NUMERICA}) as soma
+            FROM RESPOSTA r
+            INNER JOIN PERGUNTA p ON r.PERGUNTA_ID = p.ID
+            WHERE r.RESPOSTA IS NOT NULL AND r.RESPOSTA != '' {filtro}
+            GROUP BY r.PERGUNTA_ID, r.RESPOSTA
+        ),
+        registrado AS (
+            SELECT rr.PERGUNTA_ID, rr.VALOR as valor, rr.QUANTIDADE as quantidade,
+                   rr.SOMA_NUMERICA as soma
+            FROM RESUMO_RESPOSTA rr
+            INNER JOIN PERGUNTA p ON rr.PERGUNTA_ID = p.ID
+            WHERE rr.QUANTIDADE > 0 {filtro}
+        )
+        SELECT COALESCE(e.PERGUNTA_ID, g.PERGUNTA_ID) as pergunta_id,
+               COALESCE(e.valor, g.valor) as valor,
+               COALESCE(e.quantidade, 0) as quantidade_esperada,
+               COALESCE(g.quantidade, 0) as quantidade_registrada,
+               e.soma as soma_esperada,
+               g.soma as soma_registrada
+        FROM esperado e
+        FULL OUTER JOIN registrado g ON e.PERGUNTA_ID = g.PERGUNTA_ID AND e.valor = g.valor
+        WHERE e.quantidade IS DISTINCT FROM g.quantidade
+           OR ABS(COALESCE(e.soma, 0) - COALESCE(g.soma, 0)) > 1e-6
+        ORDER BY 1, 2
+    """)
+    return [dict(row._mapping) for row in db.execute(query, parametros).fetchall()]
+
+def verificar_diario(db: Session, projeto_id: Optional[int] = None) -> List[dict]:
+    """Compara o resumo diário de submissões com SUBMISSAO e retorna as divergências"""
+
+    filtro = "WHERE PROJETO_ID = :projeto_id" if projeto_id is not None else ""
+    parametros = {"projeto_id": projeto_id} if projeto_id is not None else {}
+
+    query = text(f"""
+        WITH esperado AS (
+            SELECT PROJETO_ID, CAST(DATA_CADASTRO AS DATE) as dia, COUNT(*) as quantidade
+            FROM SUBMISSAO {filtro}
+            GROUP BY PROJETO_ID, CAST(DATA_CADASTRO AS DATE)
+        ),
+        registrado AS (
+            SELECT PROJETO_ID, DIA as dia, QUANTIDADE as quantidade
+            FROM RESUMO_SUBMISSAO_DIA {filtro}
+        )
+        SELECT COALESCE(e.PROJETO_ID, g.PROJETO_ID) as projeto_id,
+               COALESCE(e.dia, g.dia) as dia,
+               COALESCE(e.quantidade, 0) as quantidade_esperada,
+               COALESCE(g.quantidade, 0) as quantidade_registrada
+        FROM esperado e
+        FULL OUTER JOIN registrado g ON e.PROJETO_ID = g.PROJETO_ID AND e.dia = g.dia
+        WHERE e.quantidade IS DISTINCT FROM g.quantidade
+        ORDER BY 1, 2
+    """)
+    return [dict(row._mapping) for row in db.execute(query, parametros).fetchall()]
+
+# Uso: python -m app.db.resumo_respostas {reconstruir|verificar} [--projeto ID]
+if __name__ == "__main__":
+    from app.db.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manutenção do resumo de respostas por pergunta")
+    parser.add_argument("comando", choices=["reconstruir", "verificar"])
+    parser.add_argument("--projeto", type=int, default=None, help="Restringe a um projeto")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.comando == "reconstruir":
+            total = reconstruir(db, args.projeto)
+            print(f"Resumo reconstruído: {total} linhas")
+        else:
+            divergencias = verificar(db, args.projeto)
+            for d in divergencias:
+                print(
+                    f"Pergunta {d['pergunta_id']} valor '{d['valor']}': "
+                    f"esperado {d['quantidade_esperada']} (soma {d['soma_esperada']}), "
+                    f"registrado {d['quantidade_registrada']} (soma {d['soma_registrada']})"
+                )
+            divergencias_diario = verificar_diario(db, args.projeto)
+            for d in divergencias_diario:
+                print(
+                    f"Projeto {d['projeto_id']} dia {d['dia']}: "
+                    f"esperado {d['quantidade_esperada']}, registrado {d['quantidade_registrada']}"
+                )
+            divergencias += divergencias_diario
+            print(f"{len(divergencias)} divergência(s) encontrada(s)")
+            if divergencias:
+                raise SystemExit(1)
+    finally:
+        db.close()
@@ -1,13 +1,20 @@
 from fastapi import APIRouter, Request, Depends, Form
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from typing import Optional, List, Dict, Any
-from collections import Counter, defaultdict
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+import math
+import zlib
 
-from app.db.database import get_db
+from app.db.database import get_db_analitico, get_async_db_analitico
+from app.core.config import settings
+from app.core.rotulos_entidade import resolver_rotulos_entidades
+from app.core import cache_graficos, cubo_respostas
+from app.core.consultas import ClienteDesconectado, consulta_cancelada, executar_analitico
 from app.session_dependencies import get_usuario_autenticado
 
 # Configurar templates
@@ -15,12 +22,36 @@ templates = Jinja2Templates(directory="templates")
 
 router = APIRouter()
 
+# Resposta quando o cálculo excede o statement_timeout das rotas analíticas
+ERRO_GRAFICO_PESADO = "Este gráfico exige processamento demais para ser gerado agora. Escolha outras perguntas ou um período menor."
+
+# Multiplicador do erro padrão para o intervalo de 95% das estimativas do modo aproximado
+Z_95 = 1.96
+
+# Resolução da fração sorteada no modo aproximado (igual ao módulo usado em montar_filtro_amostra)
+ESCALA_AMOSTRA = 1000000
+
+# Quantidade máxima de gráficos calculados em uma chamada do painel
+MAXIMO_GRAFICOS_PAINEL = 20
+
+# Períodos do gráfico de tendência e a unidade correspondente do DATE_TRUNC
+PERIODOS_TENDENCIA = {"dia": "day", "semana": "week", "mes": "month"}
+
+# Valores mais frequentes exibidos como séries na tendência; os demais vão para "Outros"
+MAXIMO_SERIES_TENDENCIA = 10
+
+# Valores distintos mantidos em cada eixo da tabela cruzada; os demais vão para "Outros"
+MAXIMO_CATEGORIAS_TABELA = 30
+
+# Tipos de gráfico montados a partir da tabela cruzada (contagem por par de valores X e Y)
+TIPOS_TABELA_CRUZADA = ("stacked_bar", "heatmap")
+
 @router.get("/{projeto_id}", response_class=HTMLResponse)
 def tela_graficos(
     projeto_id: int,
     request: Request,
     current_user = Depends(get_usuario_autenticado),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_analitico)
 ):
     """Tela principal para geração de gráficos"""
     
@@ -35,27 +66,20 @@ def tela_graficos(
     if not projeto:
         return RedirectResponse(url="/submissoes?error_message=Projeto não encontrado", status_code=303)
     
-    # Buscar perguntas do projeto
+    # Buscar perguntas do projeto (contagens servidas pelos contadores)
     query_perguntas = text("""
         SELECT p.ID, p.PERGUNTA, p.TIPO, p.MODELO,
-               COUNT(DISTINCT s.ID) as total_submissoes
+               cp.TOTAL_RESPOSTAS as total_submissoes
         FROM PERGUNTA p
-        LEFT JOIN RESPOSTA r ON p.ID = r.PERGUNTA_ID
-        LEFT JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
+        INNER JOIN CONTADOR_PERGUNTA cp ON p.ID = cp.PERGUNTA_ID
         WHERE p.PROJETO_ID = :projeto_id
-        GROUP BY p.ID, p.PERGUNTA, p.TIPO, p.MODELO
-        HAVING COUNT(DISTINCT s.ID) > 0
+        AND cp.TOTAL_RESPOSTAS > 0
         ORDER BY p.ID
     """)
     perguntas = db.execute(query_perguntas, {"projeto_id": projeto_id}).fetchall()
     
     # Buscar total de submissões do projeto
-    query_total = text("""
-        SELECT COUNT(*) as total 
-        FROM SUBMISSAO 
-        WHERE PROJETO_ID = :projeto_id
-    """)
-    total_submissoes = db.execute(query_total, {"projeto_id": projeto_id}).scalar()
+    total_submissoes = contar_submissoes_projeto(db, projeto_id)
     
     contexto = {
         "request": request,
@@ -72,7 +96,7 @@ async def gerar_grafico(
     projeto_id: int,
     request: Request,
     current_user = Depends(get_usuario_autenticado),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db_analitico)
 ):
     """Endpoint para gerar dados do gráfico"""
     
@@ -83,53 +107,187 @@ async def gerar_grafico(
         pergunta_x = form_data.get("pergunta_x")
         pergunta_y = form_data.get("pergunta_y")
         agregacao_y = form_data.get("agregacao_y", "soma")  # NOVO: soma ou contagem
+        periodo = form_data.get("periodo") or "dia"  # Apenas para tendência: dia, semana ou mes
+        aproximado = form_data.get("aproximado") in ("1", "true", "on")  # Estimativa por amostragem
         
         # Validações básicas
         if not tipo_grafico:
             return JSONResponse({"error": "Selecione um tipo de gráfico"}, status_code=400)
         
-        if not pergunta_x:
+        # Na tendência a pergunta é opcional: sem ela, conta as submissões
+        if not pergunta_x and tipo_grafico != "trend":
             return JSONResponse({"error": "Selecione pelo menos uma pergunta"}, status_code=400)
         
-        # Verificar acesso ao projeto
+        # Verificar acesso ao projeto, lendo junto a versão dos dados (compartilhada por todos os processos)
         query_verificar = text("""
-            SELECT 1 FROM PROJETO p 
+            SELECT COALESCE(cp.VERSAO, 0) as versao FROM PROJETO p 
             INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID 
+            LEFT JOIN CONTADOR_PROJETO cp ON p.ID = cp.PROJETO_ID
             WHERE p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
         """)
-        if not db.execute(query_verificar, {"projeto_id": projeto_id, "usuario_id": current_user['id']}).first():
+        projeto = (await db.execute(query_verificar, {"projeto_id": projeto_id, "usuario_id": current_user['id']})).first()
+        if not projeto:
             return JSONResponse({"error": "Acesso negado ao projeto"}, status_code=403)
         
+        # Versão lida antes do cálculo: uma submissão concorrente torna o resultado obsoleto
+        chave_cache = cache_graficos.montar_chave(projeto_id, tipo_grafico, pergunta_x, pergunta_y, agregacao_y, periodo, aproximado)
+        versao = projeto.versao
+        etag = cache_graficos.gerar_etag(chave_cache, versao)
+        cabecalhos = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        
+        # O navegador já possui este gráfico na versão atual do projeto
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=cabecalhos)
+        
+        em_cache = cache_graficos.obter(chave_cache, versao)
+        if em_cache:
+            etag_cache, dados_cache = em_cache
+            return JSONResponse(dados_cache, headers={**cabecalhos, "ETag": etag_cache})
+        
         # Buscar informações das perguntas
         perguntas_info = {}
         for pid in [pergunta_x, pergunta_y]:
-            if pid:
+            if pid and pid.isdigit():
                 query_info = text("""
                     SELECT ID, PERGUNTA, TIPO, MODELO 
                     FROM PERGUNTA 
                     WHERE ID = :pergunta_id AND PROJETO_ID = :projeto_id
                 """)
-                info = db.execute(query_info, {"pergunta_id": pid, "projeto_id": projeto_id}).first()
+                info = (await db.execute(query_info, {"pergunta_id": int(pid), "projeto_id": projeto_id})).first()
                 if info:
                     perguntas_info[pid] = info
         
         # Validar compatibilidade do gráfico
-        validacao = validar_compatibilidade_grafico(tipo_grafico, perguntas_info, pergunta_x, pergunta_y)
+        validacao = validar_compatibilidade_grafico(tipo_grafico, perguntas_info, pergunta_x, pergunta_y, periodo)
         if validacao["erro"]:
             return JSONResponse({"error": validacao["erro"]}, status_code=400)
         
-        # Gerar dados do gráfico
-        dados_grafico = gerar_dados_grafico(
-            db, projeto_id, tipo_grafico, pergunta_x, pergunta_y, perguntas_info, agregacao_y
+        # Gerar dados do gráfico numa thread, fora do event loop (consultas e cálculo em Python)
+        dados_grafico = await executar_analitico(
+            request, gerar_dados_grafico, projeto_id, tipo_grafico, pergunta_x, pergunta_y, perguntas_info, agregacao_y, periodo, aproximado
         )
+        cache_graficos.armazenar(chave_cache, versao, dados_grafico)
         
-        return JSONResponse(dados_grafico)
+        return JSONResponse(dados_grafico, headers=cabecalhos)
         
+    except ClienteDesconectado:
+        # Ninguém aguarda a resposta: a consulta já foi cancelada
+        return Response(status_code=499)
     except Exception as e:
+        if consulta_cancelada(e):
+            return JSONResponse({"error": ERRO_GRAFICO_PESADO, "limite_excedido": True}, status_code=503)
         print(f"Erro ao gerar gráfico: {e}")
         return JSONResponse({"error": "Erro interno do servidor"}, status_code=500)
 
-def validar_compatibilidade_grafico(tipo_grafico: str, perguntas_info: Dict, pergunta_x: str, pergunta_y: str = None) -> Dict[str, Any]:
+@router.post("/{projeto_id}/painel")
+async def gerar_painel(
+    projeto_id: int,
+    request: Request,
+    current_user = Depends(get_usuario_autenticado),
+    db: AsyncSession = Depends(get_async_db_analitico)
+):
+    """Endpoint para gerar vários gráficos do projeto em uma única requisição"""
+    
+    try:
+        # Corpo JSON: {"graficos": [{"tipo_grafico", "pergunta_x", "pergunta_y", "agregacao_y", "periodo"}, ...]}
+        corpo = await request.json()
+        lista = corpo.get("graficos") if isinstance(corpo, dict) else None
+        
+        if not lista or not isinstance(lista, list):
+            return JSONResponse({"error": "Informe a lista de gráficos"}, status_code=400)
+        
+        if len(lista) > MAXIMO_GRAFICOS_PAINEL:
+            return JSONResponse({"error": f"O painel aceita no máximo {MAXIMO_GRAFICOS_PAINEL} gráficos"}, status_code=400)
+        
+        # Verificar acesso ao projeto, lendo junto a versão dos dados (compartilhada por todos os processos)
+        query_verificar = text("""
+            SELECT COALESCE(cp.VERSAO, 0) as versao FROM PROJETO p 
+            INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID 
+            LEFT JOIN CONTADOR_PROJETO cp ON p.ID = cp.PROJETO_ID
+            WHERE p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
+        """)
+        projeto = (await db.execute(query_verificar, {"projeto_id": projeto_id, "usuario_id": current_user['id']})).first()
+        if not projeto:
+            return JSONResponse({"error": "Acesso negado ao projeto"}, status_code=403)
+        
+        especificacoes = []
+        ids_perguntas = set()
+        for item in lista:
+            item = item if isinstance(item, dict) else {}
+            espec = {
+                "tipo_grafico": str(item.get("tipo_grafico") or ""),
+                "pergunta_x": str(item.get("pergunta_x") or ""),
+                "pergunta_y": str(item.get("pergunta_y") or "") or None,
+                "agregacao_y": str(item.get("agregacao_y") or "soma"),
+                "periodo": str(item.get("periodo") or "dia")
+            }
+            especificacoes.append(espec)
+            for pid in (espec["pergunta_x"], espec["pergunta_y"]):
+                if pid and pid.isdigit():
+                    ids_perguntas.add(int(pid))
+        
+        # Buscar informações de todas as perguntas do painel de uma vez
+        perguntas_info = {}
+        if ids_perguntas:
+            query_info = text("""
+                SELECT ID, PERGUNTA, TIPO, MODELO 
+                FROM PERGUNTA 
+                WHERE ID = ANY(:perguntas) AND PROJETO_ID = :projeto_id
+            """)
+            resultado = await db.execute(query_info, {"perguntas": list(ids_perguntas), "projeto_id": projeto_id})
+            for info in resultado.fetchall():
+                perguntas_info[str(info.id)] = info
+        
+        versao = projeto.versao
+        graficos = [None] * len(especificacoes)
+        pendentes = []
+        
+        for indice, espec in enumerate(especificacoes):
+            if not espec["tipo_grafico"]:
+                graficos[indice] = {"error": "Selecione um tipo de gráfico"}
+                continue
+            
+            if not espec["pergunta_x"] and espec["tipo_grafico"] != "trend":
+                graficos[indice] = {"error": "Selecione pelo menos uma pergunta"}
+                continue
+            
+            validacao = validar_compatibilidade_grafico(
+                espec["tipo_grafico"], perguntas_info, espec["pergunta_x"], espec["pergunta_y"], espec["periodo"]
+            )
+            if validacao["erro"]:
+                graficos[indice] = {"error": validacao["erro"]}
+                continue
+            
+            chave_cache = cache_graficos.montar_chave(
+                projeto_id, espec["tipo_grafico"], espec["pergunta_x"], espec["pergunta_y"],
+                espec["agregacao_y"], espec["periodo"]
+            )
+            em_cache = cache_graficos.obter(chave_cache, versao)
+            if em_cache:
+                graficos[indice] = em_cache[1]
+            else:
+                pendentes.append((indice, chave_cache))
+        
+        # Todos os gráficos que faltam são calculados juntos, com uma só leitura das respostas
+        if pendentes:
+            calculados = await executar_analitico(
+                request, gerar_dados_painel, projeto_id, [especificacoes[indice] for indice, _ in pendentes], perguntas_info
+            )
+            for (indice, chave_cache), dados_grafico in zip(pendentes, calculados):
+                cache_graficos.armazenar(chave_cache, versao, dados_grafico)
+                graficos[indice] = dados_grafico
+        
+        return JSONResponse({"graficos": graficos})
+        
+    except ClienteDesconectado:
+        return Response(status_code=499)
+    except Exception as e:
+        if consulta_cancelada(e):
+            return JSONResponse({"error": ERRO_GRAFICO_PESADO, "limite_excedido": True}, status_code=503)
+        print(f"Erro ao gerar painel: {e}")
+        return JSONResponse({"error": "Erro interno do servidor"}, status_code=500)
+
+def validar_compatibilidade_grafico(tipo_grafico: str, perguntas_info: Dict, pergunta_x: str, pergunta_y: str = None, periodo: str = "dia") -> Dict[str, Any]:
     """Valida se as perguntas são compatíveis com o tipo de gráfico"""
     
     if tipo_grafico == "pie":
@@ -173,19 +331,54 @@ def validar_compatibilidade_grafico(tipo_grafico: str, perguntas_info: Dict, per
         
         return {"erro": None}
     
+    elif tipo_grafico in TIPOS_TABELA_CRUZADA:
+        if not pergunta_y:
+            return {"erro": "Tabela cruzada requer duas perguntas (X e Y)"}
+        
+        if pergunta_x == pergunta_y:
+            return {"erro": "Selecione perguntas diferentes para X e Y"}
+        
+        pergunta_x_info = perguntas_info.get(pergunta_x)
+        pergunta_y_info = perguntas_info.get(pergunta_y)
+        
+        if not pergunta_x_info or not pergunta_y_info:
+            return {"erro": "Uma ou ambas perguntas não foram encontradas"}
+        
+        return {"erro": None}
+    
+    elif tipo_grafico == "trend":
+        if pergunta_y:
+            return {"erro": "Gráfico de tendência aceita no máximo uma pergunta"}
+        
+        if periodo not in PERIODOS_TENDENCIA:
+            return {"erro": "Período inválido"}
+        
+        if pergunta_x and not perguntas_info.get(pergunta_x):
+            return {"erro": "Pergunta não encontrada"}
+        
+        return {"erro": None}
+    
     return {"erro": "Tipo de gráfico não suportado"}
 
-def gerar_dados_grafico(db: Session, projeto_id: int, tipo_grafico: str, pergunta_x: str, pergunta_y: str = None, perguntas_info: Dict = None, agregacao_y: str = "soma") -> Dict[str, Any]:
+def gerar_dados_grafico(db: Session, projeto_id: int, tipo_grafico: str, pergunta_x: str, pergunta_y: str = None, perguntas_info: Dict = None, agregacao_y: str = "soma", periodo: str = "dia", aproximado: bool = False) -> Dict[str, Any]:
     """Gera os dados específicos para cada tipo de gráfico"""
     
+    # Pizza e tendência já vêm de resumos; dispersão já é reduzida: a amostragem vale para
+    # os gráficos que cruzam duas perguntas (autojunção em RESPOSTA)
+    fracao = fracao_amostra(db, projeto_id) if aproximado else 1.0
+    
     if tipo_grafico == "pie":
         return gerar_dados_pizza(db, projeto_id, pergunta_x, perguntas_info)
     elif tipo_grafico == "bar":
-        return gerar_dados_barras(db, projeto_id, pergunta_x, pergunta_y, perguntas_info, agregacao_y)
+        return gerar_dados_barras(db, projeto_id, pergunta_x, pergunta_y, perguntas_info, agregacao_y, fracao)
     elif tipo_grafico == "line":
-        return gerar_dados_linha(db, projeto_id, pergunta_x, pergunta_y, perguntas_info, agregacao_y)
+        return gerar_dados_linha(db, projeto_id, pergunta_x, pergunta_y, perguntas_info, agregacao_y, fracao)
     elif tipo_grafico == "scatter":
         return gerar_dados_dispersao(db, projeto_id, pergunta_x, perguntas_info)
+    elif tipo_grafico == "trend":
+        return gerar_dados_tendencia(db, projeto_id, pergunta_x, perguntas_info, agregacao_y, periodo)
+    elif tipo_grafico in TIPOS_TABELA_CRUZADA:
+        return gerar_dados_tabela_cruzada(db, tipo_grafico, projeto_id, pergunta_x, pergunta_y, perguntas_info, fracao)
 
 def formatar_data_para_exibicao(data_str: str) -> str:
     """Converte data de YYYY-MM-DD para DD/MM/YYYY"""
@@ -195,67 +388,64 @@ def formatar_data_para_exibicao(data_str: str) -> str:
     except:
         return data_str
 
-def obter_valor_exibicao_entidade(db: Session, entidade_id: str) -> str:
-    """Obtém o valor de exibição de uma entidade"""
-    try:
-        partes = entidade_id.split('_')
-        if len(partes) != 2:
-            return f"Entidade {entidade_id}"
-        
-        estr_entidade_id = int(partes[0])
-        id_seq = int(partes[1])
-        
-        query = text("""
-            SELECT COALESCE(a.VALOR, CONCAT('Entidade ', :estr_entidade_id, '_', :id_seq)) as display_text
-            FROM ESTR_ATRIBUTOS ea
-            LEFT JOIN ATRIBUTOS a ON ea.ESTR_ENTIDADE_ID = a.ESTR_ENTIDADE_ID 
-                                AND ea.ID_SEQ = a.ESTR_ATRIBUTO_ID_SEQ 
-                                AND a.ENTIDADE_ID_SEQ = :id_seq
-            WHERE ea.ESTR_ENTIDADE_ID = :estr_entidade_id
-            AND ea.EXIBICAO = TRUE
-            LIMIT 1
-        """)
-        result = db.execute(query, {
-            "estr_entidade_id": estr_entidade_id,
-            "id_seq": id_seq
-        }).scalar()
-        
-        return result or f"Entidade {entidade_id}"
-        
-    except Exception as e:
-        print(f"Erro ao obter valor de exibição: {e}")
-        return f"Entidade {entidade_id}"
+def formatar_valores_categoria(db: Session, valores: List[str], tipo: str) -> List[str]:
+    """Formata os valores agrupados de uma pergunta para exibição no gráfico"""
+    if tipo == 'data':
+        return [formatar_data_para_exibicao(valor) for valor in valores]
+    elif tipo == 'entidade':
+        # Resolve todos os rótulos de uma vez em vez de uma consulta por categoria
+        rotulos = resolver_rotulos_entidades(db, valores)
+        return [rotulos[valor] for valor in valores]
+    return [str(valor) for valor in valores]
 
-def gerar_dados_pizza(db: Session, projeto_id: int, pergunta_id: str, perguntas_info: Dict) -> Dict[str, Any]:
-    """Gera dados para gráfico de pizza"""
-    
-    pergunta_info = perguntas_info[pergunta_id]
+def montar_expressao_agregacao(agregacao_y: str, tipo_y: str) -> str:
+    """Retorna a expressão SQL que agrega os valores de Y em cada grupo de X"""
+    if agregacao_y != "contagem" and tipo_y == 'numero':
+        return "SUM(ry.RESPOSTA_NUMERO)"
+    # Contagem explícita ou Y não numérico: conta ocorrências
+    return "COUNT(*)"
+
+def montar_rotulo_eixo_y(agregacao_y: str, pergunta_y_info) -> str:
+    """Define o label do eixo Y conforme a agregação aplicada"""
+    if agregacao_y != "contagem" and pergunta_y_info.tipo == 'numero':
+        return f"Soma de {pergunta_y_info.pergunta}"
+    return f"Contagem de {pergunta_y_info.pergunta}"
+
+def consultar_agregacao_xy(db: Session, projeto_id: int, pergunta_x: str, pergunta_y: str, expressao_agregacao: str) -> List[Any]:
+    """Agrupa as respostas de Y por valor de X diretamente no banco"""
     
-    query = text("""
-        SELECT r.RESPOSTA
-        FROM RESPOSTA r
-        INNER JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
-        WHERE s.PROJETO_ID = :projeto_id AND r.PERGUNTA_ID = :pergunta_id
-        AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+    # Datas e números são ordenados pelas colunas tipadas; os demais valores por código
+    # de caractere (COLLATE "C"), como a ordenação feita antes em Python
+    query = text(f"""
+        SELECT rx.RESPOSTA as x_valor, {expressao_agregacao} as y_valor
+        FROM RESPOSTA rx
+        INNER JOIN SUBMISSAO s ON rx.SUBMISSAO_ID = s.ID
+        INNER JOIN RESPOSTA ry ON s.ID = ry.SUBMISSAO_ID
+        WHERE s.PROJETO_ID = :projeto_id 
+        AND rx.PERGUNTA_ID = :pergunta_x 
+        AND ry.PERGUNTA_ID = :pergunta_y
+        AND rx.RESPOSTA IS NOT NULL AND rx.RESPOSTA != ''
+        AND ry.RESPOSTA IS NOT NULL AND ry.RESPOSTA != ''
+        GROUP BY rx.RESPOSTA, rx.RESPOSTA_DATA, rx.RESPOSTA_NUMERO
+        ORDER BY rx.RESPOSTA_DATA, rx.RESPOSTA_NUMERO, rx.RESPOSTA COLLATE "C"
     """)
     
-    respostas = db.execute(query, {"projeto_id": projeto_id, "pergunta_id": pergunta_id}).fetchall()
+    return db.execute(query, {
+        "projeto_id": projeto_id, 
+        "pergunta_x": int(pergunta_x), 
+        "pergunta_y": int(pergunta_y)
+    }).fetchall()
+
+def montar_grafico_pizza(db: Session, pergunta_info, contagens: List[Any]) -> Dict[str, Any]:
+    """Monta o JSON do gráfico de pizza a partir das contagens (valor, total) já ordenadas"""
     
-    contador = Counter([r.resposta for r in respostas])
+    nomes = formatar_valores_categoria(db, [valor for valor, _ in contagens], pergunta_info.tipo)
     
     series_data = []
-    for valor, count in contador.most_common():
-        # Formatar datas se necessário
-        if pergunta_info.tipo == 'data':
-            valor_display = formatar_data_para_exibicao(valor)
-        elif pergunta_info.tipo == 'entidade':
-            valor_display = obter_valor_exibicao_entidade(db, valor)
-        else:
-            valor_display = str(valor)
-            
+    for nome, (_, total) in zip(nomes, contagens):
         series_data.append({
-            "name": valor_display,
-            "data": count
+            "name": nome,
+            "data": total
         })
     
     return {
@@ -266,196 +456,271 @@ def gerar_dados_pizza(db: Session, projeto_id: int, pergunta_id: str, perguntas_
         "series": series_data
     }
 
-def gerar_dados_barras(db: Session, projeto_id: int, pergunta_x: str, pergunta_y: str, perguntas_info: Dict, agregacao_y: str = "soma") -> Dict[str, Any]:
-    """Gera dados para gráfico de barras com agregação configurável"""
+def montar_grafico_xy(db: Session, tipo_grafico: str, pergunta_x_info, pergunta_y_info, agregacao_y: str, linhas: List[Any]) -> Dict[str, Any]:
+    """Monta o JSON dos gráficos de barras e linha a partir das linhas (x, y agregado) já ordenadas"""
     
-    pergunta_x_info = perguntas_info[pergunta_x]
-    pergunta_y_info = perguntas_info[pergunta_y]
+    categories = formatar_valores_categoria(db, [x for x, _ in linhas], pergunta_x_info.tipo)
+    values = [y for _, y in linhas]
     
-    query = text("""
-        SELECT rx.RESPOSTA as x_valor, ry.RESPOSTA as y_valor
-        FROM RESPOSTA rx
-        INNER JOIN SUBMISSAO s ON rx.SUBMISSAO_ID = s.ID
-        INNER JOIN RESPOSTA ry ON s.ID = ry.SUBMISSAO_ID
-        WHERE s.PROJETO_ID = :projeto_id 
-        AND rx.PERGUNTA_ID = :pergunta_x 
-        AND ry.PERGUNTA_ID = :pergunta_y
-        AND rx.RESPOSTA IS NOT NULL AND rx.RESPOSTA != ''
-        AND ry.RESPOSTA IS NOT NULL AND ry.RESPOSTA != ''
-    """)
+    y_label = montar_rotulo_eixo_y(agregacao_y, pergunta_y_info)
     
-    dados = db.execute(query, {
-        "projeto_id": projeto_id, 
-        "pergunta_x": pergunta_x, 
-        "pergunta_y": pergunta_y
-    }).fetchall()
-    
-    # Agrupar por X
-    agrupados = defaultdict(list)
-    
-    for row in dados:
-        x_val = row.x_valor
-        y_val = row.y_valor
-        
-        # Formatar data para agrupamento (manter formato original para agrupamento)
-        x_key = x_val
-        agrupados[x_key].append(y_val)
-    
-    # Processar agregação
-    categories = []
-    values = []
-    
-    # Ordenar as chaves (especialmente importante para datas)
-    sorted_keys = sorted(agrupados.keys())
-    if pergunta_x_info.tipo == 'data':
-        try:
-            sorted_keys = sorted(agrupados.keys(), key=lambda x: datetime.strptime(x, '%Y-%m-%d'))
-        except:
-            sorted_keys = sorted(agrupados.keys())
-    
-    for x_key in sorted_keys:
-        y_valores = agrupados[x_key]
-        
-        # Formatar chave para exibição
-        if pergunta_x_info.tipo == 'data':
-            x_display = formatar_data_para_exibicao(x_key)
-        elif pergunta_x_info.tipo == 'entidade':
-            x_display = obter_valor_exibicao_entidade(db, x_key)
-        else:
-            x_display = str(x_key)
-        
-        categories.append(x_display)
-        
-        # Aplicar agregação
-        if agregacao_y == "contagem":
-            values.append(len(y_valores))
-        else:  # soma (padrão)
-            if pergunta_y_info.tipo == 'numero':
-                # Somar valores numéricos
-                soma = sum(float(v) for v in y_valores if v)
-                values.append(soma)
-            else:
-                # Para não numéricos, contar ocorrências
-                values.append(len(y_valores))
-    
-    # Determinar label do eixo Y
-    if agregacao_y == "contagem":
-        y_label = f"Contagem de {pergunta_y_info.pergunta}"
-    else:
-        if pergunta_y_info.tipo == 'numero':
-            y_label = f"Soma de {pergunta_y_info.pergunta}"
-        else:
-            y_label = f"Contagem de {pergunta_y_info.pergunta}"
+    serie = {
+        "name": y_label,
+        "data": values
+    }
+    if tipo_grafico == "line":
+        serie["mode"] = "lines+markers"
     
     return {
-        "type": "bar",
+        "type": tipo_grafico,
         "title": {
             "text": f"{pergunta_x_info.pergunta} vs {y_label}"
         },
+        "series": [serie],
+        "categories": categories
+    }
+
+def montar_grafico_dispersao(pergunta_info, scatter_data: List[List[Any]], total_pontos: int, reduzido: bool) -> Dict[str, Any]:
+    """Monta o JSON do gráfico de dispersão"""
+    return {
+        "type": "scatter",
+        "title": {
+            "text": f"Dispersão: {pergunta_info.pergunta}"
+        },
         "series": [{
-            "name": y_label,
-            "data": values
+            "name": pergunta_info.pergunta,
+            "data": scatter_data,
+            "mode": "markers",
+            "marker": {
+                "size": 8,
+                "color": "blue"
+            }
         }],
-        "categories": categories
+        "total_pontos": total_pontos,
+        "reduzido": reduzido,
+        "usar_webgl": len(scatter_data) > settings.GRAFICO_LIMITE_WEBGL
     }
 
-def gerar_dados_linha(db: Session, projeto_id: int, pergunta_x: str, pergunta_y: str, perguntas_info: Dict, agregacao_y: str = "soma") -> Dict[str, Any]:
+def gerar_dados_pizza(db: Session, projeto_id: int, pergunta_id: str, perguntas_info: Dict) -> Dict[str, Any]:
+    """Gera dados para gráfico de pizza"""
+    
+    pergunta_info = perguntas_info[pergunta_id]
+    
+    # Contagens lidas do resumo mantido na escrita: uma linha por valor distinto
+    query = text("""
+        SELECT VALOR as valor, QUANTIDADE as total
+        FROM RESUMO_RESPOSTA
+        WHERE PERGUNTA_ID = :pergunta_id AND QUANTIDADE > 0
+        ORDER BY QUANTIDADE DESC, VALOR COLLATE "C"
+    """)
+    
+    contagens = db.execute(query, {"pergunta_id": int(pergunta_id)}).fetchall()
+    
+    return montar_grafico_pizza(db, pergunta_info, [(row.valor, row.total) for row in contagens])
+
+def gerar_dados_barras(db: Session, projeto_id: int, pergunta_x: str, pergunta_y: str, perguntas_info: Dict, agregacao_y: str = "soma", fracao: float = 1.0) -> Dict[str, Any]:
+    """Gera dados para gráfico de barras com agregação configurável"""
+    return gerar_dados_xy(db, "bar", projeto_id, pergunta_x, pergunta_y, perguntas_info, agregacao_y, fracao)
+
+def gerar_dados_linha(db: Session, projeto_id: int, pergunta_x: str, pergunta_y: str, perguntas_info: Dict, agregacao_y: str = "soma", fracao: float = 1.0) -> Dict[str, Any]:
     """Gera dados para gráfico de linha com agregação configurável"""
+    return gerar_dados_xy(db, "line", projeto_id, pergunta_x, pergunta_y, perguntas_info, agregacao_y, fracao)
+
+def gerar_dados_xy(db: Session, tipo_grafico: str, projeto_id: int, pergunta_x: str, pergunta_y: str, perguntas_info: Dict, agregacao_y: str, fracao: float = 1.0) -> Dict[str, Any]:
+    """Agrega Y por X no banco e monta o gráfico de barras ou linha"""
     
     pergunta_x_info = perguntas_info[pergunta_x]
     pergunta_y_info = perguntas_info[pergunta_y]
     
-    query = text("""
-        SELECT rx.RESPOSTA as x_valor, ry.RESPOSTA as y_valor
+    # O modo aproximado pedido pelo usuário decide o caminho, com ou sem o cubo: o resultado
+    # fica no cache sob a chave do modo aproximado e precisa vir marcado como estimativa
+    if fracao < 1:
+        somar = agregacao_y != "contagem" and pergunta_y_info.tipo == 'numero'
+        linhas, margens = estimar_agregacao_xy(db, projeto_id, pergunta_x, pergunta_y, somar, fracao)
+        dados = montar_grafico_xy(db, tipo_grafico, pergunta_x_info, pergunta_y_info, agregacao_y, linhas)
+        dados["series"][0]["margem_erro"] = margens
+        return marcar_aproximado(dados, fracao)
+    
+    if cubo_respostas.habilitado():
+        # Agrupamento vetorizado sobre o cubo em memória, sem a autojunção em RESPOSTA
+        somar = agregacao_y != "contagem" and pergunta_y_info.tipo == 'numero'
+        grupos = cubo_respostas.agregar_xy(db, projeto_id, int(pergunta_x), int(pergunta_y), somar)
+        grupos.sort(key=lambda g: chave_ordenacao_x(g[0], g[1], g[2]))
+        linhas = [(valor, y) for valor, _, _, y in grupos]
+    else:
+        expressao = montar_expressao_agregacao(agregacao_y, pergunta_y_info.tipo)
+        dados = consultar_agregacao_xy(db, projeto_id, pergunta_x, pergunta_y, expressao)
+        linhas = [(row.x_valor, row.y_valor) for row in dados]
+    
+    return montar_grafico_xy(db, tipo_grafico, pergunta_x_info, pergunta_y_info, agregacao_y, linhas)
+
+def contar_submissoes_projeto(db: Session, projeto_id: int) -> int:
+    """Total de submissões do projeto, lido do contador"""
+    query_total = text("""
+        SELECT COALESCE(MAX(TOTAL_SUBMISSOES), 0)
+        FROM CONTADOR_PROJETO
+        WHERE PROJETO_ID = :projeto_id
+    """)
+    return db.execute(query_total, {"projeto_id": projeto_id}).scalar()
+
+def fracao_amostra(db: Session, projeto_id: int) -> float:
+    """Fração das submissões sorteada no modo aproximado (1.0 quando o projeto é pequeno)"""
+    total = contar_submissoes_projeto(db, projeto_id)
+    if total <= settings.GRAFICO_AMOSTRA_SUBMISSOES:
+        return 1.0
+    # Arredondada para a escala do filtro: a fração usada na estimativa é exatamente a sorteada
+    return max(1, round(settings.GRAFICO_AMOSTRA_SUBMISSOES / total * ESCALA_AMOSTRA)) / ESCALA_AMOSTRA
+
+def montar_filtro_amostra(fracao: float) -> str:
+    """Condição sobre as submissões do projeto (alias s) que mantém só as sorteadas.
+    O hash do ID sorteia cada submissão de forma independente e sempre igual, e o índice
+    IX_SUBMISSAO_PROJETO_AMOSTRA lê apenas as sorteadas do projeto, não a tabela inteira"""
+    if fracao >= 1:
+        return ""
+    return "AND (hashint4(s.ID) & 2147483647) % 1000000 < :limite_amostra"
+
+def parametros_amostra(fracao: float) -> Dict[str, int]:
+    return {"limite_amostra": round(fracao * ESCALA_AMOSTRA)}
+
+def margem_contagem(contagem_amostra: int, fracao: float) -> float:
+    """Margem de 95% da contagem estimada (contagem / fração) numa amostra de Bernoulli"""
+    return round(Z_95 * math.sqrt(contagem_amostra * (1 - fracao)) / fracao, 2)
+
+def marcar_aproximado(dados: Dict[str, Any], fracao: float) -> Dict[str, Any]:
+    dados["aproximado"] = True
+    dados["fracao_amostra"] = round(fracao, 6)
+    return dados
+
+def estimar_agregacao_xy(db: Session, projeto_id: int, pergunta_x: str, pergunta_y: str, somar: bool, fracao: float) -> tuple:
+    """Agrega Y por X numa amostra das submissões e retorna ([(x, y estimado)], [margem de 95%])"""
+    
+    query = text(f"""
+        SELECT rx.RESPOSTA as x_valor, COUNT(*) as quantidade,
+               SUM(ry.RESPOSTA_NUMERO) as soma,
+               SUM(ry.RESPOSTA_NUMERO * ry.RESPOSTA_NUMERO) as soma_quadrados
         FROM RESPOSTA rx
         INNER JOIN SUBMISSAO s ON rx.SUBMISSAO_ID = s.ID
         INNER JOIN RESPOSTA ry ON s.ID = ry.SUBMISSAO_ID
-        WHERE s.PROJETO_ID = :projeto_id 
+        WHERE s.PROJETO_ID = :projeto_id {montar_filtro_amostra(fracao)}
         AND rx.PERGUNTA_ID = :pergunta_x 
         AND ry.PERGUNTA_ID = :pergunta_y
         AND rx.RESPOSTA IS NOT NULL AND rx.RESPOSTA != ''
         AND ry.RESPOSTA IS NOT NULL AND ry.RESPOSTA != ''
-        ORDER BY rx.RESPOSTA
+        GROUP BY rx.RESPOSTA, rx.RESPOSTA_DATA, rx.RESPOSTA_NUMERO
+        ORDER BY rx.RESPOSTA_DATA, rx.RESPOSTA_NUMERO, rx.RESPOSTA COLLATE "C"
     """)
-    
     dados = db.execute(query, {
-        "projeto_id": projeto_id, 
-        "pergunta_x": pergunta_x, 
-        "pergunta_y": pergunta_y
+        "projeto_id": projeto_id,
+        "pergunta_x": int(pergunta_x),
+        "pergunta_y": int(pergunta_y),
+        **parametros_amostra(fracao)
     }).fetchall()
+    return estimar_linhas_amostra(dados, somar, fracao)
+
+def estimar_linhas_amostra(dados: List[Any], somar: bool, fracao: float) -> tuple:
+    """Expande os grupos da amostra (x_valor, quantidade, soma, soma_quadrados) para o total"""
     
-    # Agrupar por X
-    agrupados = defaultdict(list)
-    
+    # Estimador de Horvitz-Thompson: cada submissão sorteada representa 1/fração submissões
+    linhas = []
+    margens = []
     for row in dados:
-        x_val = row.x_valor
-        y_val = row.y_valor
-        agrupados[x_val].append(y_val)
-    
-    # Processar dados
-    categories = []
-    values = []
-    
-    # Ordenar as chaves
-    sorted_keys = sorted(agrupados.keys())
-    if pergunta_x_info.tipo == 'data':
-        try:
-            sorted_keys = sorted(agrupados.keys(), key=lambda x: datetime.strptime(x, '%Y-%m-%d'))
-        except:
-            sorted_keys = sorted(agrupados.keys())
-    
-    for x_key in sorted_keys:
-        y_valores = agrupados[x_key]
-        
-        # Formatar chave para exibição
-        if pergunta_x_info.tipo == 'data':
-            x_display = formatar_data_para_exibicao(x_key)
-        elif pergunta_x_info.tipo == 'entidade':
-            x_display = obter_valor_exibicao_entidade(db, x_key)
+        if somar:
+            estimativa = row.soma / fracao if row.soma is not None else None
+            margem = Z_95 * math.sqrt((row.soma_quadrados or 0) * (1 - fracao)) / fracao
+            linhas.append((row.x_valor, estimativa))
+            margens.append(round(margem, 2))
         else:
-            x_display = str(x_key)
-        
-        categories.append(x_display)
-        
-        # Aplicar agregação
-        if agregacao_y == "contagem":
-            values.append(len(y_valores))
-        else:  # soma (padrão)
-            if pergunta_y_info.tipo == 'numero':
-                soma = sum(float(v) for v in y_valores if v)
-                values.append(soma)
-            else:
-                values.append(len(y_valores))
+            linhas.append((row.x_valor, round(row.quantidade / fracao)))
+            margens.append(margem_contagem(row.quantidade, fracao))
+    return linhas, margens
+
+class ReducaoMinMax:
+    """Mantém apenas o menor e o maior ponto de cada balde de posições consecutivas"""
     
-    # Determinar label do eixo Y
-    if agregacao_y == "contagem":
-        y_label = f"Contagem de {pergunta_y_info.pergunta}"
-    else:
-        if pergunta_y_info.tipo == 'numero':
-            y_label = f"Soma de {pergunta_y_info.pergunta}"
+    def __init__(self, tamanho_balde: int):
+        self.tamanho_balde = tamanho_balde
+        self.resultado = []
+        self.balde_atual = None
+        self.menor = None
+        self.maior = None
+    
+    def _fechar_balde(self):
+        if self.menor is None:
+            return
+        if self.menor is self.maior:
+            self.resultado.append(self.menor)
         else:
-            y_label = f"Contagem de {pergunta_y_info.pergunta}"
+            self.resultado.extend(sorted([self.menor, self.maior], key=lambda p: p[0]))
     
-    return {
-        "type": "line",
-        "title": {
-            "text": f"{pergunta_x_info.pergunta} vs {y_label}"
-        },
-        "series": [{
-            "name": y_label,
-            "data": values,
-            "mode": "lines+markers"
-        }],
-        "categories": categories
-    }
+    def adicionar(self, ponto: List[Any]):
+        balde = (ponto[0] - 1) // self.tamanho_balde
+        if balde != self.balde_atual:
+            self._fechar_balde()
+            self.balde_atual = balde
+            self.menor = self.maior = ponto
+        else:
+            if ponto[1] < self.menor[1]:
+                self.menor = ponto
+            if ponto[1] > self.maior[1]:
+                self.maior = ponto
+    
+    def finalizar(self) -> List[List[Any]]:
+        self._fechar_balde()
+        self.menor = self.maior = None
+        return self.resultado
+
+def converter_valor_dispersao(row, tipo: str) -> Optional[float]:
+    """Valor Y de uma resposta no gráfico de dispersão (None quando não há valor tipado)"""
+    if tipo == 'numero':
+        return row.resposta_numero
+    elif tipo == 'data':
+        return datetime.combine(row.resposta_data, time()).timestamp() if row.resposta_data else None
+    # CRC32 em vez de hash(): o hash de texto muda a cada processo (PYTHONHASHSEED), e o mesmo
+    # ETag precisa corresponder às mesmas coordenadas em todos os workers
+    return zlib.crc32(row.resposta.encode("utf-8")) % 1000
+
+def contar_respostas_pergunta(db: Session, pergunta_id) -> int:
+    """Total de respostas de uma pergunta, lido do contador sem percorrer RESPOSTA"""
+    query_total = text("""
+        SELECT COALESCE(MAX(TOTAL_RESPOSTAS), 0)
+        FROM CONTADOR_PERGUNTA
+        WHERE PERGUNTA_ID = :pergunta_id
+    """)
+    return db.execute(query_total, {"pergunta_id": int(pergunta_id)}).scalar()
+
+class AcumuladorDispersao:
+    """Recebe as respostas em ordem de submissão e aplica a redução de pontos se necessário"""
+    
+    def __init__(self, total_respostas: int):
+        limite_pontos = settings.GRAFICO_LIMITE_PONTOS
+        self.total_respostas = total_respostas
+        self.reduzido = total_respostas > limite_pontos
+        self.posicao = 0
+        # Dois pontos (mínimo e máximo) por balde para caber no limite
+        tamanho_balde = math.ceil(total_respostas / max(1, limite_pontos // 2)) if self.reduzido else 1
+        self.reducao = ReducaoMinMax(tamanho_balde) if self.reduzido else None
+        self.pontos = []
+    
+    def adicionar(self, y_val: Optional[float]):
+        self.posicao += 1
+        if y_val is None:
+            return
+        if self.reducao:
+            self.reducao.adicionar([self.posicao, y_val])
+        else:
+            self.pontos.append([self.posicao, y_val])
+    
+    def finalizar(self) -> List[List[Any]]:
+        return self.reducao.finalizar() if self.reducao else self.pontos
 
 def gerar_dados_dispersao(db: Session, projeto_id: int, pergunta_id: str, perguntas_info: Dict) -> Dict[str, Any]:
-    """Gera dados para gráfico de dispersão"""
+    """Gera dados para gráfico de dispersão, reduzindo a quantidade de pontos quando necessário"""
     
     pergunta_info = perguntas_info[pergunta_id]
+    acumulador = AcumuladorDispersao(contar_respostas_pergunta(db, pergunta_id))
     
     query = text("""
-        SELECT r.RESPOSTA, s.DATA_CADASTRO
+        SELECT r.RESPOSTA, r.RESPOSTA_NUMERO, r.RESPOSTA_DATA, s.DATA_CADASTRO
         FROM RESPOSTA r
         INNER JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
         WHERE s.PROJETO_ID = :projeto_id AND r.PERGUNTA_ID = :pergunta_id
@@ -463,35 +728,332 @@ def gerar_dados_dispersao(db: Session, projeto_id: int, pergunta_id: str, pergun
         ORDER BY s.DATA_CADASTRO
     """)
     
-    dados = db.execute(query, {"projeto_id": projeto_id, "pergunta_id": pergunta_id}).fetchall()
+    # Cursor do lado do servidor: as linhas chegam em lotes em vez de todas de uma vez
+    dados = db.execute(
+        query,
+        {"projeto_id": projeto_id, "pergunta_id": int(pergunta_id)},
+        execution_options={"yield_per": 2000}
+    )
+    for row in dados:
+        acumulador.adicionar(converter_valor_dispersao(row, pergunta_info.tipo))
     
-    scatter_data = []
-    for i, row in enumerate(dados):
-        try:
-            if pergunta_info.tipo == 'numero':
-                y_val = float(row.resposta)
-            elif pergunta_info.tipo == 'data':
-                date_obj = datetime.strptime(row.resposta, '%Y-%m-%d')
-                y_val = date_obj.timestamp()
-            else:
-                y_val = hash(row.resposta) % 1000
+    return montar_grafico_dispersao(
+        pergunta_info, acumulador.finalizar(), acumulador.total_respostas, acumulador.reduzido
+    )
+
+# Painel: vários gráficos calculados em uma única passagem pelas respostas do projeto
+
+def chave_ordenacao_x(valor: str, numero: Optional[float], data) -> tuple:
+    """Mesma ordem do ORDER BY de consultar_agregacao_xy (tipados primeiro, nulos por último)"""
+    return (
+        data is None, data or datetime.min.date(),
+        numero is None, numero or 0.0,
+        valor
+    )
+
+class AcumuladorXY:
+    def __init__(self, pergunta_x: int, pergunta_y: int, somar: bool):
+        self.pergunta_x = pergunta_x
+        self.pergunta_y = pergunta_y
+        self.somar = somar
+        self.grupos = {}
+    
+    def adicionar(self, respostas: Dict[int, Any]):
+        rx = respostas.get(self.pergunta_x)
+        ry = respostas.get(self.pergunta_y)
+        if rx is None or ry is None:
+            return
+        
+        grupo = self.grupos.get(rx.resposta)
+        if grupo is None:
+            chave = chave_ordenacao_x(rx.resposta, rx.resposta_numero, rx.resposta_data)
+            # Igual ao SQL: SUM de nenhum número é NULL, COUNT começa em 0
+            grupo = self.grupos[rx.resposta] = [chave, None if self.somar else 0]
+        
+        if not self.somar:
+            grupo[1] += 1
+        elif ry.resposta_numero is not None:
+            grupo[1] = (grupo[1] or 0.0) + ry.resposta_numero
+    
+    def finalizar(self) -> List[Any]:
+        ordenados = sorted(self.grupos.items(), key=lambda item: item[1][0])
+        return [(x, grupo[1]) for x, grupo in ordenados]
+
+def gerar_dados_painel(db: Session, projeto_id: int, especificacoes: List[Dict[str, Any]], perguntas_info: Dict) -> List[Dict[str, Any]]:
+    """Calcula todos os gráficos do painel a partir de uma única leitura das respostas"""
+    
+    # Cada gráfico de barras/linha/dispersão recebe as respostas pivotadas de cada submissão
+    consumidores = {}
+    perguntas_usadas = set()
+    for indice, espec in enumerate(especificacoes):
+        tipo = espec["tipo_grafico"]
+        if tipo not in ("bar", "line", "scatter"):
+            continue
+        pergunta_x = int(espec["pergunta_x"])
+        
+        if tipo in ("bar", "line"):
+            pergunta_y = int(espec["pergunta_y"])
+            somar = espec["agregacao_y"] != "contagem" and perguntas_info[espec["pergunta_y"]].tipo == 'numero'
+            acumulador = AcumuladorXY(pergunta_x, pergunta_y, somar)
+            consumidores[indice] = (acumulador, acumulador.adicionar)
+            perguntas_usadas.update((pergunta_x, pergunta_y))
+        elif tipo == "scatter":
+            acumulador = AcumuladorDispersao(contar_respostas_pergunta(db, pergunta_x))
+            tipo_x = perguntas_info[espec["pergunta_x"]].tipo
+            
+            def alimentar(respostas, acumulador=acumulador, pergunta_x=pergunta_x, tipo_x=tipo_x):
+                row = respostas.get(pergunta_x)
+                if row is not None:
+                    acumulador.adicionar(converter_valor_dispersao(row, tipo_x))
             
-            scatter_data.append([i + 1, y_val])
-        except:
+            consumidores[indice] = (acumulador, alimentar)
+            perguntas_usadas.add(pergunta_x)
+    
+    if perguntas_usadas:
+        # Uma linha por resposta, agrupadas por submissão na ordem usada pela dispersão
+        query = text("""
+            SELECT r.SUBMISSAO_ID, r.PERGUNTA_ID, r.RESPOSTA, r.RESPOSTA_NUMERO, r.RESPOSTA_DATA
+            FROM RESPOSTA r
+            INNER JOIN SUBMISSAO s ON r.SUBMISSAO_ID = s.ID
+            WHERE s.PROJETO_ID = :projeto_id
+            AND r.PERGUNTA_ID = ANY(:perguntas)
+            AND r.RESPOSTA IS NOT NULL AND r.RESPOSTA != ''
+            ORDER BY s.DATA_CADASTRO, s.ID
+        """)
+        dados = db.execute(
+            query,
+            {"projeto_id": projeto_id, "perguntas": sorted(perguntas_usadas)},
+            execution_options={"yield_per": 2000}
+        )
+        
+        alimentadores = [alimentar for _, alimentar in consumidores.values()]
+        
+        # Pivô por submissão: {pergunta_id: resposta}
+        submissao_atual = None
+        respostas = {}
+        for row in dados:
+            if row.submissao_id != submissao_atual:
+                for alimentar in alimentadores:
+                    alimentar(respostas)
+                submissao_atual = row.submissao_id
+                respostas = {}
+            respostas[row.pergunta_id] = row
+        for alimentar in alimentadores:
+            alimentar(respostas)
+    
+    graficos = []
+    for indice, espec in enumerate(especificacoes):
+        tipo = espec["tipo_grafico"]
+        
+        if tipo == "trend":
+            # Tendência também não precisa da leitura: vem dos resumos diários
+            graficos.append(gerar_dados_tendencia(
+                db, projeto_id, espec["pergunta_x"], perguntas_info, espec["agregacao_y"], espec["periodo"]
+            ))
+            continue
+        
+        if tipo in TIPOS_TABELA_CRUZADA:
+            graficos.append(gerar_dados_tabela_cruzada(
+                db, tipo, projeto_id, espec["pergunta_x"], espec["pergunta_y"], perguntas_info
+            ))
             continue
+        
+        pergunta_x_info = perguntas_info[espec["pergunta_x"]]
+        
+        if tipo == "pie":
+            # Pizza não precisa da leitura: vem direto do resumo de respostas
+            graficos.append(gerar_dados_pizza(db, projeto_id, espec["pergunta_x"], perguntas_info))
+        elif tipo in ("bar", "line"):
+            acumulador = consumidores[indice][0]
+            graficos.append(montar_grafico_xy(
+                db, tipo, pergunta_x_info, perguntas_info[espec["pergunta_y"]],
+                espec["agregacao_y"], acumulador.finalizar()
+            ))
+        else:
+            acumulador = consumidores[indice][0]
+            graficos.append(montar_grafico_dispersao(
+                pergunta_x_info, acumulador.finalizar(), acumulador.total_respostas, acumulador.reduzido
+            ))
+    
+    return graficos
+
+def selecionar_principais(totais: Dict[Any, Any], limite: int) -> tuple:
+    """Retorna os valores de maior total (no máximo limite) e se sobraram valores para Outros"""
+    ordenados = sorted(totais, key=lambda valor: (-totais[valor], valor))
+    return ordenados[:limite], len(ordenados) > limite
+
+def gerar_periodos(inicio, fim, periodo: str) -> List[Any]:
+    """Lista os inícios de período entre inicio e fim, inclusive, para preencher os períodos vazios"""
+    periodos = []
+    atual = inicio
+    while atual <= fim:
+        periodos.append(atual)
+        if periodo == "dia":
+            atual += timedelta(days=1)
+        elif periodo == "semana":
+            atual += timedelta(days=7)
+        else:
+            atual = (atual.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return periodos
+
+def formatar_periodo(inicio, periodo: str) -> str:
+    if periodo == "mes":
+        return inicio.strftime('%m/%Y')
+    return inicio.strftime('%d/%m/%Y')
+
+def gerar_dados_tendencia(db: Session, projeto_id: int, pergunta_id: Optional[str], perguntas_info: Dict, agregacao_y: str = "soma", periodo: str = "dia") -> Dict[str, Any]:
+    """Gera dados para gráfico de tendência a partir dos resumos diários"""
+    
+    pergunta_info = perguntas_info.get(pergunta_id) if pergunta_id else None
+    parametros = {"unidade": PERIODOS_TENDENCIA[periodo], "projeto_id": projeto_id, "pergunta_id": int(pergunta_id) if pergunta_info else None}
+    expressao_periodo = "CAST(DATE_TRUNC(:unidade, CAST(DIA AS TIMESTAMP)) AS DATE)"
+    nome_periodo = {"dia": "dia", "semana": "semana", "mes": "mês"}[periodo]
+    por_valor = False
+    
+    if pergunta_info is None:
+        # Sem pergunta: quantidade de submissões por período
+        query = text(f"""
+            SELECT {expressao_periodo} as periodo, '' as valor, SUM(QUANTIDADE) as total
+            FROM RESUMO_SUBMISSAO_DIA
+            WHERE PROJETO_ID = :projeto_id AND QUANTIDADE > 0
+            GROUP BY 1 ORDER BY 1
+        """)
+        titulo = f"Submissões por {nome_periodo}"
+    elif agregacao_y != "contagem" and pergunta_info.tipo == 'numero':
+        # Pergunta numérica: soma das respostas por período
+        query = text(f"""
+            SELECT {expressao_periodo} as periodo, '' as valor, SUM(SOMA_NUMERICA) as total
+            FROM RESUMO_RESPOSTA_DIA
+            WHERE PERGUNTA_ID = :pergunta_id AND QUANTIDADE > 0
+            GROUP BY 1 ORDER BY 1
+        """)
+        titulo = f"Soma de {pergunta_info.pergunta} por {nome_periodo}"
+    else:
+        # Demais casos: uma série por valor de resposta, com a contagem por período
+        query = text(f"""
+            SELECT {expressao_periodo} as periodo, VALOR as valor, SUM(QUANTIDADE) as total
+            FROM RESUMO_RESPOSTA_DIA
+            WHERE PERGUNTA_ID = :pergunta_id AND QUANTIDADE > 0
+            GROUP BY 1, VALOR ORDER BY 1
+        """)
+        titulo = f"{pergunta_info.pergunta} por {nome_periodo}"
+        por_valor = True
+    
+    linhas = db.execute(query, parametros).fetchall()
+    
+    # Valores com mais respostas no total viram séries; os demais são somados em "Outros"
+    totais = defaultdict(int)
+    for row in linhas:
+        totais[row.valor] += row.total or 0
+    principais, outros = selecionar_principais(totais, MAXIMO_SERIES_TENDENCIA)
+    
+    periodos = gerar_periodos(linhas[0].periodo, linhas[-1].periodo, periodo) if linhas else []
+    posicoes = {inicio: i for i, inicio in enumerate(periodos)}
+    valores_serie = {valor: [0] * len(periodos) for valor in principais}
+    if outros:
+        valores_serie[None] = [0] * len(periodos)
+    
+    for row in linhas:
+        serie = valores_serie[row.valor if row.valor in valores_serie else None]
+        serie[posicoes[row.periodo]] += row.total or 0
+    
+    if por_valor:
+        nomes = formatar_valores_categoria(db, principais, pergunta_info.tipo)
+    else:
+        nomes = [titulo]
+    
+    series = [
+        {"name": nome, "data": valores_serie[valor], "mode": "lines+markers"}
+        for nome, valor in zip(nomes, principais)
+    ]
+    if outros:
+        series.append({"name": "Outros", "data": valores_serie[None], "mode": "lines+markers"})
     
     return {
-        "type": "scatter",
+        "type": "trend",
         "title": {
-            "text": f"Dispersão: {pergunta_info.pergunta}"
+            "text": titulo
         },
-        "series": [{
-            "name": pergunta_info.pergunta,
-            "data": scatter_data,
-            "mode": "markers",
-            "marker": {
-                "size": 8,
-                "color": "blue"
-            }
-        }]
-    }
\ No newline at end of file
+        "series": series,
+        "categories": [formatar_periodo(inicio, periodo) for inicio in periodos]
+    }
+
+def gerar_dados_tabela_cruzada(db: Session, tipo_grafico: str, projeto_id: int, pergunta_x: str, pergunta_y: str, perguntas_info: Dict, fracao: float = 1.0) -> Dict[str, Any]:
+    """Conta as submissões de cada par (valor de X, valor de Y) e monta barras empilhadas ou mapa de calor"""
+    
+    pergunta_x_info = perguntas_info[pergunta_x]
+    pergunta_y_info = perguntas_info[pergunta_y]
+    
+    # Uma única agregação sobre todos os pares; as colunas tipadas servem para a ordenação
+    query = text(f"""
+        SELECT rx.RESPOSTA as x_valor, rx.RESPOSTA_NUMERO as x_numero, rx.RESPOSTA_DATA as x_data,
+               ry.RESPOSTA as y_valor, ry.RESPOSTA_NUMERO as y_numero, ry.RESPOSTA_DATA as y_data,
+               COUNT(*) as total
+        FROM RESPOSTA rx
+        INNER JOIN SUBMISSAO s ON rx.SUBMISSAO_ID = s.ID
+        INNER JOIN RESPOSTA ry ON s.ID = ry.SUBMISSAO_ID
+        WHERE s.PROJETO_ID = :projeto_id {montar_filtro_amostra(fracao)}
+        AND rx.PERGUNTA_ID = :pergunta_x 
+        AND ry.PERGUNTA_ID = :pergunta_y
+        AND rx.RESPOSTA IS NOT NULL AND rx.RESPOSTA != ''
+        AND ry.RESPOSTA IS NOT NULL AND ry.RESPOSTA != ''
+        GROUP BY rx.RESPOSTA, rx.RESPOSTA_NUMERO, rx.RESPOSTA_DATA,
+                 ry.RESPOSTA, ry.RESPOSTA_NUMERO, ry.RESPOSTA_DATA
+    """)
+    linhas = db.execute(query, {
+        "projeto_id": projeto_id,
+        "pergunta_x": int(pergunta_x),
+        "pergunta_y": int(pergunta_y),
+        **parametros_amostra(fracao)
+    }).fetchall()
+    
+    totais_x = defaultdict(int)
+    totais_y = defaultdict(int)
+    ordem_x = {}
+    ordem_y = {}
+    for row in linhas:
+        totais_x[row.x_valor] += row.total
+        totais_y[row.y_valor] += row.total
+        ordem_x[row.x_valor] = chave_ordenacao_x(row.x_valor, row.x_numero, row.x_data)
+        ordem_y[row.y_valor] = chave_ordenacao_x(row.y_valor, row.y_numero, row.y_data)
+    
+    # Mantém os valores mais frequentes de cada eixo, exibidos na ordem natural (data, número, texto)
+    principais_x, outros_x = selecionar_principais(totais_x, MAXIMO_CATEGORIAS_TABELA)
+    principais_y, outros_y = selecionar_principais(totais_y, MAXIMO_CATEGORIAS_TABELA)
+    principais_x.sort(key=ordem_x.get)
+    principais_y.sort(key=ordem_y.get)
+    
+    posicoes_x = {valor: i for i, valor in enumerate(principais_x)}
+    posicoes_y = {valor: i for i, valor in enumerate(principais_y)}
+    colunas = len(principais_x) + (1 if outros_x else 0)
+    matriz = [[0] * colunas for _ in range(len(principais_y) + (1 if outros_y else 0))]
+    
+    for row in linhas:
+        i = posicoes_y.get(row.y_valor, len(principais_y))
+        j = posicoes_x.get(row.x_valor, len(principais_x))
+        matriz[i][j] += row.total
+    
+    categories = formatar_valores_categoria(db, principais_x, pergunta_x_info.tipo)
+    nomes = formatar_valores_categoria(db, principais_y, pergunta_y_info.tipo)
+    if outros_x:
+        categories.append("Outros")
+    if outros_y:
+        nomes.append("Outros")
+    
+    dados = {
+        "type": tipo_grafico,
+        "title": {
+            "text": f"{pergunta_x_info.pergunta} x {pergunta_y_info.pergunta}"
+        },
+        "series": [{"name": nome, "data": dados} for nome, dados in zip(nomes, matriz)],
+        "categories": categories
+    }
+    
+    if fracao < 1:
+        # Contagens da amostra expandidas para o projeto, com a margem de cada célula
+        for serie in dados["series"]:
+            serie["margem_erro"] = [margem_contagem(total, fracao) for total in serie["data"]]
+            serie["data"] = [round(total / fracao) for total in serie["data"]]
+        return marcar_aproximado(dados, fracao)
+    
+    return dados
@@ -1,11 +1,14 @@
 from typing import Optional
 from fastapi import APIRouter, Depends, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
+from app.db import contadores
+from app.core import exportacao, validacao_respostas
 from app.session_dependencies import get_usuario_autenticado
 
 router = APIRouter()
@@ -347,6 +350,8 @@ def deletar_entidade(
         
         query_delete = text("DELETE FROM ESTR_ENTIDADE WHERE ID = :entidade_id")
         db.execute(query_delete, {"entidade_id": entidade_id})
+        # Perguntas do tipo entidade ficam sem estrutura (ON DELETE SET NULL)
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
@@ -498,6 +503,7 @@ def criar_atributo(
             "editavel": editavel == "true",
             "obrigatorio": obrigatorio == "true"
         })
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
@@ -578,6 +584,7 @@ def editar_atributo(
             "atributo_id": atributo_id,
             "entidade_id": entidade_id
         })
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
@@ -616,6 +623,7 @@ def deletar_atributo(
         
         query_delete = text("DELETE FROM ESTR_ATRIBUTOS WHERE ID_SEQ = :atributo_id AND ESTR_ENTIDADE_ID = :entidade_id")
         db.execute(query_delete, {"atributo_id": atributo_id, "entidade_id": entidade_id})
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
@@ -755,6 +763,8 @@ def criar_pergunta(
             "tipo": tipo,
             "modelo": modelo
         })
+        contadores.registrar_pergunta(db, projeto_id)
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
@@ -813,6 +823,7 @@ def editar_pergunta(
             "estr_entidade_id": estr_entidade_id,
             "pergunta_id": pergunta_id
         })
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
@@ -848,6 +859,8 @@ def deletar_pergunta(
         
         query_delete = text("DELETE FROM PERGUNTA WHERE ID = :pergunta_id")
         db.execute(query_delete, {"pergunta_id": pergunta_id})
+        contadores.registrar_pergunta(db, projeto_id, -1)
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
@@ -907,12 +920,23 @@ def listar_instancias(
         else:
             outros_atributos.append(atributo)
     
+    # Página de instâncias com todos os valores em uma única consulta: os atributos de
+    # cada instância vêm agregados em um objeto JSON {ESTR_ATRIBUTO_ID_SEQ: VALOR}
     query_base = """
-        SELECT e.ID_SEQ, e.DATA_CADASTRO
-        FROM ENTIDADE e
-        WHERE e.ESTR_ENTIDADE_ID = :entidade_id
-        ORDER BY e.DATA_CADASTRO DESC 
-        LIMIT :limite OFFSET :passo
+        SELECT e.ID_SEQ, e.DATA_CADASTRO, COALESCE(v.valores, '{}'::jsonb) as valores
+        FROM (
+            SELECT ID_SEQ, DATA_CADASTRO
+            FROM ENTIDADE
+            WHERE ESTR_ENTIDADE_ID = :entidade_id
+            ORDER BY DATA_CADASTRO DESC, ID_SEQ DESC
+            LIMIT :limite OFFSET :passo
+        ) e
+        LEFT JOIN LATERAL (
+            SELECT jsonb_object_agg(a.ESTR_ATRIBUTO_ID_SEQ, a.VALOR) as valores
+            FROM ATRIBUTOS a
+            WHERE a.ESTR_ENTIDADE_ID = :entidade_id AND a.ENTIDADE_ID_SEQ = e.ID_SEQ
+        ) v ON TRUE
+        ORDER BY e.DATA_CADASTRO DESC, e.ID_SEQ DESC
     """
     
     result = db.execute(text(query_base), {"entidade_id": entidade_id, "limite": limite, "passo": passo})
@@ -925,20 +949,9 @@ def listar_instancias(
             "data_cadastro": entidade_row.data_cadastro
         }
         
+        # Chaves do JSON são texto
         for atributo in todos_atributos:
-            query_valor = text("""
-                SELECT VALOR FROM ATRIBUTOS 
-                WHERE ESTR_ENTIDADE_ID = :entidade_id 
-                AND ENTIDADE_ID_SEQ = :entidade_seq 
-                AND ESTR_ATRIBUTO_ID_SEQ = :atributo_seq
-            """)
-            valor_result = db.execute(query_valor, {
-                "entidade_id": entidade_id,
-                "entidade_seq": entidade_row.id_seq,
-                "atributo_seq": atributo.id_seq
-            }).first()
-            
-            instancia[f"valor_{atributo.nome_atributo}"] = valor_result.valor if valor_result else None
+            instancia[f"valor_{atributo.nome_atributo}"] = entidade_row.valores.get(str(atributo.id_seq))
         
         instancias.append(instancia)
     
@@ -971,13 +984,43 @@ def listar_instancias(
     
     return templates.TemplateResponse("instancias.html", contexto)
 
+@router.get("/{projeto_id}/entidades/{entidade_id}/instancias/exportar")
+def exportar_instancias(
+    projeto_id: int,
+    entidade_id: int,
+    formato: str = "csv",
+    current_user = Depends(get_usuario_autenticado),
+    db: Session = Depends(get_db)
+):
+    """Exporta as instâncias da entidade, uma coluna por atributo"""
+    query_verificar = text("""
+        SELECT ee.ID FROM ESTR_ENTIDADE ee
+        INNER JOIN PROJETO p ON ee.PROJETO_ID = p.ID
+        INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID 
+        WHERE ee.ID = :entidade_id AND p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
+    """)
+    if not db.execute(query_verificar, {"entidade_id": entidade_id, "projeto_id": projeto_id, "usuario_id": current_user['id']}).first():
+        return RedirectResponse(url="/projetos/?error_message=Entidade não encontrada", status_code=303)
+    
+    if formato not in exportacao.FORMATOS_EXPORTACAO:
+        return RedirectResponse(
+            url=f"/projetos/{projeto_id}/entidades/{entidade_id}/instancias?error_message=Formato de exportação inválido", 
+            status_code=303
+        )
+    
+    return StreamingResponse(
+        exportacao.exportar_instancias(entidade_id, formato),
+        media_type=exportacao.FORMATOS_EXPORTACAO[formato],
+        headers={"Content-Disposition": f'attachment; filename="entidade_{entidade_id}_instancias.{formato}"'}
+    )
+
 @router.post("/{projeto_id}/entidades/{entidade_id}/instancias/criar")
 async def criar_instancia(
     projeto_id: int,
     entidade_id: int,
     request: Request,
     current_user = Depends(get_usuario_autenticado),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         query_verificar = text("""
@@ -986,21 +1029,21 @@ async def criar_instancia(
             INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID 
             WHERE ee.ID = :entidade_id AND p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
         """)
-        if not db.execute(query_verificar, {"entidade_id": entidade_id, "projeto_id": projeto_id, "usuario_id": current_user['id']}).first():
+        if not (await db.execute(query_verificar, {"entidade_id": entidade_id, "projeto_id": projeto_id, "usuario_id": current_user['id']})).first():
             return RedirectResponse(url="/projetos/?error_message=Entidade não encontrada", status_code=303)
         
         query_max_seq = text("SELECT COALESCE(MAX(ID_SEQ), 0) + 1 as next_seq FROM ENTIDADE WHERE ESTR_ENTIDADE_ID = :entidade_id")
-        next_seq = db.execute(query_max_seq, {"entidade_id": entidade_id}).scalar()
+        next_seq = (await db.execute(query_max_seq, {"entidade_id": entidade_id})).scalar()
         
         query_criar_entidade = text("INSERT INTO ENTIDADE (ID_SEQ, ESTR_ENTIDADE_ID) VALUES (:id_seq, :entidade_id)")
-        db.execute(query_criar_entidade, {"id_seq": next_seq, "entidade_id": entidade_id})
+        await db.execute(query_criar_entidade, {"id_seq": next_seq, "entidade_id": entidade_id})
         
         query_atributos = text("""
             SELECT ID_SEQ, NOME_ATRIBUTO, OBRIGATORIO
             FROM ESTR_ATRIBUTOS 
             WHERE ESTR_ENTIDADE_ID = :entidade_id
         """)
-        atributos = db.execute(query_atributos, {"entidade_id": entidade_id}).fetchall()
+        atributos = (await db.execute(query_atributos, {"entidade_id": entidade_id})).fetchall()
         
         form_data = await request.form()
         
@@ -1018,14 +1061,16 @@ async def criar_instancia(
                     INSERT INTO ATRIBUTOS (ESTR_ENTIDADE_ID, ENTIDADE_ID_SEQ, ESTR_ATRIBUTO_ID_SEQ, VALOR)
                     VALUES (:entidade_id, :entidade_seq, :atributo_seq, :valor)
                 """)
-                db.execute(query_inserir_valor, {
+                await db.execute(query_inserir_valor, {
                     "entidade_id": entidade_id,
                     "entidade_seq": next_seq,
                     "atributo_seq": atributo.id_seq,
                     "valor": valor
                 })
         
-        db.commit()
+        # O ID_SEQ pode reaproveitar o de uma instância excluída: rótulos em cache deixam de valer
+        await db.run_sync(contadores.registrar_alteracao, projeto_id, True)
+        await db.commit()
         
         return RedirectResponse(
             url=f"/projetos/{projeto_id}/entidades/{entidade_id}/instancias?success_message=Instância criada com sucesso", 
@@ -1045,7 +1090,7 @@ async def editar_instancia(
     instancia_id: int,
     request: Request,
     current_user = Depends(get_usuario_autenticado),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         query_verificar = text("""
@@ -1056,7 +1101,7 @@ async def editar_instancia(
             WHERE e.ID_SEQ = :instancia_id AND e.ESTR_ENTIDADE_ID = :entidade_id 
             AND ee.ID = :entidade_id AND p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
         """)
-        if not db.execute(query_verificar, {"instancia_id": instancia_id, "entidade_id": entidade_id, "projeto_id": projeto_id, "usuario_id": current_user['id']}).first():
+        if not (await db.execute(query_verificar, {"instancia_id": instancia_id, "entidade_id": entidade_id, "projeto_id": projeto_id, "usuario_id": current_user['id']})).first():
             return RedirectResponse(
                 url=f"/projetos/{projeto_id}/entidades/{entidade_id}/instancias?error_message=Instância não encontrada", 
                 status_code=303
@@ -1067,7 +1112,7 @@ async def editar_instancia(
             FROM ESTR_ATRIBUTOS 
             WHERE ESTR_ENTIDADE_ID = :entidade_id
         """)
-        atributos = db.execute(query_atributos, {"entidade_id": entidade_id}).fetchall()
+        atributos = (await db.execute(query_atributos, {"entidade_id": entidade_id})).fetchall()
         
         form_data = await request.form()
         
@@ -1089,7 +1134,7 @@ async def editar_instancia(
                 AND ENTIDADE_ID_SEQ = :instancia_id 
                 AND ESTR_ATRIBUTO_ID_SEQ = :atributo_seq
             """)
-            db.execute(query_delete_valor, {
+            await db.execute(query_delete_valor, {
                 "entidade_id": entidade_id,
                 "instancia_id": instancia_id,
                 "atributo_seq": atributo.id_seq
@@ -1100,14 +1145,15 @@ async def editar_instancia(
                     INSERT INTO ATRIBUTOS (ESTR_ENTIDADE_ID, ENTIDADE_ID_SEQ, ESTR_ATRIBUTO_ID_SEQ, VALOR)
                     VALUES (:entidade_id, :instancia_id, :atributo_seq, :valor)
                 """)
-                db.execute(query_inserir_valor, {
+                await db.execute(query_inserir_valor, {
                     "entidade_id": entidade_id,
                     "instancia_id": instancia_id,
                     "atributo_seq": atributo.id_seq,
                     "valor": valor
                 })
         
-        db.commit()
+        await db.run_sync(contadores.registrar_alteracao, projeto_id, True)
+        await db.commit()
         
         return RedirectResponse(
             url=f"/projetos/{projeto_id}/entidades/{entidade_id}/instancias?success_message=Instância atualizada com sucesso", 
@@ -1145,6 +1191,7 @@ def deletar_instancia(
         
         query_delete = text("DELETE FROM ENTIDADE WHERE ID_SEQ = :instancia_id AND ESTR_ENTIDADE_ID = :entidade_id")
         db.execute(query_delete, {"instancia_id": instancia_id, "entidade_id": entidade_id})
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
@@ -1233,41 +1280,15 @@ def criar_valor_padrao_pergunta(
                 status_code=303
             )
         
-        # Validação por tipo
+        # Validação por tipo, com as mesmas regras das submissões
         valor_limpo = valor.strip()
-        tipo_pergunta = pergunta_result.tipo
-        
-        if tipo_pergunta == 'numero':
-            try:
-                float(valor_limpo)
-            except ValueError:
-                return RedirectResponse(
-                    url=f"/projetos/{projeto_id}/perguntas/{pergunta_id}/valores-padrao?error_message=Para perguntas do tipo número, digite apenas valores numéricos", 
-                    status_code=303
-                )
-        elif tipo_pergunta == 'email':
-            import re
-            email_regex = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
-            if not re.match(email_regex, valor_limpo):
-                return RedirectResponse(
-                    url=f"/projetos/{projeto_id}/perguntas/{pergunta_id}/valores-padrao?error_message=Para perguntas do tipo email, digite um email válido", 
-                    status_code=303
-                )
-        elif tipo_pergunta == 'data':
-            from datetime import datetime
-            try:
-                datetime.strptime(valor_limpo, '%Y-%m-%d')
-            except ValueError:
-                return RedirectResponse(
-                    url=f"/projetos/{projeto_id}/perguntas/{pergunta_id}/valores-padrao?error_message=Para perguntas do tipo data, use o formato YYYY-MM-DD", 
-                    status_code=303
-                )
-        elif tipo_pergunta == 'booleano':
-            if valor_limpo not in ['true', 'false']:
-                return RedirectResponse(
-                    url=f"/projetos/{projeto_id}/perguntas/{pergunta_id}/valores-padrao?error_message=Para perguntas do tipo booleano, selecione apenas Sim ou Não", 
-                    status_code=303
-                )
+        try:
+            validacao_respostas.converter_valor(pergunta_result.tipo, valor_limpo)
+        except ValueError as e:
+            return RedirectResponse(
+                url=f"/projetos/{projeto_id}/perguntas/{pergunta_id}/valores-padrao?error_message=Valor inválido para perguntas do tipo {pergunta_result.tipo}: {e}", 
+                status_code=303
+            )
         
         # Verificar se já existe este valor
         query_existe = text("SELECT PERGUNTA_ID FROM VALORES_PADRAO WHERE PERGUNTA_ID = :pergunta_id AND VALOR = :valor")
@@ -1279,6 +1300,7 @@ def criar_valor_padrao_pergunta(
         
         query_insert = text("INSERT INTO VALORES_PADRAO (PERGUNTA_ID, VALOR) VALUES (:pergunta_id, :valor)")
         db.execute(query_insert, {"pergunta_id": pergunta_id, "valor": valor_limpo})
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
@@ -1315,6 +1337,7 @@ def deletar_valor_padrao_pergunta(
         
         query_delete = text("DELETE FROM VALORES_PADRAO WHERE PERGUNTA_ID = :pergunta_id AND VALOR = :valor")
         db.execute(query_delete, {"pergunta_id": pergunta_id, "valor": valor})
+        contadores.registrar_alteracao(db, projeto_id, esquema=True)
         db.commit()
         
         return RedirectResponse(
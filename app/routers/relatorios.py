@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Request, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
+import os
+from typing import Optional
+from fastapi import APIRouter, Request, Depends, Form
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, FileResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from app.db.database import get_db
+from app.db.database import get_db, get_db_analitico
+from app.core import exportacao, tarefas_relatorio
+from app.core.config import settings
 from app.session_dependencies import get_usuario_autenticado
 
 templates = Jinja2Templates(directory="templates")
@@ -12,29 +16,129 @@ router = APIRouter()
 @router.get("/", response_class=HTMLResponse)
 def selecionar_projeto_relatorio(
     request: Request,
+    success_message: Optional[str] = None,
+    error_message: Optional[str] = None,
     current_user = Depends(get_usuario_autenticado),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_analitico)
 ):
     """Tela para seleção de projeto para gráficos"""
     
+    # Total de submissões lido do contador do projeto
     query_projetos = text("""
         SELECT p.ID, p.NOME,
-               COUNT(DISTINCT s.ID) as total_submissoes
+               cp.TOTAL_SUBMISSOES as total_submissoes
         FROM PROJETO p
         INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID
-        LEFT JOIN SUBMISSAO s ON p.ID = s.PROJETO_ID
+        INNER JOIN CONTADOR_PROJETO cp ON p.ID = cp.PROJETO_ID
         WHERE up.USUARIO_ID = :usuario_id
-        GROUP BY p.ID, p.NOME
-        HAVING COUNT(DISTINCT s.ID) > 0
+        AND cp.TOTAL_SUBMISSOES > 0
         ORDER BY p.NOME
     """)
     
     projetos = db.execute(query_projetos, {"usuario_id": current_user['id']}).fetchall()
+    tarefas = tarefas_relatorio.listar(db, current_user['id'])
     
     contexto = {
         "request": request,
         "projetos": projetos,
-        "usuario": current_user
+        "tarefas": tarefas,
+        "validade_horas": settings.RELATORIOS_VALIDADE_HORAS,
+        "usuario": current_user,
+        "success_message": success_message,
+        "error_message": error_message
     }
     
-    return templates.TemplateResponse("relatorios.html", contexto)
\ No newline at end of file
+    return templates.TemplateResponse("relatorios.html", contexto)
+
+@router.get("/{projeto_id}/exportar")
+def exportar_submissoes(
+    projeto_id: int,
+    formato: str = "csv",
+    current_user = Depends(get_usuario_autenticado),
+    db: Session = Depends(get_db_analitico)
+):
+    """Exporta as submissões do projeto, uma linha por submissão e uma coluna por pergunta"""
+    
+    query_projeto = text("""
+        SELECT p.ID FROM PROJETO p 
+        INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID 
+        WHERE p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
+    """)
+    if not db.execute(query_projeto, {"projeto_id": projeto_id, "usuario_id": current_user['id']}).first():
+        return RedirectResponse(url="/relatorios/?error_message=Projeto não encontrado", status_code=303)
+    
+    if formato not in exportacao.FORMATOS_EXPORTACAO:
+        return RedirectResponse(url="/relatorios/?error_message=Formato de exportação inválido", status_code=303)
+    
+    # O arquivo é gerado enquanto é enviado: memória constante e primeiros bytes imediatos
+    return StreamingResponse(
+        exportacao.exportar_submissoes(projeto_id, formato),
+        media_type=exportacao.FORMATOS_EXPORTACAO[formato],
+        headers={"Content-Disposition": f'attachment; filename="projeto_{projeto_id}_submissoes.{formato}"'}
+    )
+
+@router.post("/{projeto_id}/tarefas")
+def enfileirar_relatorio(
+    projeto_id: int,
+    formato: str = Form("csv"),
+    current_user = Depends(get_usuario_autenticado),
+    db: Session = Depends(get_db)
+):
+    """Enfileira a geração do relatório do projeto para os trabalhadores em segundo plano"""
+    
+    query_projeto = text("""
+        SELECT p.ID FROM PROJETO p 
+        INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID 
+        WHERE p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
+    """)
+    if not db.execute(query_projeto, {"projeto_id": projeto_id, "usuario_id": current_user['id']}).first():
+        return RedirectResponse(url="/relatorios/?error_message=Projeto não encontrado", status_code=303)
+    
+    if formato not in exportacao.FORMATOS_EXPORTACAO:
+        return RedirectResponse(url="/relatorios/?error_message=Formato de exportação inválido", status_code=303)
+    
+    try:
+        tarefas_relatorio.enfileirar(db, current_user['id'], projeto_id, formato)
+    except tarefas_relatorio.LimiteTarefasExcedido:
+        db.rollback()
+        return RedirectResponse(
+            url="/relatorios/?error_message=Aguarde a conclusão dos relatórios em andamento antes de solicitar outro",
+            status_code=303
+        )
+    except Exception as e:
+        db.rollback()
+        print(f"Erro ao enfileirar relatório: {e}")
+        return RedirectResponse(url="/relatorios/?error_message=Erro ao solicitar relatório", status_code=303)
+    
+    return RedirectResponse(url="/relatorios/?success_message=Relatório solicitado. Ele ficará disponível para download quando concluído", status_code=303)
+
+@router.post("/tarefas/{tarefa_id}/cancelar")
+def cancelar_relatorio(
+    tarefa_id: int,
+    current_user = Depends(get_usuario_autenticado),
+    db: Session = Depends(get_db)
+):
+    """Cancela um relatório pendente ou em geração"""
+    
+    if not tarefas_relatorio.cancelar(db, tarefa_id, current_user['id']):
+        return RedirectResponse(url="/relatorios/?error_message=Relatório não pode mais ser cancelado", status_code=303)
+    
+    return RedirectResponse(url="/relatorios/?success_message=Relatório cancelado", status_code=303)
+
+@router.get("/tarefas/{tarefa_id}/download")
+def baixar_relatorio(
+    tarefa_id: int,
+    current_user = Depends(get_usuario_autenticado),
+    db: Session = Depends(get_db)
+):
+    """Download de um relatório concluído do próprio usuário"""
+    
+    tarefa = tarefas_relatorio.buscar_concluida(db, tarefa_id, current_user['id'])
+    if not tarefa or not tarefa.arquivo or not os.path.exists(tarefa.arquivo):
+        return RedirectResponse(url="/relatorios/?error_message=Relatório não encontrado", status_code=303)
+    
+    return FileResponse(
+        tarefa.arquivo,
+        media_type=exportacao.FORMATOS_EXPORTACAO[tarefa.formato],
+        filename=f"projeto_{tarefa.projeto_id}_submissoes.{tarefa.formato}"
+    )
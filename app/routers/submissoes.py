@@ -1,16 +1,29 @@
-from fastapi import APIRouter, Request, Depends, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+import csv
+import logging
+from fastapi import APIRouter, Request, Depends, Form, File, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from fastapi.templating import Jinja2Templates
 from typing import Optional
+from datetime import datetime
+from urllib.parse import quote
 
-from app.db.database import get_db
+from app.db.database import get_db, get_db_analitico, get_async_db
+from app.db import contadores, gravacao_respostas, resumo_respostas
+from app.core import busca_entidades, cubo_respostas, definicao_formulario, escrita_agrupada, importacao, validacao_respostas
 from app.session_dependencies import get_usuario_autenticado
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
+# Mensagens de depuração da submissão (nível DEBUG, desligadas por padrão)
+logger = logging.getLogger(__name__)
+
+# Submissões por página no histórico
+SUBMISSOES_POR_PAGINA = 50
+
 @router.get("/", response_class=HTMLResponse)
 def listar_projetos_submissao(
     request: Request,
@@ -19,17 +32,16 @@ def listar_projetos_submissao(
     current_user = Depends(get_usuario_autenticado),
     db: Session = Depends(get_db)
 ):
-    # Buscar projetos que o usuário tem acesso
+    # Buscar projetos que o usuário tem acesso (totais lidos dos contadores)
     query_projetos = text("""
         SELECT p.ID, p.NOME,
-               COUNT(DISTINCT pg.ID) as total_perguntas,
-               COUNT(DISTINCT s.ID) as total_submissoes_usuario
+               COALESCE(cp.TOTAL_PERGUNTAS, 0) as total_perguntas,
+               COALESCE(cup.TOTAL_SUBMISSOES, 0) as total_submissoes_usuario
         FROM PROJETO p
         INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID
-        LEFT JOIN PERGUNTA pg ON p.ID = pg.PROJETO_ID
-        LEFT JOIN SUBMISSAO s ON p.ID = s.PROJETO_ID AND s.USUARIO_ID = :usuario_id
+        LEFT JOIN CONTADOR_PROJETO cp ON p.ID = cp.PROJETO_ID
+        LEFT JOIN CONTADOR_USUARIO_PROJETO cup ON p.ID = cup.PROJETO_ID AND cup.USUARIO_ID = :usuario_id
         WHERE up.USUARIO_ID = :usuario_id
-        GROUP BY p.ID, p.NOME
         ORDER BY p.NOME
     """)
     projetos = db.execute(query_projetos, {"usuario_id": current_user['id']}).fetchall()
@@ -53,10 +65,11 @@ def formulario_submissao(
     current_user = Depends(get_usuario_autenticado),
     db: Session = Depends(get_db)
 ):
-    # Verificar se o usuário tem acesso ao projeto
+    # Verificar se o usuário tem acesso ao projeto (com a versão do esquema para o cache do formulário)
     query_verificar_projeto = text("""
-        SELECT p.ID, p.NOME FROM PROJETO p 
+        SELECT p.ID, p.NOME, COALESCE(cp.VERSAO_ESQUEMA, 0) as versao_esquema FROM PROJETO p 
         INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID 
+        LEFT JOIN CONTADOR_PROJETO cp ON p.ID = cp.PROJETO_ID
         WHERE p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
     """)
     projeto = db.execute(query_verificar_projeto, {"projeto_id": projeto_id, "usuario_id": current_user['id']}).first()
@@ -64,65 +77,17 @@ def formulario_submissao(
     if not projeto:
         return RedirectResponse(url="/submissoes?error_message=Projeto não encontrado ou sem acesso", status_code=303)
     
-    # Buscar perguntas do projeto
-    query_perguntas = text("""
-        SELECT p.ID, p.PERGUNTA, p.TIPO, p.MODELO, p.ESTR_ENTIDADE_ID
-        FROM PERGUNTA p
-        WHERE p.PROJETO_ID = :projeto_id
-        ORDER BY p.ID
-    """)
-    perguntas = db.execute(query_perguntas, {"projeto_id": projeto_id}).fetchall()
+    # Perguntas e valores padrão vêm do formulário em cache do projeto
+    definicao = definicao_formulario.obter_definicao(db, projeto_id, projeto.versao_esquema)
     
-    if not perguntas:
+    if not definicao.perguntas:
         return RedirectResponse(url="/submissoes?error_message=Este projeto não possui perguntas configuradas", status_code=303)
-    
-    # Buscar valores padrão para perguntas pré-definidas
-    valores_padrao = {}
-    valores_entidade = {}
-    
-    for pergunta in perguntas:
-        if pergunta.modelo == 'pre-definido':
-            # Buscar valores padrão
-            query_valores = text("""
-                SELECT VALOR FROM VALORES_PADRAO 
-                WHERE PERGUNTA_ID = :pergunta_id 
-                ORDER BY VALOR
-            """)
-            valores = db.execute(query_valores, {"pergunta_id": pergunta.id}).fetchall()
-            valores_padrao[pergunta.id] = [v.valor for v in valores]
-        
-        elif pergunta.estr_entidade_id:
-            # Buscar entidades disponíveis
-            query_entidades = text("""
-                SELECT e.ID_SEQ, 
-                       COALESCE(
-                           STRING_AGG(
-                               CASE WHEN ea.EXIBICAO = TRUE 
-                                    THEN CONCAT(ea.LABEL, ': ', a.VALOR) 
-                                    ELSE NULL 
-                               END, 
-                               ' | ' ORDER BY ea.ID_SEQ
-                           ), 
-                           CONCAT('Entidade ', e.ID_SEQ)
-                       ) as display_text
-                FROM ENTIDADE e
-                LEFT JOIN ESTR_ATRIBUTOS ea ON e.ESTR_ENTIDADE_ID = ea.ESTR_ENTIDADE_ID
-                LEFT JOIN ATRIBUTOS a ON e.ESTR_ENTIDADE_ID = a.ESTR_ENTIDADE_ID 
-                                      AND e.ID_SEQ = a.ENTIDADE_ID_SEQ 
-                                      AND ea.ID_SEQ = a.ESTR_ATRIBUTO_ID_SEQ
-                WHERE e.ESTR_ENTIDADE_ID = :estr_entidade_id
-                GROUP BY e.ID_SEQ, e.ESTR_ENTIDADE_ID
-                ORDER BY e.ID_SEQ
-            """)
-            entidades = db.execute(query_entidades, {"estr_entidade_id": pergunta.estr_entidade_id}).fetchall()
-            valores_entidade[pergunta.id] = [{"id": f"{pergunta.estr_entidade_id}_{e.id_seq}", "text": e.display_text} for e in entidades]
 
     contexto = {
         "request": request,
         "projeto": projeto,
-        "perguntas": perguntas,
-        "valores_padrao": valores_padrao,
-        "valores_entidade": valores_entidade,
+        "perguntas": definicao.perguntas,
+        "valores_padrao": definicao.valores_padrao,
         "success_message": success_message,
         "error_message": error_message,
         "usuario": current_user
@@ -130,24 +95,48 @@ def formulario_submissao(
     
     return templates.TemplateResponse("formulario_submissao.html", contexto)
 
+@router.get("/{projeto_id}/perguntas/{pergunta_id}/entidades")
+def buscar_entidades_pergunta(
+    projeto_id: int,
+    pergunta_id: int,
+    q: str = "",
+    apos: Optional[int] = None,
+    current_user = Depends(get_usuario_autenticado),
+    db: Session = Depends(get_db)
+):
+    """Autocompletar das perguntas do tipo entidade: uma página de instâncias que contêm o termo"""
+    
+    query_pergunta = text("""
+        SELECT p.ESTR_ENTIDADE_ID FROM PERGUNTA p
+        INNER JOIN USUARIO_PROJETO up ON p.PROJETO_ID = up.PROJETO_ID
+        WHERE p.ID = :pergunta_id AND p.PROJETO_ID = :projeto_id AND up.USUARIO_ID = :usuario_id
+        AND p.TIPO = 'entidade' AND p.ESTR_ENTIDADE_ID IS NOT NULL
+    """)
+    pergunta = db.execute(query_pergunta, {
+        "pergunta_id": pergunta_id, "projeto_id": projeto_id, "usuario_id": current_user['id']
+    }).first()
+    if not pergunta:
+        return JSONResponse({"error": "Pergunta não encontrada"}, status_code=404)
+    
+    itens, proximo = busca_entidades.buscar_entidades(db, pergunta.estr_entidade_id, q[:100], apos)
+    return JSONResponse({"itens": itens, "proximo": proximo})
+
 @router.post("/{projeto_id}/enviar")
 async def enviar_submissao(
     projeto_id: int,
     request: Request,
     current_user = Depends(get_usuario_autenticado),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    from datetime import datetime
-    import re
-    
     try:
         # Verificar se o usuário tem acesso ao projeto
         query_verificar_projeto = text("""
-            SELECT p.ID FROM PROJETO p 
+            SELECT p.ID, COALESCE(cp.VERSAO_ESQUEMA, 0) as versao_esquema FROM PROJETO p 
             INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID 
+            LEFT JOIN CONTADOR_PROJETO cp ON p.ID = cp.PROJETO_ID
             WHERE p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
         """)
-        projeto_result = db.execute(query_verificar_projeto, {"projeto_id": projeto_id, "usuario_id": current_user['id']}).first()
+        projeto_result = (await db.execute(query_verificar_projeto, {"projeto_id": projeto_id, "usuario_id": current_user['id']})).first()
         
         if not projeto_result:
             return RedirectResponse(
@@ -155,123 +144,54 @@ async def enviar_submissao(
                 status_code=303
             )
         
-        # Buscar perguntas do projeto
-        query_perguntas = text("""
-            SELECT ID, PERGUNTA, TIPO 
-            FROM PERGUNTA 
-            WHERE PROJETO_ID = :projeto_id
-        """)
-        perguntas = db.execute(query_perguntas, {"projeto_id": projeto_id}).fetchall()
-        
         # Processar form data
         form_data = await request.form()
         
-        # Validação por tipo
-        for pergunta in perguntas:
-            campo_nome = f"pergunta_{pergunta.id}"
-            valor = form_data.get(campo_nome, "").strip()
-
-            print(f"Validando pergunta ID {pergunta.id} do tipo {pergunta.tipo} com valor '{valor}'")  # Debug
-            
-            if valor:
-                if pergunta.tipo == 'numero':
-                    try:
-                        float(valor)
-                    except ValueError:
-                        return RedirectResponse(
-                            url=f"/submissoes/{projeto_id}/formulario?error_message=Resposta inválida para '{pergunta.pergunta}': digite apenas números", 
-                            status_code=303
-                        )
-                elif pergunta.tipo == 'email':
-                    email_regex = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
-                    if not re.match(email_regex, valor):
-                        return RedirectResponse(
-                            url=f"/submissoes/{projeto_id}/formulario?error_message=Resposta inválida para '{pergunta.pergunta}': digite um email válido", 
-                            status_code=303
-                        )
-                elif pergunta.tipo == 'data':
-                    try:
-                        datetime.strptime(valor, '%Y-%m-%d')
-                    except ValueError:
-                        return RedirectResponse(
-                            url=f"/submissoes/{projeto_id}/formulario?error_message=Resposta inválida para '{pergunta.pergunta}': selecione uma data válida", 
-                            status_code=303
-                        )
-                elif pergunta.tipo == 'entidade':
-                    # Validar formato entidade_id_seq
-                    if '_' not in valor:
-                        return RedirectResponse(
-                            url=f"/submissoes/{projeto_id}/formulario?error_message=Resposta inválida para '{pergunta.pergunta}': selecione uma entidade válida", 
-                            status_code=303
-                        )
-                    try:
-                        partes = valor.split('_')
-                        if len(partes) != 2:
-                            raise ValueError("Formato inválido")
-                        int(partes[0])  # Validar se é número
-                        int(partes[1])  # Validar se é número
-                    except ValueError:
-                        return RedirectResponse(
-                            url=f"/submissoes/{projeto_id}/formulario?error_message=Resposta inválida para '{pergunta.pergunta}': selecione uma entidade válida", 
-                            status_code=303
-                        )
-        
-        # Criar submissão
-        query_submissao = text("""
-            INSERT INTO SUBMISSAO (PROJETO_ID, USUARIO_ID) 
-            VALUES (:projeto_id, :usuario_id) RETURNING ID
-        """)
-        result = db.execute(query_submissao, {
-            "projeto_id": projeto_id,
-            "usuario_id": current_user['id']
-        })
+        # Validar todas as respostas de uma vez com o validador (em cache) do projeto
+        linhas_resposta, erros = await db.run_sync(
+            validacao_respostas.validar_submissao, projeto_id, form_data, projeto_result.versao_esquema
+        )
+        if erros:
+            return RedirectResponse(
+                url=f"/submissoes/{projeto_id}/formulario?error_message={quote('; '.join(erros))}", 
+                status_code=303
+            )
         
-        # Obter ID da submissão
-        submissao_row = result.fetchone()
-        if submissao_row:
-            submissao_id = submissao_row[0]
+        if escrita_agrupada.habilitada():
+            # Gravada junto com as submissões concorrentes, em um único commit (o escritor atualiza o cubo)
+            submissao_id = await escrita_agrupada.enviar_submissao(projeto_id, current_user['id'], linhas_resposta)
         else:
-            # Fallback para bancos que não suportam RETURNING
-            submissao_id = result.lastrowid
-        
-        # Salvar respostas
-        for pergunta in perguntas:
-            campo_nome = f"pergunta_{pergunta.id}"
-            valor = form_data.get(campo_nome, "").strip()
+            # Criar submissão
+            query_submissao = text("""
+                INSERT INTO SUBMISSAO (PROJETO_ID, USUARIO_ID) 
+                VALUES (:projeto_id, :usuario_id) RETURNING ID
+            """)
+            result = await db.execute(query_submissao, {
+                "projeto_id": projeto_id,
+                "usuario_id": current_user['id']
+            })
             
-            print(f"Salvando pergunta ID {pergunta.id} do tipo {pergunta.tipo} com valor '{valor}'")  # Debug
+            # Obter ID da submissão
+            submissao_row = result.fetchone()
+            if submissao_row:
+                submissao_id = submissao_row[0]
+            else:
+                # Fallback para bancos que não suportam RETURNING
+                submissao_id = result.lastrowid
             
-            if valor:  # Só salva se tiver valor
-                if pergunta.tipo == 'entidade':
-                    # Separar entidade_id e seq para perguntas do tipo entidade
-                    partes = valor.split('_')
-                    entidade_id = int(partes[0])
-                    seq = int(partes[1])
-                    
-                    query_resposta = text("""
-                        INSERT INTO RESPOSTA (SUBMISSAO_ID, PERGUNTA_ID, RESPOSTA, ENTIDADE_ESTR_ENTIDADE_ID, ENTIDADE_ID_SEQ) 
-                        VALUES (:submissao_id, :pergunta_id, :resposta, :entidade_id, :seq)
-                    """)
-                    db.execute(query_resposta, {
-                        "submissao_id": submissao_id,
-                        "pergunta_id": pergunta.id,
-                        "resposta": valor,  # Manter o valor original também
-                        "entidade_id": entidade_id,
-                        "seq": seq
-                    })
-                else:
-                    # Para outros tipos de pergunta
-                    query_resposta = text("""
-                        INSERT INTO RESPOSTA (SUBMISSAO_ID, PERGUNTA_ID, RESPOSTA) 
-                        VALUES (:submissao_id, :pergunta_id, :resposta)
-                    """)
-                    db.execute(query_resposta, {
-                        "submissao_id": submissao_id,
-                        "pergunta_id": pergunta.id,
-                        "resposta": valor
-                    })
+            await db.run_sync(gravacao_respostas.gravar_respostas, submissao_id, linhas_resposta)
+            
+            # Resumos e contadores agregados no banco a partir das respostas gravadas, na mesma transação
+            await db.run_sync(resumo_respostas.registrar_submissoes, [submissao_id])
+            versao = await db.run_sync(contadores.registrar_submissoes, projeto_id, current_user['id'], [submissao_id])
+            
+            await db.commit()
+            cubo_respostas.registrar_submissao(
+                projeto_id, versao, submissao_id,
+                [(pid, valor, numero, data) for pid, valor, numero, data, _, _ in linhas_resposta]
+            )
         
-        db.commit()
+        logger.debug("Submissão %s do projeto %s com %s respostas", submissao_id, projeto_id, len(linhas_resposta))
         
         return RedirectResponse(
             url="/submissoes?success_message=Submissão enviada com sucesso!", 
@@ -279,17 +199,60 @@ async def enviar_submissao(
         )
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Erro ao enviar submissão: {e}")  # Para debug
         return RedirectResponse(
             url=f"/submissoes/{projeto_id}/formulario?error_message=Erro ao enviar submissão", 
             status_code=303
         )
 
+@router.post("/{projeto_id}/importar")
+def importar_submissoes(
+    projeto_id: int,
+    arquivo: UploadFile = File(...),
+    formato: str = Form("csv"),
+    current_user = Depends(get_usuario_autenticado),
+    db: Session = Depends(get_db_analitico)
+):
+    """Importa em lote um arquivo de submissões (CSV ou JSON lines, colunas pelo id da pergunta).
+    Usa a sessão com limite de tempo maior: as cópias e os resumos cobrem o arquivo inteiro"""
+    
+    query_verificar_projeto = text("""
+        SELECT p.ID FROM PROJETO p 
+        INNER JOIN USUARIO_PROJETO up ON p.ID = up.PROJETO_ID 
+        WHERE p.ID = :projeto_id AND up.USUARIO_ID = :usuario_id
+    """)
+    if not db.execute(query_verificar_projeto, {"projeto_id": projeto_id, "usuario_id": current_user['id']}).first():
+        return JSONResponse({"error": "Projeto não encontrado"}, status_code=404)
+    
+    if formato not in importacao.FORMATOS_IMPORTACAO:
+        return JSONResponse({"error": "Formato de importação inválido"}, status_code=400)
+    
+    try:
+        resultado = importacao.importar_submissoes(db, projeto_id, current_user['id'], arquivo.file, formato)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        db.rollback()
+        return JSONResponse({"error": f"Arquivo inválido: {e}"}, status_code=400)
+    except Exception as e:
+        db.rollback()
+        print(f"Erro ao importar submissões: {e}")
+        return JSONResponse({"error": "Erro ao importar submissões"}, status_code=500)
+    
+    if resultado.erros:
+        return JSONResponse({
+            "importadas": 0,
+            "erros": [{"linha": linha, "erros": mensagens} for linha, mensagens in resultado.erros]
+        }, status_code=422)
+    
+    # A importação incrementou a versão dos dados: gráficos e cubos de todos os processos são refeitos
+    return JSONResponse({"importadas": resultado.importadas, "erros": []})
+
 @router.get("/{projeto_id}/historico", response_class=HTMLResponse)
 def historico_submissoes(
     projeto_id: int,
     request: Request,
+    apos_data: Optional[str] = None,
+    apos_id: Optional[int] = None,
     current_user = Depends(get_usuario_autenticado),
     db: Session = Depends(get_db)
 ):
@@ -313,20 +276,47 @@ def historico_submissoes(
     """)
     perguntas = db.execute(query_perguntas, {"projeto_id": projeto_id}).fetchall()
     
-    # Buscar submissões do usuário
-    query_submissoes = text("""
+    # Total de submissões lido do contador do usuário no projeto
+    query_total = text("""
+        SELECT TOTAL_SUBMISSOES FROM CONTADOR_USUARIO_PROJETO 
+        WHERE USUARIO_ID = :usuario_id AND PROJETO_ID = :projeto_id
+    """)
+    total_submissoes = db.execute(query_total, {"usuario_id": current_user['id'], "projeto_id": projeto_id}).scalar() or 0
+    
+    # Cursor da página: (DATA_CADASTRO, ID) da última submissão exibida
+    cursor = None
+    if apos_data and apos_id is not None:
+        try:
+            cursor = (datetime.fromisoformat(apos_data), apos_id)
+        except ValueError:
+            cursor = None
+    
+    # Buscar uma página de submissões do usuário, da mais recente para a mais antiga
+    filtro_cursor = "AND (DATA_CADASTRO, ID) < (:apos_data, :apos_id)" if cursor else ""
+    query_submissoes = text(f"""
         SELECT ID, DATA_CADASTRO 
         FROM SUBMISSAO 
         WHERE PROJETO_ID = :projeto_id AND USUARIO_ID = :usuario_id 
-        ORDER BY DATA_CADASTRO DESC
+        {filtro_cursor}
+        ORDER BY DATA_CADASTRO DESC, ID DESC
+        LIMIT :limite
     """)
-    submissoes_raw = db.execute(query_submissoes, {"projeto_id": projeto_id, "usuario_id": current_user['id']}).fetchall()
+    parametros = {"projeto_id": projeto_id, "usuario_id": current_user['id'], "limite": SUBMISSOES_POR_PAGINA + 1}
+    if cursor:
+        parametros.update({"apos_data": cursor[0], "apos_id": cursor[1]})
+    submissoes_raw = db.execute(query_submissoes, parametros).fetchall()
     
-    # Buscar todas as respostas
-    submissoes = []
-    for submissao in submissoes_raw:
+    proxima_pagina = None
+    if len(submissoes_raw) > SUBMISSOES_POR_PAGINA:
+        submissoes_raw = submissoes_raw[:SUBMISSOES_POR_PAGINA]
+        ultima = submissoes_raw[-1]
+        proxima_pagina = {"apos_data": ultima.data_cadastro.isoformat(), "apos_id": ultima.id}
+    
+    # Buscar as respostas de todas as submissões da página com uma única consulta
+    respostas_por_submissao = {submissao.id: {} for submissao in submissoes_raw}
+    if submissoes_raw:
         query_respostas = text("""
-            SELECT r.PERGUNTA_ID, r.RESPOSTA, r.ENTIDADE_ESTR_ENTIDADE_ID, r.ENTIDADE_ID_SEQ,
+            SELECT r.SUBMISSAO_ID, r.PERGUNTA_ID, r.RESPOSTA, r.ENTIDADE_ESTR_ENTIDADE_ID, r.ENTIDADE_ID_SEQ,
                    COALESCE(
                        STRING_AGG(
                            CASE WHEN ea.EXIBICAO = TRUE 
@@ -346,28 +336,32 @@ def historico_submissoes(
             LEFT JOIN ATRIBUTOS a ON r.ENTIDADE_ESTR_ENTIDADE_ID = a.ESTR_ENTIDADE_ID 
                                   AND r.ENTIDADE_ID_SEQ = a.ENTIDADE_ID_SEQ 
                                   AND ea.ID_SEQ = a.ESTR_ATRIBUTO_ID_SEQ
-            WHERE r.SUBMISSAO_ID = :submissao_id
-            GROUP BY r.PERGUNTA_ID, r.RESPOSTA, r.ENTIDADE_ESTR_ENTIDADE_ID, r.ENTIDADE_ID_SEQ
+            WHERE r.SUBMISSAO_ID = ANY(CAST(:submissao_ids AS INT[]))
+            GROUP BY r.SUBMISSAO_ID, r.PERGUNTA_ID, r.RESPOSTA, r.ENTIDADE_ESTR_ENTIDADE_ID, r.ENTIDADE_ID_SEQ
         """)
-        respostas_raw = db.execute(query_respostas, {"submissao_id": submissao.id}).fetchall()
+        respostas_raw = db.execute(query_respostas, {"submissao_ids": list(respostas_por_submissao)}).fetchall()
         
-        # Organizar respostas por pergunta_id
-        respostas = {}
+        # Organizar respostas por submissão e pergunta_id
         for resposta in respostas_raw:
-            respostas[resposta.pergunta_id] = resposta
-        
-        submissoes.append({
+            respostas_por_submissao[resposta.submissao_id][resposta.pergunta_id] = resposta
+    
+    submissoes = [
+        {
             "id": submissao.id,
             "data_cadastro": submissao.data_cadastro,
-            "respostas": respostas
-        })
+            "respostas": respostas_por_submissao[submissao.id]
+        }
+        for submissao in submissoes_raw
+    ]
     
     contexto = {
         "request": request,
         "projeto": projeto,
         "perguntas": perguntas,
         "submissoes": submissoes,
+        "total_submissoes": total_submissoes,
+        "proxima_pagina": proxima_pagina,
         "usuario": current_user
     }
     
-    return templates.TemplateResponse("historico_submissoes.html", contexto)
\ No newline at end of file
+    return templates.TemplateResponse("historico_submissoes.html", contexto)
@@ -8,6 +8,7 @@ from sqlalchemy import text
 # Importa os schemas que criamos e a conexão com o banco
 from app.core import security
 from app.db.database import get_db
+from app.db import contadores, resumo_respostas
 
 # Cria o router específico para usuários
 router = APIRouter()
@@ -173,6 +174,11 @@ def deletar_usuario(
                 status_code=303
             )
         
+        # Retira as respostas do usuário do resumo antes da exclusão em cascata
+        # (os contadores incrementam a versão dos projetos atingidos)
+        resumo_respostas.descontar_respostas_usuario(db, usuario_id)
+        contadores.descontar_usuario(db, usuario_id)
+        
         # Deleta o usuário
         query_delete = text("DELETE FROM usuario WHERE id = :id")
         db.execute(query_delete, {"id": usuario_id})
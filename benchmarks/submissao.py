@@ -0,0 +1,126 @@
+"""Latência da gravação de uma submissão em função da quantidade de perguntas.
+
+Duas medições separadas:
+  - inserção: só as respostas, comparando um INSERT INTO RESPOSTA por pergunta com o
+    INSERT único de gravacao_respostas;
+  - gravação completa: o caminho de enviar_submissao (submissão, respostas, resumos e
+    contadores agregados no banco), com a quantidade de comandos enviados por submissão.
+
+Tudo é feito em uma transação desfeita ao final: o banco não é alterado.
+
+Uso: python -m benchmarks.submissao [--perguntas 10 20 40 80 160] [--repeticoes 50]
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, List, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.db import contadores, gravacao_respostas, resumo_respostas
+from app.db.database import SessionLocal, engine
+
+def gravar_uma_a_uma(db: Session, submissao_id: int, linhas: List[gravacao_respostas.RespostaGravacao]):
+    query = text("""
+        INSERT INTO RESPOSTA (SUBMISSAO_ID, PERGUNTA_ID, RESPOSTA, RESPOSTA_NUMERO, RESPOSTA_DATA)
+        VALUES (:submissao_id, :pergunta_id, :resposta, :numero, :data)
+    """)
+    for pergunta_id, valor, numero, data, _, _ in linhas:
+        db.execute(query, {
+            "submissao_id": submissao_id, "pergunta_id": pergunta_id,
+            "resposta": valor, "numero": numero, "data": data
+        })
+
+def gravar_submissao(db: Session, projeto_id: int, usuario_id: int, linhas: List[gravacao_respostas.RespostaGravacao]):
+    """Mesmos comandos de enviar_submissao (sem a escrita agrupada)"""
+    submissao_id = db.execute(text("""
+        INSERT INTO SUBMISSAO (PROJETO_ID, USUARIO_ID) VALUES (:projeto_id, :usuario_id) RETURNING ID
+    """), {"projeto_id": projeto_id, "usuario_id": usuario_id}).scalar()
+    gravacao_respostas.gravar_respostas(db, submissao_id, linhas)
+    resumo_respostas.registrar_submissoes(db, [submissao_id])
+    contadores.registrar_submissoes(db, projeto_id, usuario_id, [submissao_id])
+
+def preparar_projeto(db: Session, quantidade_perguntas: int):
+    """Cria um usuário e um projeto com perguntas numéricas dentro da transação do benchmark"""
+    usuario_id = db.execute(text("""
+        INSERT INTO USUARIO (NOME, SENHA, EMAIL)
+        VALUES ('benchmark', '-', 'benchmark_' || gen_random_uuid() || '@exemplo.com')
+        RETURNING ID
+    """)).scalar()
+    projeto_id = db.execute(text("INSERT INTO PROJETO (NOME) VALUES ('benchmark') RETURNING ID")).scalar()
+    pergunta_ids = db.execute(text("""
+        INSERT INTO PERGUNTA (PROJETO_ID, PERGUNTA, TIPO)
+        SELECT :projeto_id, 'Pergunta ' || n, 'numero'
+        FROM generate_series(1, :quantidade) AS n
+        RETURNING ID
+    """), {"projeto_id": projeto_id, "quantidade": quantidade_perguntas}).scalars().all()
+    linhas = [(pid, str(i), float(i), None, None, None) for i, pid in enumerate(pergunta_ids)]
+    return usuario_id, projeto_id, linhas
+
+def medir_insercao(db: Session, gravar: Callable, quantidade_perguntas: int, repeticoes: int) -> List[float]:
+    """Tempo só da inserção das respostas; a submissão é criada fora da medição"""
+    usuario_id, projeto_id, linhas = preparar_projeto(db, quantidade_perguntas)
+
+    tempos = []
+    for _ in range(repeticoes):
+        submissao_id = db.execute(text("""
+            INSERT INTO SUBMISSAO (PROJETO_ID, USUARIO_ID) VALUES (:projeto_id, :usuario_id) RETURNING ID
+        """), {"projeto_id": projeto_id, "usuario_id": usuario_id}).scalar()
+        inicio = time.perf_counter()
+        gravar(db, submissao_id, linhas)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+def medir_gravacao_completa(db: Session, quantidade_perguntas: int, repeticoes: int) -> Tuple[List[float], float]:
+    """Tempo da gravação completa e média de comandos enviados ao banco por submissão"""
+    usuario_id, projeto_id, linhas = preparar_projeto(db, quantidade_perguntas)
+
+    comandos = 0
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        nonlocal comandos
+        # executemany no psycopg2 é um comando por linha
+        comandos += len(parameters) if executemany else 1
+
+    tempos = []
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            gravar_submissao(db, projeto_id, usuario_id, linhas)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+    return tempos, comandos / repeticoes
+
+def _resumir(tempos: List[float]) -> Tuple[float, float]:
+    tempos = sorted(tempos)
+    return statistics.median(tempos), tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latência da gravação de submissões por quantidade de perguntas")
+    parser.add_argument("--perguntas", type=int, nargs="+", default=[10, 20, 40, 80, 160])
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    estrategias = [("uma a uma", gravar_uma_a_uma), ("INSERT único", gravacao_respostas.gravar_respostas)]
+
+    db = SessionLocal()
+    try:
+        print("Inserção das respostas")
+        print(f"{'perguntas':>9}  {'estratégia':<14}{'mediana (ms)':>13}{'p95 (ms)':>10}")
+        for quantidade in args.perguntas:
+            for nome, gravar in estrategias:
+                mediana, p95 = _resumir(medir_insercao(db, gravar, quantidade, args.repeticoes))
+                print(f"{quantidade:>9}  {nome:<14}{mediana:>13.2f}{p95:>10.2f}")
+
+        print()
+        print("Gravação completa (submissão, respostas, resumos e contadores)")
+        print(f"{'perguntas':>9}{'comandos':>10}{'mediana (ms)':>13}{'p95 (ms)':>10}")
+        for quantidade in args.perguntas:
+            tempos, comandos = medir_gravacao_completa(db, quantidade, args.repeticoes)
+            mediana, p95 = _resumir(tempos)
+            print(f"{quantidade:>9}{comandos:>10.0f}{mediana:>13.2f}{p95:>10.2f}")
+    finally:
+        db.rollback()
+        db.close()
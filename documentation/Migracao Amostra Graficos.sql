@@ -0,0 +1,4 @@
+-- Índice da amostra do modo aproximado dos gráficos em um banco existente: cada submissão é
+-- sorteada pelo hash do ID, e o índice lê apenas as sorteadas do projeto.
+
+CREATE INDEX IF NOT EXISTS IX_SUBMISSAO_PROJETO_AMOSTRA ON SUBMISSAO (PROJETO_ID, ((hashint4(ID) & 2147483647) % 1000000));
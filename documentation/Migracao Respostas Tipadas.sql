@@ -0,0 +1,28 @@
+-- Adiciona as colunas tipadas de RESPOSTA em um banco existente e preenche
+-- os valores das respostas já gravadas a partir do texto e de PERGUNTA.TIPO.
+
+ALTER TABLE RESPOSTA ADD COLUMN IF NOT EXISTS RESPOSTA_NUMERO DOUBLE PRECISION;
+ALTER TABLE RESPOSTA ADD COLUMN IF NOT EXISTS RESPOSTA_DATA DATE;
+
+-- Apenas textos numéricos válidos são convertidos; os demais permanecem NULL
+UPDATE RESPOSTA r
+SET RESPOSTA_NUMERO = CAST(r.RESPOSTA AS DOUBLE PRECISION)
+FROM PERGUNTA p
+WHERE r.PERGUNTA_ID = p.ID
+AND p.TIPO = 'numero'
+AND r.RESPOSTA_NUMERO IS NULL
+AND r.RESPOSTA ~ '^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$';
+
+UPDATE RESPOSTA r
+SET RESPOSTA_DATA = CAST(r.RESPOSTA AS DATE)
+FROM PERGUNTA p
+WHERE r.PERGUNTA_ID = p.ID
+AND p.TIPO = 'data'
+AND r.RESPOSTA_DATA IS NULL
+AND r.RESPOSTA ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}$';
+
+CREATE INDEX IF NOT EXISTS IX_RESPOSTA_PERGUNTA_NUMERO ON RESPOSTA (PERGUNTA_ID, RESPOSTA_NUMERO) WHERE RESPOSTA_NUMERO IS NOT NULL;
+CREATE INDEX IF NOT EXISTS IX_RESPOSTA_PERGUNTA_DATA ON RESPOSTA (PERGUNTA_ID, RESPOSTA_DATA) WHERE RESPOSTA_DATA IS NOT NULL;
+
+-- A soma numérica do resumo de respostas passa a vir das colunas tipadas:
+-- python -m app.db.resumo_respostas reconstruir
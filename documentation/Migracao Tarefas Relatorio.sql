@@ -0,0 +1,4 @@
+-- Adiciona a tentativa de TAREFA_RELATORIO em um banco existente. Cada reserva da tarefa por um
+-- trabalhador a incrementa, e o progresso e a finalização exigem a tentativa atual.
+
+ALTER TABLE TAREFA_RELATORIO ADD COLUMN IF NOT EXISTS TENTATIVA INT NOT NULL DEFAULT 0;
@@ -0,0 +1,6 @@
+-- Adiciona as versões de CONTADOR_PROJETO em um banco existente. VERSAO muda a cada alteração
+-- dos dados do projeto e VERSAO_ESQUEMA a cada alteração da estrutura; os caches em memória de
+-- todos os processos comparam sua versão com a do banco.
+
+ALTER TABLE CONTADOR_PROJETO ADD COLUMN IF NOT EXISTS VERSAO BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE CONTADOR_PROJETO ADD COLUMN IF NOT EXISTS VERSAO_ESQUEMA BIGINT NOT NULL DEFAULT 0;
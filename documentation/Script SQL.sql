@@ -100,8 +100,121 @@ CREATE TABLE RESPOSTA (
     RESPOSTA TEXT,
     ENTIDADE_ESTR_ENTIDADE_ID INT,
     ENTIDADE_ID_SEQ INT,
+    RESPOSTA_NUMERO DOUBLE PRECISION,
+    RESPOSTA_DATA DATE,
     CONSTRAINT PK_RESPOSTA PRIMARY KEY (ID),
     CONSTRAINT FK_RESPOSTA_SUBMISSAO FOREIGN KEY (SUBMISSAO_ID) REFERENCES SUBMISSAO(ID) ON DELETE CASCADE,
     CONSTRAINT FK_RESPOSTA_PERGUNTA FOREIGN KEY (PERGUNTA_ID) REFERENCES PERGUNTA(ID) ON DELETE CASCADE,
     CONSTRAINT FK_RESPOSTA_ENTIDADE FOREIGN KEY (ENTIDADE_ESTR_ENTIDADE_ID, ENTIDADE_ID_SEQ) REFERENCES ENTIDADE(ESTR_ENTIDADE_ID, ID_SEQ) ON DELETE SET NULL
-);
\ No newline at end of file
+);
+
+-- Colunas tipadas de RESPOSTA, preenchidas conforme PERGUNTA.TIPO.
+-- Para bancos existentes, executar "Migracao Respostas Tipadas.sql"
+CREATE INDEX IX_RESPOSTA_PERGUNTA_NUMERO ON RESPOSTA (PERGUNTA_ID, RESPOSTA_NUMERO) WHERE RESPOSTA_NUMERO IS NOT NULL;
+CREATE INDEX IX_RESPOSTA_PERGUNTA_DATA ON RESPOSTA (PERGUNTA_ID, RESPOSTA_DATA) WHERE RESPOSTA_DATA IS NOT NULL;
+
+-- Resumo de respostas por pergunta (histograma), mantido na escrita por enviar_submissao.
+-- Para bancos existentes, popular com: python -m app.db.resumo_respostas reconstruir
+CREATE TABLE RESUMO_RESPOSTA (
+    PERGUNTA_ID INT NOT NULL,
+    VALOR TEXT NOT NULL,
+    QUANTIDADE INT NOT NULL DEFAULT 0,
+    SOMA_NUMERICA DOUBLE PRECISION,
+    CONSTRAINT FK_RESUMO_RESPOSTA_PERGUNTA FOREIGN KEY (PERGUNTA_ID) REFERENCES PERGUNTA(ID) ON DELETE CASCADE
+);
+
+-- MD5 no lugar do texto completo: respostas longas excedem o limite de uma chave B-tree
+CREATE UNIQUE INDEX UK_RESUMO_RESPOSTA ON RESUMO_RESPOSTA (PERGUNTA_ID, MD5(VALOR));
+
+-- Resumos diários (submissões por dia e respostas por dia) para os gráficos de tendência,
+-- mantidos na escrita por enviar_submissao e reconstruídos pelo mesmo comando acima
+CREATE TABLE RESUMO_SUBMISSAO_DIA (
+    PROJETO_ID INT NOT NULL,
+    DIA DATE NOT NULL,
+    QUANTIDADE INT NOT NULL DEFAULT 0,
+    CONSTRAINT PK_RESUMO_SUBMISSAO_DIA PRIMARY KEY (PROJETO_ID, DIA),
+    CONSTRAINT FK_RESUMO_SUBMISSAO_DIA_PROJETO FOREIGN KEY (PROJETO_ID) REFERENCES PROJETO(ID) ON DELETE CASCADE
+);
+
+CREATE TABLE RESUMO_RESPOSTA_DIA (
+    PERGUNTA_ID INT NOT NULL,
+    DIA DATE NOT NULL,
+    VALOR TEXT NOT NULL,
+    QUANTIDADE INT NOT NULL DEFAULT 0,
+    SOMA_NUMERICA DOUBLE PRECISION,
+    CONSTRAINT FK_RESUMO_RESPOSTA_DIA_PERGUNTA FOREIGN KEY (PERGUNTA_ID) REFERENCES PERGUNTA(ID) ON DELETE CASCADE
+);
+
+CREATE UNIQUE INDEX UK_RESUMO_RESPOSTA_DIA ON RESUMO_RESPOSTA_DIA (PERGUNTA_ID, DIA, MD5(VALOR));
+
+-- Respostas de uma submissão, usado pelo modo aproximado dos gráficos (amostra de submissões).
+-- Executar também em bancos existentes
+CREATE INDEX IF NOT EXISTS IX_RESPOSTA_SUBMISSAO ON RESPOSTA (SUBMISSAO_ID, PERGUNTA_ID);
+
+-- Contadores das telas iniciais, mantidos na escrita (app/db/contadores.py).
+-- Para bancos existentes, popular com: python -m app.db.contadores reconstruir
+-- VERSAO muda a cada alteração dos dados do projeto e VERSAO_ESQUEMA a cada alteração da
+-- estrutura (perguntas, valores padrão, entidades, atributos e instâncias); os caches em
+-- memória de todos os processos comparam sua versão com a do banco.
+-- Para bancos com CONTADOR_PROJETO sem as versões, executar "Migracao Versao Projeto.sql"
+CREATE TABLE CONTADOR_PROJETO (
+    PROJETO_ID INT NOT NULL,
+    TOTAL_PERGUNTAS INT NOT NULL DEFAULT 0,
+    TOTAL_SUBMISSOES INT NOT NULL DEFAULT 0,
+    VERSAO BIGINT NOT NULL DEFAULT 0,
+    VERSAO_ESQUEMA BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT PK_CONTADOR_PROJETO PRIMARY KEY (PROJETO_ID),
+    CONSTRAINT FK_CONTADOR_PROJETO_PROJETO FOREIGN KEY (PROJETO_ID) REFERENCES PROJETO(ID) ON DELETE CASCADE
+);
+
+CREATE TABLE CONTADOR_USUARIO_PROJETO (
+    USUARIO_ID INT NOT NULL,
+    PROJETO_ID INT NOT NULL,
+    TOTAL_SUBMISSOES INT NOT NULL DEFAULT 0,
+    CONSTRAINT PK_CONTADOR_USUARIO_PROJETO PRIMARY KEY (USUARIO_ID, PROJETO_ID),
+    CONSTRAINT FK_CONTADOR_USUARIO_PROJETO_USUARIO FOREIGN KEY (USUARIO_ID) REFERENCES USUARIO(ID) ON DELETE CASCADE,
+    CONSTRAINT FK_CONTADOR_USUARIO_PROJETO_PROJETO FOREIGN KEY (PROJETO_ID) REFERENCES PROJETO(ID) ON DELETE CASCADE
+);
+
+CREATE TABLE CONTADOR_PERGUNTA (
+    PERGUNTA_ID INT NOT NULL,
+    TOTAL_RESPOSTAS INT NOT NULL DEFAULT 0,
+    CONSTRAINT PK_CONTADOR_PERGUNTA PRIMARY KEY (PERGUNTA_ID),
+    CONSTRAINT FK_CONTADOR_PERGUNTA_PERGUNTA FOREIGN KEY (PERGUNTA_ID) REFERENCES PERGUNTA(ID) ON DELETE CASCADE
+);
+
+-- Relatórios gerados em segundo plano pelos trabalhadores (python -m app.core.tarefas_relatorio)
+CREATE TABLE TAREFA_RELATORIO (
+    ID INT GENERATED ALWAYS AS IDENTITY,
+    USUARIO_ID INT NOT NULL,
+    PROJETO_ID INT NOT NULL,
+    FORMATO VARCHAR(10) NOT NULL,
+    STATUS VARCHAR(20) NOT NULL DEFAULT 'pendente',
+    PROGRESSO INT NOT NULL DEFAULT 0,
+    TOTAL INT,
+    -- Incrementada a cada reserva por um trabalhador: só a tentativa atual grava progresso e resultado
+    TENTATIVA INT NOT NULL DEFAULT 0,
+    ARQUIVO TEXT,
+    ERRO TEXT,
+    DATA_CADASTRO TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    DATA_INICIO TIMESTAMPTZ,
+    DATA_ATUALIZACAO TIMESTAMPTZ,
+    DATA_FIM TIMESTAMPTZ,
+    CONSTRAINT PK_TAREFA_RELATORIO PRIMARY KEY (ID),
+    CONSTRAINT FK_TAREFA_RELATORIO_USUARIO FOREIGN KEY (USUARIO_ID) REFERENCES USUARIO(ID) ON DELETE CASCADE,
+    CONSTRAINT FK_TAREFA_RELATORIO_PROJETO FOREIGN KEY (PROJETO_ID) REFERENCES PROJETO(ID) ON DELETE CASCADE
+);
+
+CREATE INDEX IX_TAREFA_RELATORIO_FILA ON TAREFA_RELATORIO (STATUS, ID);
+CREATE INDEX IX_TAREFA_RELATORIO_USUARIO ON TAREFA_RELATORIO (USUARIO_ID, ID);
+
+-- Busca por trecho no autocompletar das perguntas do tipo entidade (ILIKE '%termo%')
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IX_ATRIBUTOS_VALOR_TRGM ON ATRIBUTOS USING GIN (VALOR gin_trgm_ops);
+
+-- Histórico de submissões do usuário, paginado por (DATA_CADASTRO, ID)
+CREATE INDEX IX_SUBMISSAO_USUARIO_PROJETO_DATA ON SUBMISSAO (USUARIO_ID, PROJETO_ID, DATA_CADASTRO DESC, ID DESC);
+
+-- Modo aproximado dos gráficos: lê só as submissões sorteadas do projeto (ver graficos.montar_filtro_amostra)
+CREATE INDEX IX_SUBMISSAO_PROJETO_AMOSTRA ON SUBMISSAO (PROJETO_ID, ((hashint4(ID) & 2147483647) % 1000000));
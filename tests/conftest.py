@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+# Banco dos testes: TEST_DATABASE_URL, se definida, senão o DATABASE_URL do .env. O esquema
+# deve existir (documentation/Script SQL.sql); cada teste roda em uma transação desfeita ao final
+if os.environ.get("TEST_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core import security
+from app.db.database import engine, get_db
+
+SENHA_TESTE = "senha-teste"
+
+@pytest.fixture
+def conexao():
+    try:
+        conexao = engine.connect()
+    except OperationalError as e:
+        pytest.skip(f"Banco de testes indisponível: {e}")
+    transacao = conexao.begin()
+    try:
+        yield conexao
+    finally:
+        transacao.rollback()
+        conexao.close()
+
+@pytest.fixture
+def db(conexao):
+    # Os commits das rotas viram savepoints dentro da transação do teste
+    sessao = Session(bind=conexao, join_transaction_mode="create_savepoint")
+    try:
+        yield sessao
+    finally:
+        sessao.close()
+
+@pytest.fixture
+def cliente(db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    def get_db_teste():
+        yield db
+
+    app.dependency_overrides[get_db] = get_db_teste
+    try:
+        with TestClient(app) as cliente:
+            yield cliente
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+@pytest.fixture
+def projeto(db, cliente):
+    """Usuário autenticado no cliente e um projeto liberado para ele"""
+    usuario_id = db.execute(text("""
+        INSERT INTO USUARIO (NOME, SENHA, EMAIL)
+        VALUES ('Teste', :senha, 'teste_' || gen_random_uuid() || '@exemplo.com')
+        RETURNING ID
+    """), {"senha": security.get_senha_hash(SENHA_TESTE)}).scalar()
+    email = db.execute(text("SELECT EMAIL FROM USUARIO WHERE ID = :id"), {"id": usuario_id}).scalar()
+    projeto_id = db.execute(text("INSERT INTO PROJETO (NOME) VALUES ('Projeto de teste') RETURNING ID")).scalar()
+    db.execute(text("INSERT INTO USUARIO_PROJETO (USUARIO_ID, PROJETO_ID) VALUES (:usuario_id, :projeto_id)"), {
+        "usuario_id": usuario_id, "projeto_id": projeto_id
+    })
+
+    resposta = cliente.post("/auth/login", data={"email": email, "senha": SENHA_TESTE}, follow_redirects=False)
+    assert resposta.status_code == 302
+    return {"id": projeto_id, "usuario_id": usuario_id}
+
+class ContadorComandos:
+    """Conta os comandos enviados ao banco enquanto ativo (executemany conta um por linha)"""
+
+    def __init__(self):
+        self.total = 0
+
+    def _contar(self, conn, cursor, statement, parameters, context, executemany):
+        self.total += len(parameters) if executemany else 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self._contar)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self._contar)
+
+@pytest.fixture
+def contar_comandos():
+    return ContadorComandos
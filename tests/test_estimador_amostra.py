@@ -0,0 +1,107 @@
+import math
+import random
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+from app.core import cubo_respostas
+from app.routers import graficos
+
+def grupo(quantidade: int, soma, soma_quadrados, x_valor: str = "A"):
+    return SimpleNamespace(x_valor=x_valor, quantidade=quantidade, soma=soma, soma_quadrados=soma_quadrados)
+
+def sortear(populacao, fracao: float, rng: random.Random):
+    """Amostra de Bernoulli: cada submissão entra de forma independente, como no filtro por hash do banco"""
+    amostra = [y for y in populacao if rng.random() < fracao]
+    return grupo(len(amostra), sum(amostra), sum(y * y for y in amostra))
+
+def test_soma_expandida_pela_fracao_com_margem_de_95():
+    linhas, margens = graficos.estimar_linhas_amostra([grupo(4, 10.0, 50.0)], True, 0.5)
+
+    assert linhas == [("A", 20.0)]
+    assert margens == [round(graficos.Z_95 * math.sqrt(50.0 * (1 - 0.5)) / 0.5, 2)]
+
+def test_contagem_expandida_pela_fracao_com_margem_de_95():
+    linhas, margens = graficos.estimar_linhas_amostra([grupo(30, None, None)], False, 0.1)
+
+    assert linhas == [("A", 300)]
+    assert margens == [round(graficos.Z_95 * math.sqrt(30 * 0.9) / 0.1, 2)]
+    assert margens == [graficos.margem_contagem(30, 0.1)]
+
+def test_amostra_completa_nao_tem_margem():
+    linhas, margens = graficos.estimar_linhas_amostra([grupo(5, 12.5, 40.0)], True, 1.0)
+
+    assert linhas == [("A", 12.5)]
+    assert margens == [0.0]
+
+def test_grupo_sem_numeros_nao_tem_estimativa():
+    linhas, margens = graficos.estimar_linhas_amostra([grupo(3, None, None)], True, 0.5)
+
+    assert linhas == [("A", None)]
+    assert margens == [0.0]
+
+@pytest.mark.parametrize("somar", [True, False])
+def test_margem_cobre_o_total_em_95_por_cento_das_amostras(somar):
+    rng = random.Random(2024)
+    populacao = [rng.uniform(0, 100) for _ in range(2000)]
+    total = sum(populacao) if somar else len(populacao)
+    fracao = 0.1
+
+    repeticoes = 1000
+    cobertos = 0
+    for _ in range(repeticoes):
+        linhas, margens = graficos.estimar_linhas_amostra([sortear(populacao, fracao, rng)], somar, fracao)
+        if abs(linhas[0][1] - total) <= margens[0]:
+            cobertos += 1
+
+    assert 0.92 <= cobertos / repeticoes <= 0.98
+
+def test_modo_aproximado_usa_amostra_mesmo_com_o_cubo(db, projeto, monkeypatch):
+    monkeypatch.setattr(cubo_respostas, "habilitado", lambda: True)
+
+    perguntas = db.execute(text("""
+        INSERT INTO PERGUNTA (PROJETO_ID, PERGUNTA, TIPO)
+        VALUES (:projeto_id, 'Turma', 'texto'), (:projeto_id, 'Nota', 'numero')
+        RETURNING ID, PERGUNTA, TIPO
+    """), {"projeto_id": projeto["id"]}).fetchall()
+    pergunta_x, pergunta_y = perguntas
+    notas = {}
+    for nota in range(1, 41):
+        submissao_id = db.execute(text("""
+            INSERT INTO SUBMISSAO (PROJETO_ID, USUARIO_ID) VALUES (:projeto_id, :usuario_id) RETURNING ID
+        """), {"projeto_id": projeto["id"], "usuario_id": projeto["usuario_id"]}).scalar()
+        turma = "A" if nota % 2 else "B"
+        db.execute(text("""
+            INSERT INTO RESPOSTA (SUBMISSAO_ID, PERGUNTA_ID, RESPOSTA, RESPOSTA_NUMERO)
+            VALUES (:submissao_id, :pergunta_x, :turma, NULL), (:submissao_id, :pergunta_y, :nota, :numero)
+        """), {
+            "submissao_id": submissao_id, "pergunta_x": pergunta_x.id, "pergunta_y": pergunta_y.id,
+            "turma": turma, "nota": str(nota), "numero": float(nota)
+        })
+        notas[submissao_id] = (turma, float(nota))
+
+    # O sorteio é determinístico: as submissões da amostra são conhecidas antes do gráfico
+    fracao = 0.5
+    sorteadas = db.execute(text(f"""
+        SELECT s.ID FROM SUBMISSAO s WHERE s.PROJETO_ID = :projeto_id {graficos.montar_filtro_amostra(fracao)}
+    """), {"projeto_id": projeto["id"], **graficos.parametros_amostra(fracao)}).scalars().all()
+    assert sorteadas
+
+    esperados = {}
+    for submissao_id in sorteadas:
+        turma, nota = notas[submissao_id]
+        soma, soma_quadrados = esperados.get(turma, (0.0, 0.0))
+        esperados[turma] = (soma + nota, soma_quadrados + nota * nota)
+
+    perguntas_info = {str(p.id): p for p in perguntas}
+    dados = graficos.gerar_dados_xy(db, "bar", projeto["id"], str(pergunta_x.id), str(pergunta_y.id), perguntas_info, "soma", fracao)
+
+    assert dados["aproximado"] is True
+    assert dados["fracao_amostra"] == fracao
+    assert dados["categories"] == sorted(esperados)
+    serie = dados["series"][0]
+    for turma, estimativa, margem in zip(dados["categories"], serie["data"], serie["margem_erro"]):
+        soma, soma_quadrados = esperados[turma]
+        assert estimativa == pytest.approx(soma / fracao)
+        assert margem == pytest.approx(graficos.Z_95 * math.sqrt(soma_quadrados * (1 - fracao)) / fracao, abs=0.01)
@@ -0,0 +1,46 @@
+from sqlalchemy import text
+
+def criar_entidade(db, projeto_id: int) -> int:
+    """Entidade com um atributo de exibição e dois atributos comuns"""
+    entidade_id = db.execute(text("""
+        INSERT INTO ESTR_ENTIDADE (PROJETO_ID, NOME) VALUES (:projeto_id, 'Escola') RETURNING ID
+    """), {"projeto_id": projeto_id}).scalar()
+    db.execute(text("""
+        INSERT INTO ESTR_ATRIBUTOS (ID_SEQ, ESTR_ENTIDADE_ID, NOME_ATRIBUTO, TIPO, LABEL, EXIBICAO)
+        VALUES (1, :entidade_id, 'nome', 'texto', 'Nome', TRUE),
+               (2, :entidade_id, 'cidade', 'texto', 'Cidade', FALSE),
+               (3, :entidade_id, 'alunos', 'numero', 'Alunos', FALSE)
+    """), {"entidade_id": entidade_id})
+    return entidade_id
+
+def criar_instancias(db, entidade_id: int, inicio: int, quantidade: int):
+    db.execute(text("""
+        INSERT INTO ENTIDADE (ID_SEQ, ESTR_ENTIDADE_ID)
+        SELECT n, :entidade_id FROM generate_series(:inicio, :fim) AS n
+    """), {"entidade_id": entidade_id, "inicio": inicio, "fim": inicio + quantidade - 1})
+    db.execute(text("""
+        INSERT INTO ATRIBUTOS (ESTR_ENTIDADE_ID, ENTIDADE_ID_SEQ, ESTR_ATRIBUTO_ID_SEQ, VALOR)
+        SELECT :entidade_id, n, a.ID_SEQ,
+               CASE a.ID_SEQ WHEN 1 THEN 'Escola ' || n WHEN 2 THEN 'Cidade ' || n ELSE (n * 10)::text END
+        FROM generate_series(:inicio, :fim) AS n
+        CROSS JOIN (VALUES (1), (2), (3)) AS a(ID_SEQ)
+    """), {"entidade_id": entidade_id, "inicio": inicio, "fim": inicio + quantidade - 1})
+
+def test_quantidade_de_comandos_nao_depende_da_quantidade_de_instancias(db, cliente, projeto, contar_comandos):
+    entidade_id = criar_entidade(db, projeto["id"])
+    url = f"/projetos/{projeto['id']}/entidades/{entidade_id}/instancias?limite=50"
+
+    criar_instancias(db, entidade_id, 1, 2)
+    with contar_comandos() as poucas:
+        resposta = cliente.get(url)
+    assert resposta.status_code == 200
+    assert "Escola 2" in resposta.text
+
+    criar_instancias(db, entidade_id, 3, 20)
+    with contar_comandos() as muitas:
+        resposta = cliente.get(url)
+    assert resposta.status_code == 200
+    assert "Escola 22" in resposta.text
+    assert "Cidade 22" in resposta.text
+
+    assert poucas.total == muitas.total